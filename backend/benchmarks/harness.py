@@ -0,0 +1,182 @@
+# backend/benchmarks/harness.py
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+try:
+    import uvicorn
+except ImportError:  # Optional dependency, only needed for --socket
+    uvicorn = None
+try:
+    import websockets
+except ImportError:  # Optional dependency, only needed for --socket
+    websockets = None
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+def latency_stats(seconds: List[float]) -> Dict:
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3),
+    }
+
+class ASGIWebSocket:
+    # A websocket client that calls the app directly, without a socket, so
+    # a thousand clients cost a thousand tasks rather than threads
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path, _, self.query = path.partition("?")
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+
+    async def _send(self, message):
+        # Like a server whose client has gone away
+        if self.closed:
+            raise ConnectionResetError("Client disconnected.")
+        self.inbox.put_nowait(message)
+
+    async def connect(self):
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+            "path": self.path, "raw_path": self.path.encode(), "root_path": "",
+            "query_string": self.query.encode(), "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 50000), "server": ("bench", 80), "subprotocols": [], "state": {},
+        }
+        self.outbox.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.ensure_future(self.app(scope, self.outbox.get, self._send))
+        message = await self.inbox.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"Websocket {self.path} was not accepted: {message}")
+        return self
+
+    async def send_text(self, text: str):
+        self.outbox.put_nowait({"type": "websocket.receive", "text": text})
+
+    async def receive_text(self) -> str:
+        message = await self.inbox.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError(f"Websocket closed: {message.get('code')}")
+        return message.get("text") if message.get("text") is not None else message["bytes"].decode()
+
+    async def close(self):
+        self.closed = True
+        self.outbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self.task, 5)
+        except (asyncio.TimeoutError, Exception):
+            pass
+
+class SocketWebSocket:
+    # The same interface over a real TCP connection
+    def __init__(self, url: str):
+        self.url = url
+        self.websocket = None
+
+    async def connect(self):
+        self.websocket = await websockets.connect(self.url, max_size=None)
+        return self
+
+    async def send_text(self, text: str):
+        await self.websocket.send(text)
+
+    async def receive_text(self) -> str:
+        message = await self.websocket.recv()
+        return message if isinstance(message, str) else message.decode()
+
+    async def close(self):
+        await self.websocket.close()
+
+class Target:
+    # Where the scenarios send their requests: the app in this process, or
+    # the same app served by uvicorn on a local port
+    def __init__(self, app, use_socket: bool = False):
+        self.app = app
+        self.use_socket = use_socket
+        self.server = None
+        self.port = None
+
+    @property
+    def mode(self) -> str:
+        return "socket" if self.use_socket else "in-process"
+
+    async def __aenter__(self):
+        if not self.use_socket:
+            self._lifespan = self.app.router.lifespan_context(self.app)
+            await self._lifespan.__aenter__()
+            return self
+        if uvicorn is None or websockets is None:
+            raise RuntimeError("--socket needs the 'uvicorn' and 'websockets' packages.")
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=self.port,
+                                                    log_level="warning", ws_max_size=2**24))
+        threading.Thread(target=self.server.run, daemon=True).start()
+        while not self.server.started:
+            await asyncio.sleep(0.05)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.server is not None:
+            self.server.should_exit = True
+            await asyncio.sleep(0.2)
+        else:
+            await self._lifespan.__aexit__(*exc_info)
+
+    def http(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+        if self.use_socket:
+            return httpx.AsyncClient(base_url=f"http://127.0.0.1:{self.port}", limits=limits)
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://bench")
+
+    async def websocket(self, path: str):
+        if self.use_socket:
+            return await SocketWebSocket(f"ws://127.0.0.1:{self.port}{path}").connect()
+        return await ASGIWebSocket(self.app, path).connect()
+
+NOISE_FLOOR_MS = 1.0  # Latency changes smaller than this are never regressions
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    # Metrics ending in _per_s should not drop, metrics ending in _ms should
+    # not grow, by more than `tolerance` (0.25 = 25%)
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            if metric.endswith("_per_s") and value < before * (1 - tolerance):
+                regressions.append(f"{name}.{metric}: {value} < {before}")
+            elif metric.endswith("_ms") and value > before + max(before * tolerance, NOISE_FLOOR_MS):
+                regressions.append(f"{name}.{metric}: {value} > {before}")
+    return regressions
+
+def load_json(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_json(path: str, data: Dict):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+class Clock:
+    def __init__(self):
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
@@ -0,0 +1,140 @@
+# backend/benchmarks/run.py
+#
+# Benchmarks for the backend and its plugins. Run from backend/:
+#
+#   python -m benchmarks.run                      # everything, in-process
+#   python -m benchmarks.run --quick              # smaller counts, 1/10/100 clients
+#   python -m benchmarks.run --socket             # through uvicorn on a local port
+#   python -m benchmarks.run --only plugins_list log_tail
+#   python -m benchmarks.run --output results.json --baseline benchmarks/baseline.json
+#   python -m benchmarks.run --quick --save-baseline
+#
+# psutil and systemctl are replaced by the plugins' stub backends, and all
+# files are written to a temporary directory, so it runs on any machine.
+
+import argparse
+import asyncio
+import os
+import platform
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+CONFIG = {
+    "requests": 2000,
+    "concurrency": 10,
+    "scrapes": 500,
+    "churn_cycles": 100,
+    "clients": [1, 10, 100, 1000],
+    "streams": ["metrics", "datetime", "logs"],
+    "messages": 3,
+    "metrics_interval": 0.05,
+    "fanout_timeout": 60.0,
+    "tail_seconds": 2.0,
+}
+QUICK_CONFIG = {
+    **CONFIG,
+    "requests": 300,
+    "scrapes": 100,
+    "churn_cycles": 20,
+    "clients": [1, 10, 100],
+    "messages": 2,
+    "tail_seconds": 0.5,
+}
+
+def prepare_environment(work_dir: str):
+    # Must run before the app is imported
+    os.environ["SYSTEM_MONITOR_BACKEND"] = "stub"
+    os.environ["SERVICE_MANAGER_BACKEND"] = "stub"
+    os.environ["COMMAND_JOURNAL_FILE"] = os.path.join(work_dir, "command_tasks.jsonl")
+    os.environ["LOAD_PLUGINS"] = "true"
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+def build_app(work_dir: str):
+    from main import app, plugin_manager
+    from settings.store import SettingsStore
+
+    # Enable/disable churn must not touch the real settings file
+    plugin_manager.settings = SettingsStore(os.path.join(work_dir, "plugins_settings.json"), indent=4)
+    log_viewer = plugin_manager.load_plugin("log_viewer", "benchmark")
+    plugin_manager.include_plugin_routes("log_viewer", log_viewer)
+    log_viewer.ALLOWED_LOG_DIRS = [work_dir]
+    log_file = os.path.join(work_dir, "app.log")
+    open(log_file, "w").close()
+    return app, {"plugin_manager": plugin_manager, "log_file": log_file}
+
+async def run(args, config) -> dict:
+    from .harness import Target
+    from .scenarios import SCENARIOS
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        prepare_environment(work_dir)
+        app, context = build_app(work_dir)
+        results = {}
+        async with Target(app, use_socket=args.socket) as target:
+            for name, scenario in SCENARIOS.items():
+                if args.only and name not in args.only:
+                    continue
+                started = time.perf_counter()
+                print(f"{name}...", end=" ", flush=True)
+                results.update(await scenario(target, config, context))
+                print(f"{time.perf_counter() - started:.1f}s", flush=True)
+        return {
+            "meta": {
+                "mode": target.mode,
+                "quick": args.quick,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "timestamp": int(time.time()),
+            },
+            "results": results,
+        }
+
+def print_results(results: dict):
+    for name, metrics in results.items():
+        values = ", ".join(f"{metric}={value}" for metric, value in metrics.items())
+        print(f"  {name}: {values}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pi_cm backend.")
+    parser.add_argument("--quick", action="store_true", help="smaller counts and at most 100 clients")
+    parser.add_argument("--socket", action="store_true", help="serve the app with uvicorn and use real sockets")
+    parser.add_argument("--only", nargs="+", metavar="SCENARIO", help="run only these scenarios")
+    parser.add_argument("--clients", nargs="+", type=int, help="websocket client counts to try")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with a stored results file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the results in {BASELINE_FILE}")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (default 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    from .harness import compare, load_json, save_json
+
+    config = dict(QUICK_CONFIG if args.quick else CONFIG)
+    if args.clients:
+        config["clients"] = args.clients
+    report = asyncio.run(run(args, config))
+    print_results(report["results"])
+    if args.output:
+        save_json(args.output, report)
+    if args.save_baseline:
+        save_json(BASELINE_FILE, report)
+    if args.baseline:
+        baseline = load_json(args.baseline)
+        regressions = compare(report["results"], baseline["results"], args.tolerance)
+        if regressions:
+            print(f"Slower than {args.baseline} by more than {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions against {args.baseline}.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+# backend/benchmarks/scenarios.py
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+from .harness import Clock, Target, latency_stats
+
+# Websocket streams: (plugin endpoint, topic on /ws)
+STREAMS = {
+    "metrics": ("/plugins/system_monitor/ws/metrics", "system_monitor.metrics"),
+    "datetime": ("/plugins/datetime_display/ws/datetime", "datetime_display.datetime"),
+    "logs": ("/plugins/log_viewer/ws/logs", "log_viewer.logs:{path}"),
+}
+
+async def timed_requests(client, method: str, path: str, count: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    remaining = iter(range(count))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.request(method, path)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method} {path} returned {response.status_code}")
+
+    clock = Clock()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"requests": count, "requests_per_s": round(count / clock.elapsed, 1), **latency_stats(latencies)}
+
+async def plugins_list(target: Target, config: Dict, context: Dict) -> Dict:
+    async with target.http() as client:
+        return {"plugins_list": await timed_requests(client, "GET", "/plugins", config["requests"], config["concurrency"])}
+
+async def metrics_scrape(target: Target, config: Dict, context: Dict) -> Dict:
+    async with target.http() as client:
+        return {"metrics_scrape": await timed_requests(client, "GET", "/metrics", config["scrapes"], 1)}
+
+async def plugin_churn(target: Target, config: Dict, context: Dict) -> Dict:
+    # Disable and enable a plugin over HTTP, as the settings page does
+    cycles = []
+    async with target.http() as client:
+        for _ in range(config["churn_cycles"]):
+            started = time.perf_counter()
+            for action in ("disable", "enable"):
+                response = await client.post(f"/plugins/datetime_display/{action}")
+                response.raise_for_status()
+            cycles.append(time.perf_counter() - started)
+    return {"plugin_churn": {"cycles": len(cycles), "cycles_per_s": round(len(cycles) / sum(cycles), 1),
+                             **latency_stats(cycles)}}
+
+async def write_log_lines(path: str, stop: asyncio.Event, interval: float):
+    count = 0
+    while not stop.is_set():
+        with open(path, "a") as f:
+            f.write(f"benchmark line {count}\n")
+        count += 1
+        await asyncio.sleep(interval)
+
+async def fanout(target: Target, stream: str, transport: str, clients: int, config: Dict, context: Dict) -> Dict:
+    # Connects `clients` websockets to one stream and waits until every one
+    # has received `messages` data frames
+    endpoint, topic = STREAMS[stream]
+    topic = topic.format(path=context["log_file"])
+    messages = config["messages"]
+    clock = Clock()
+    if transport == "topic":
+        sockets = await asyncio.gather(*(target.websocket("/ws") for _ in range(clients)))
+    else:
+        sockets = await asyncio.gather(*(target.websocket(endpoint) for _ in range(clients)))
+    connect_s = clock.elapsed
+
+    received: List[List[float]] = [[] for _ in sockets]
+
+    async def follow(index: int, websocket):
+        if transport == "topic":
+            await websocket.send_text(json.dumps({"op": "subscribe", "topic": topic}))
+        elif stream == "logs":
+            await websocket.send_text(context["log_file"])
+        while len(received[index]) < messages:
+            text = await websocket.receive_text()
+            if transport == "topic" and not text.startswith('{"topic"'):
+                continue  # Control messages
+            received[index].append(time.perf_counter())
+
+    stop = asyncio.Event()
+    writer = asyncio.ensure_future(write_log_lines(context["log_file"], stop, 0.02)) if stream == "logs" else None
+    try:
+        await asyncio.wait_for(asyncio.gather(*(follow(index, ws) for index, ws in enumerate(sockets))),
+                               config["fanout_timeout"])
+    finally:
+        stop.set()
+        if writer is not None:
+            await writer
+        await asyncio.gather(*(websocket.close() for websocket in sockets), return_exceptions=True)
+
+    # The first frame can be a cached value sent on subscribe, so rates are
+    # measured from the moment every client had one
+    elapsed = max(times[-1] for times in received) - max(times[0] for times in received)
+    # How far apart the clients got the same frame, after the first one
+    spreads = [max(times[k] for times in received) - min(times[k] for times in received) for k in range(1, messages)]
+    return {
+        "clients": clients,
+        "connect_ms": round(connect_s * 1000, 2),
+        "frames_per_s": round(clients * (messages - 1) / elapsed, 1) if elapsed > 0 else None,
+        "fanout_spread_ms": round(sum(spreads) / len(spreads) * 1000, 2) if spreads else None,
+    }
+
+async def websocket_fanout(target: Target, config: Dict, context: Dict) -> Dict:
+    results = {}
+    plugin = context["plugin_manager"].plugins["system_monitor"]
+    interval = plugin.sampler.interval
+    plugin.sampler.interval = config["metrics_interval"]
+    plugin.sampler.stop()
+    plugin.sampler.start()  # Picks up the new interval now
+    try:
+        for stream in config["streams"]:
+            for transport in ("plugin", "topic"):
+                for clients in config["clients"]:
+                    results[f"ws_{stream}_{transport}_{clients}"] = await fanout(
+                        target, stream, transport, clients, config, context)
+    finally:
+        plugin.sampler.interval = interval
+    return results
+
+async def log_tail_throughput(target: Target, config: Dict, context: Dict) -> Dict:
+    # One follower of a file that grows as fast as a thread can write to it
+    from plugins.log_viewer.tail import TailEngine
+
+    path = context["log_file"] + ".fast"
+    open(path, "w").close()
+    engine = TailEngine()
+    subscriber = engine.subscribe(path)
+    line = "x" * 100 + "\n"
+    written = [0]
+    stop = threading.Event()
+
+    def write():
+        with open(path, "a") as f:
+            while not stop.is_set():
+                f.write(line * 100)
+                f.flush()
+                written[0] += 100
+
+    received = 0
+    skipped = 0
+    writer = threading.Thread(target=write, daemon=True)
+    clock = Clock()
+    writer.start()
+    await asyncio.sleep(0.1)  # Let the first poll open the file
+    deadline = time.perf_counter() + config["tail_seconds"]
+    try:
+        while True:
+            if time.perf_counter() >= deadline and not stop.is_set():
+                stop.set()
+                writer.join()
+            try:
+                text = await asyncio.wait_for(subscriber.get(), 1.0)
+            except asyncio.TimeoutError:
+                break
+            if text.startswith("[... "):
+                header, _, text = text.partition("\n")
+                skipped += int(header.split()[1])
+            received += text.count("\n")
+            if stop.is_set() and received + skipped // len(line) >= written[0]:
+                break
+    finally:
+        stop.set()
+        engine.unsubscribe(path, subscriber)
+        os.unlink(path)
+    elapsed = clock.elapsed
+    return {"log_tail": {
+        "lines_written": written[0],
+        "lines_received": received,
+        "lines_skipped": skipped // len(line),
+        "lines_per_s": round(received / elapsed, 1),
+    }}
+
+SCENARIOS = {
+    "plugins_list": plugins_list,
+    "plugin_churn": plugin_churn,
+    "metrics_scrape": metrics_scrape,
+    "websocket_fanout": websocket_fanout,
+    "log_tail": log_tail_throughput,
+}
@@ -0,0 +1,208 @@
+# backend/core/cache.py
+
+import functools
+import hashlib
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import anyio
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+MAX_ENTRIES = 512
+MAX_BYTES = 8 * 2**20  # Total size of the cached bodies
+
+class CacheEntry:
+    __slots__ = ('owner', 'body', 'media_type', 'etag', 'expires')
+
+    def __init__(self, owner: Hashable, body: bytes, media_type: Optional[str], etag: str, expires: float):
+        self.owner = owner
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.expires = expires
+
+class Computation:
+    # One in-flight miss that other requests for the same key wait on
+    __slots__ = ('generation', 'done', 'entry', 'error')
+
+    def __init__(self, generation: int):
+        self.generation = generation  # Of its owner, when it started
+        self.done = anyio.Event()
+        self.entry: Optional[CacheEntry] = None
+        self.error: Optional[BaseException] = None
+
+class ResponseCache:
+    # Caches the bodies of GET endpoints that opt in with @cached(owner, ttl).
+    # Entries are kept in LRU order within MAX_ENTRIES and MAX_BYTES and are
+    # keyed by path and query string. Concurrent misses for the same key wait
+    # for one computation, and every response carries an ETag so a client
+    # that sends If-None-Match gets a 304 without the body. Owners (a plugin,
+    # or "core") drop their entries with invalidate() when their data changes;
+    # that also bumps the owner's generation, so a response computed from
+    # data read before the change is not stored afterwards.
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Tuple, CacheEntry]" = OrderedDict()
+        self.in_flight: Dict[Tuple, Computation] = {}
+        self.generations: Dict[Hashable, int] = {}
+        self.size = 0
+        # Invalidation may come from worker threads
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple) -> Optional[CacheEntry]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def generation(self, owner: Hashable) -> int:
+        return self.generations.get(owner, 0)
+
+    def put(self, key: Tuple, entry: CacheEntry, generation: int) -> bool:
+        with self.lock:
+            if self.generation(entry.owner) != generation:
+                # Invalidated while it was computed, so it may be stale
+                return False
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.size += len(entry.body)
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+            return True
+
+    def _remove(self, key: Tuple):
+        self.size -= len(self.entries.pop(key).body)
+
+    def invalidate(self, owner: Hashable) -> int:
+        with self.lock:
+            self.generations[owner] = self.generation(owner) + 1
+            keys = [key for key, entry in self.entries.items() if entry.owner == owner]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def forget(self, owner: Hashable):
+        # Drops an owner for good (e.g. a stopped plugin): its entries, its
+        # generation, and the right of its in-flight computations to store
+        with self.lock:
+            self.generations.pop(owner, None)
+            keys = [key for key, entry in self.entries.items() if entry.owner == owner]
+            for key in keys:
+                self._remove(key)
+            for key, computation in self.in_flight.items():
+                if key[0] == owner:
+                    computation.generation = -1
+
+    def stats(self) -> Dict:
+        return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses,
+                "coalesced": self.coalesced, "evictions": self.evictions}
+
+    def make_entry(self, owner: Hashable, response, ttl: float) -> Optional[CacheEntry]:
+        # Only complete 200 responses are cached
+        if isinstance(response, StreamingResponse):
+            return None
+        if not isinstance(response, Response):
+            response = JSONResponse(content=jsonable_encoder(response))
+        if response.status_code != 200:
+            return None
+        etag = response.headers.get("etag") or '"' + hashlib.blake2b(response.body, digest_size=16).hexdigest() + '"'
+        return CacheEntry(owner, response.body, response.media_type, etag, time.monotonic() + ttl)
+
+    def respond(self, entry: CacheEntry, request: Request) -> Response:
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if "*" in tags or entry.etag.removeprefix("W/") in tags:
+                return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+    def cached(self, owner: Hashable, ttl: float):
+        # Decorator for a GET endpoint; goes below the route decorator:
+        #
+        #   @router.get("/services")
+        #   @response_cache.cached("core", ttl=5)
+        #   async def list_services(): ...
+        def decorator(endpoint):
+            signature = inspect.signature(endpoint)
+            request_param = next((name for name, parameter in signature.parameters.items()
+                                  if parameter.annotation is Request), None)
+            is_async = inspect.iscoroutinefunction(endpoint)
+
+            async def call(args, kwargs):
+                if is_async:
+                    return await endpoint(*args, **kwargs)
+                return await run_in_threadpool(endpoint, *args, **kwargs)
+
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                if request_param is None:
+                    request = kwargs.pop("cache_request")
+                else:
+                    request = kwargs[request_param]
+                key = (owner, request.url.path, tuple(sorted(request.query_params.multi_items())))
+                entry = self.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    return self.respond(entry, request)
+                computation = self.in_flight.get(key)
+                # One that started before an invalidation is not joined
+                if computation is not None and computation.generation == self.generation(owner):
+                    self.coalesced += 1
+                    await computation.done.wait()
+                    if computation.error is not None:
+                        raise computation.error
+                    if computation.entry is not None:
+                        return self.respond(computation.entry, request)
+                    # Uncacheable or cancelled: compute it for this request
+                    return await call(args, kwargs)
+                self.misses += 1
+                computation = self.in_flight[key] = Computation(self.generation(owner))
+                try:
+                    response = await call(args, kwargs)
+                    # Still the answer to this request, even if not stored
+                    entry = computation.entry = self.make_entry(owner, response, ttl)
+                    if entry is not None:
+                        self.put(key, entry, computation.generation)
+                except Exception as e:
+                    # Waiting requests fail the same way
+                    computation.error = e
+                    raise
+                finally:
+                    if self.in_flight.get(key) is computation:
+                        del self.in_flight[key]
+                    computation.done.set()
+                if entry is None:
+                    return response
+                return self.respond(entry, request)
+
+            if request_param is None:
+                # FastAPI passes the request to the wrapper only
+                wrapper.__signature__ = signature.replace(parameters=[
+                    *signature.parameters.values(),
+                    inspect.Parameter("cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+                ])
+            return wrapper
+        return decorator
+
+# Shared by the app and all plugins, so the memory bound is global
+response_cache = ResponseCache()
@@ -0,0 +1,130 @@
+# backend/core/dispatcher.py
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import APIRouter
+from starlette.responses import PlainTextResponse
+from starlette.routing import BaseRoute, Match, get_route_path
+from starlette.types import Receive, Scope, Send
+from starlette.websockets import WebSocketClose
+
+PREFIX = "/plugins/"
+RELOAD_CLOSE_CODE = 1012  # "Service restart": clients should reconnect
+
+class PluginDispatcher(BaseRoute):
+    # A single app route standing in for every plugin. The first path segment
+    # after /plugins/ picks the plugin's router from a dict, so routing cost
+    # does not grow with the number of plugins, and mounting or unmounting a
+    # plugin is one dict operation. Requests no mounted plugin answers fall
+    # through to the app's own routes (e.g. /plugins/{id}/enable).
+
+    def __init__(self):
+        self.routers: Dict[str, APIRouter] = {}
+        # Plugins imported on their first request; the loader mounts the
+        # plugin and returns its router, or None if it failed to load. It
+        # runs from handle(), never while routes are matched.
+        self.loaders: Dict[str, Callable[[], Awaitable[Optional[APIRouter]]]] = {}
+        # Open websockets by id() of their router, so a replaced router can
+        # be drained (routers are not hashable)
+        self.connections: Dict[int, Dict[asyncio.Task, Send]] = {}
+        self._drained = set()
+
+    def mount(self, plugin_name: str, router: APIRouter):
+        # Mounting again replaces the router instead of duplicating its routes
+        self.loaders.pop(plugin_name, None)
+        self.routers[plugin_name] = router
+
+    def defer(self, plugin_name: str, loader: Callable[[], Awaitable[Optional[APIRouter]]]):
+        self.routers.pop(plugin_name, None)
+        self.loaders[plugin_name] = loader
+
+    def unmount(self, plugin_name: str) -> bool:
+        deferred = self.loaders.pop(plugin_name, None) is not None
+        return self.routers.pop(plugin_name, None) is not None or deferred
+
+    def matches(self, scope: Scope) -> Tuple[Match, Scope]:
+        if scope["type"] not in ("http", "websocket"):
+            return Match.NONE, {}
+        path = get_route_path(scope)
+        if not path.startswith(PREFIX):
+            return Match.NONE, {}
+        plugin_name = path[len(PREFIX):].split("/", 1)[0]
+        router = self.routers.get(plugin_name)
+        if router is None:
+            if plugin_name in self.loaders and not self.matches_app(scope):
+                # Its routes are unknown until it is imported, so the path is
+                # claimed whole; handle() loads it and lets it route
+                return Match.FULL, {
+                    "root_path": scope.get("root_path", "") + PREFIX + plugin_name,
+                    "plugin_router": None,
+                    "plugin": plugin_name,
+                }
+            return Match.NONE, {}
+        child_scope = {
+            "root_path": scope.get("root_path", "") + PREFIX + plugin_name,
+            "plugin_router": router,
+            "plugin": plugin_name,  # Lets middleware attribute the request
+        }
+        # Only this plugin's routes are tried
+        plugin_scope = {**scope, **child_scope}
+        partial = False
+        for route in router.routes:
+            match, _ = route.matches(plugin_scope)
+            if match == Match.FULL:
+                return Match.FULL, child_scope
+            partial = partial or match == Match.PARTIAL
+        if partial:
+            return Match.PARTIAL, child_scope
+        return Match.NONE, {}
+
+    def matches_app(self, scope: Scope) -> bool:
+        # Whether one of the app's own routes (e.g. /plugins/{id}/disable)
+        # answers the path, so a deferred plugin is not imported for it
+        app = scope.get("app")
+        for route in getattr(getattr(app, "router", None), "routes", ()):
+            if route is not self and route.matches(scope)[0] == Match.FULL:
+                return True
+        return False
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send):
+        router = scope["plugin_router"]
+        if router is None:
+            loader = self.loaders.get(scope["plugin"])
+            router = await loader() if loader is not None else self.routers.get(scope["plugin"])
+            if router is None:
+                # Failed to load, or unmounted meanwhile
+                if scope["type"] == "websocket":
+                    await WebSocketClose()(scope, receive, send)
+                else:
+                    await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+                return
+        if scope["type"] != "websocket":
+            await router(scope, receive, send)
+            return
+        task = asyncio.ensure_future(router(scope, receive, send))
+        connections = self.connections.setdefault(id(router), {})
+        connections[task] = send
+        try:
+            await task
+        except asyncio.CancelledError:
+            # Closed by drain(); anything else is a real cancellation
+            if task not in self._drained:
+                raise
+        finally:
+            self._drained.discard(task)
+            connections.pop(task, None)
+            if not connections and self.connections.get(id(router)) is connections:
+                del self.connections[id(router)]
+
+    async def drain(self, router: APIRouter, code: int = RELOAD_CLOSE_CODE, reason: str = "Plugin reloaded"):
+        # Closes every websocket still served by `router` and stops its handler
+        for task, send in list(self.connections.get(id(router), {}).items()):
+            try:
+                await send({"type": "websocket.close", "code": code, "reason": reason})
+            except Exception:
+                pass
+            self._drained.add(task)
+            task.cancel()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(plugins={sorted(self.routers)!r})"
@@ -0,0 +1,382 @@
+# backend/core/isolation.py
+
+import asyncio
+import importlib
+import inspect
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+from typing import Dict, List, Optional
+
+from starlette.routing import Route, WebSocketRoute
+from starlette.types import Receive, Scope, Send
+from core.plugin_base import PluginManifest
+
+ISOLATION_MODES = ("thread", "process")
+READY_TIMEOUT = 60.0  # Seconds a new worker has to import the plugin
+RESTART_BACKOFF = 1.0  # First delay before restarting a crashed worker
+MAX_RESTART_BACKOFF = 30.0
+# The part of an ASGI scope that can cross the process boundary
+SCOPE_KEYS = ("type", "asgi", "http_version", "method", "scheme", "path", "raw_path", "root_path",
+              "query_string", "headers", "client", "server", "subprotocols")
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Worker side: runs in the child process or thread
+
+def worker_main(conn, plugin_name: str, settings: dict):
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    try:
+        asyncio.run(serve_plugin(conn, plugin_name, settings))
+    finally:
+        # The parent sees EOF and knows the worker is gone
+        conn.close()
+
+async def maybe_await(result):
+    if inspect.isawaitable(result):
+        await result
+
+def describe_routes(router) -> List[tuple]:
+    routes = []
+    for route in router.routes:
+        methods = getattr(route, 'methods', None)
+        kind = "http" if methods is not None else "websocket"
+        routes.append((kind, route.path, sorted(methods) if methods else None))
+    return routes
+
+async def serve_plugin(conn, plugin_name: str, settings: dict):
+    from fastapi import FastAPI
+    from core.supervisor import TaskSupervisor
+
+    module = importlib.import_module(f'plugins.{plugin_name}')
+    plugin = module.Plugin()
+    plugin.update_from_settings(settings)
+    app = FastAPI()
+    app.include_router(plugin.router)
+
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+    write_lock = threading.Lock()
+
+    def post(message):
+        with write_lock:
+            conn.send(message)
+
+    def read():
+        # Connection.recv blocks, so it gets its own thread
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                message = ("stop",)
+            loop.call_soon_threadsafe(inbox.put_nowait, message)
+            if message[0] == "stop":
+                return
+
+    threading.Thread(target=read, name=f"{plugin_name}-ipc", daemon=True).start()
+
+    supervisor = TaskSupervisor()
+    for handler in plugin.router.on_startup:
+        await maybe_await(handler())
+    await plugin.on_startup()
+    for task_name, factory in plugin.background_tasks.items():
+        supervisor.start(plugin_name, task_name, factory)
+    post(("ready", describe_routes(plugin.router)))
+
+    requests: Dict[int, asyncio.Queue] = {}
+    handlers = set()
+
+    async def handle(request_id: int, scope: Scope):
+        async def send(message):
+            post(("send", request_id, message))
+
+        error = None
+        try:
+            await app(scope, requests[request_id].get, send)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            requests.pop(request_id, None)
+            post(("done", request_id, error))
+
+    while True:
+        message = await inbox.get()
+        if message[0] == "start":
+            _, request_id, scope = message
+            requests[request_id] = asyncio.Queue()
+            task = asyncio.ensure_future(handle(request_id, scope))
+            handlers.add(task)
+            task.add_done_callback(handlers.discard)
+        elif message[0] == "receive":
+            queue = requests.get(message[1])
+            if queue is not None:
+                queue.put_nowait(message[2])
+        elif message[0] == "stop":
+            break
+
+    for task in list(handlers):
+        task.cancel()
+    await supervisor.stop(plugin_name)
+    await plugin.on_shutdown()
+    for handler in plugin.router.on_shutdown:
+        await maybe_await(handler())
+
+# Parent side: proxies requests from the app to the workers
+
+async def _proxied(request):
+    # Placeholder endpoint; the routes are only used for matching
+    pass
+
+class Worker:
+    def __init__(self, pool: 'WorkerPool', index: int):
+        self.pool = pool
+        self.index = index
+        self.conn = None
+        self.runner = None
+        self.ready: Optional[asyncio.Future] = None
+        self.in_flight: Dict[int, asyncio.Queue] = {}
+        self.exited = False
+        self._write_lock = threading.Lock()
+
+    def start(self, settings: dict):
+        loop = asyncio.get_running_loop()
+        self.ready = loop.create_future()
+        name = f"plugin-{self.pool.plugin_name}-{self.index}"
+        if self.pool.mode == "process":
+            context = multiprocessing.get_context("spawn")
+            self.conn, child_conn = context.Pipe()
+            self.runner = context.Process(target=worker_main, args=(child_conn, self.pool.plugin_name, settings),
+                                          name=name, daemon=True)
+            self.runner.start()
+            # Only the child keeps its end open, so its exit shows up as EOF
+            child_conn.close()
+        else:
+            self.conn, child_conn = multiprocessing.Pipe()
+            self.runner = threading.Thread(target=worker_main, args=(child_conn, self.pool.plugin_name, settings),
+                                           name=name, daemon=True)
+            self.runner.start()
+        conn = self.conn
+
+        def read():
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    message = None
+                try:
+                    if message is None:
+                        loop.call_soon_threadsafe(self.pool.worker_exited, self)
+                        return
+                    loop.call_soon_threadsafe(self.on_message, message)
+                except RuntimeError:
+                    # The app's event loop is already closed
+                    return
+
+        threading.Thread(target=read, name=f"{name}-ipc", daemon=True).start()
+
+    def on_message(self, message):
+        if message[0] == "ready":
+            self.pool.set_routes(message[1])
+            if not self.ready.done():
+                self.ready.set_result(True)
+        else:
+            queue = self.in_flight.get(message[1])
+            if queue is not None:
+                queue.put_nowait(message)
+
+    @property
+    def alive(self) -> bool:
+        # ready holds False when the worker died before it was ready
+        return not self.exited and self.ready is not None and self.ready.done() and self.ready.result()
+
+    def post(self, message) -> bool:
+        try:
+            with self._write_lock:
+                self.conn.send(message)
+            return True
+        except (OSError, ValueError):
+            # The reader notices the dead worker and restarts it
+            return False
+
+    def fail_in_flight(self, error: str):
+        for request_id, queue in self.in_flight.items():
+            queue.put_nowait(("done", request_id, error))
+
+    def stop(self):
+        self.post(("stop",))
+        if self.pool.mode == "process" and self.runner is not None:
+            self.runner.join(5)
+            if self.runner.is_alive():
+                self.runner.kill()
+
+class WorkerPool:
+    # ASGI app standing in for the router of an isolated plugin. Every
+    # request and websocket is forwarded over a pipe to one of `size` worker
+    # threads or processes, each running its own copy of the plugin on its
+    # own event loop, so a plugin that blocks only delays its own requests.
+    # Note that workers do not share state with each other.
+
+    # Started and stopped by IsolatedPlugin's hooks, not router handlers
+    on_startup = ()
+    on_shutdown = ()
+
+    def __init__(self, plugin_name: str, mode: str = "process", size: int = 1):
+        if mode not in ISOLATION_MODES:
+            raise ValueError(f"Unknown isolation mode '{mode}'.")
+        self.plugin_name = plugin_name
+        self.mode = mode
+        self.size = max(1, size)
+        self.workers: List[Worker] = []
+        self.routes: List = []  # Matched by the dispatcher like a router's routes
+        self.settings: dict = {}
+        self.running = False
+        self.restarts = 0
+        self._ids = itertools.count()
+        self._backoff = RESTART_BACKOFF
+
+    def set_routes(self, routes: List[tuple]):
+        if self.routes:
+            return
+        self.routes = [
+            Route(path, _proxied, methods=methods) if kind == "http" else WebSocketRoute(path, _proxied)
+            for kind, path, methods in routes
+        ]
+
+    async def start(self, settings: dict):
+        if self.running:
+            return
+        self.running = True
+        self.settings = settings
+        self.workers = [Worker(self, index) for index in range(self.size)]
+        for worker in self.workers:
+            worker.start(settings)
+        # Workers that fail to come up are restarted in the background
+        await asyncio.wait_for(asyncio.gather(*(worker.ready for worker in self.workers)), READY_TIMEOUT)
+
+    async def stop(self):
+        self.running = False
+        workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.fail_in_flight("Plugin stopped.")
+        await asyncio.gather(*(asyncio.to_thread(worker.stop) for worker in workers))
+
+    def worker_exited(self, worker: Worker):
+        worker.exited = True
+        if not worker.ready.done():
+            worker.ready.set_result(False)
+        worker.fail_in_flight("Plugin worker exited.")
+        if not self.running or worker not in self.workers:
+            return
+        # Crashed: replace it after a growing delay
+        self.restarts += 1
+        delay, self._backoff = self._backoff, min(self._backoff * 2, MAX_RESTART_BACKOFF)
+        print(f"Worker {worker.index} of plugin {self.plugin_name} exited; restarting in {delay:g}s.")
+        asyncio.get_running_loop().call_later(delay, self._restart, worker)
+
+    def _restart(self, worker: Worker):
+        if not self.running or worker not in self.workers:
+            return
+        replacement = Worker(self, worker.index)
+        self.workers[self.workers.index(worker)] = replacement
+        replacement.start(self.settings)
+        replacement.ready.add_done_callback(self._restarted)
+
+    def _restarted(self, ready: asyncio.Future):
+        if ready.result():
+            self._backoff = RESTART_BACKOFF
+
+    def pick(self) -> Optional[Worker]:
+        ready = [worker for worker in self.workers if worker.alive]
+        if not ready:
+            return None
+        return min(ready, key=lambda worker: len(worker.in_flight))
+
+    def health(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "size": self.size,
+            "ready": sum(1 for worker in self.workers if worker.alive),
+            "restarts": self.restarts,
+            "in_flight": sum(len(worker.in_flight) for worker in self.workers),
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        worker = self.pick()
+        if worker is None:
+            await self._unavailable(scope, send, "Plugin worker is not running.")
+            return
+        request_id = next(self._ids)
+        queue: asyncio.Queue = asyncio.Queue()
+        if not worker.post(("start", request_id, {key: scope[key] for key in SCOPE_KEYS if key in scope})):
+            await self._unavailable(scope, send, "Plugin worker exited.")
+            return
+        worker.in_flight[request_id] = queue
+
+        async def pump():
+            while True:
+                message = await receive()
+                worker.post(("receive", request_id, message))
+                if message["type"] in ("http.disconnect", "websocket.disconnect"):
+                    return
+
+        pump_task = asyncio.ensure_future(pump())
+        started = False
+        error = None
+        try:
+            while True:
+                message = await queue.get()
+                if message[0] == "done":
+                    error = message[2]
+                    break
+                await send(message[2])
+                started = started or message[2]["type"] in ("http.response.start", "websocket.accept",
+                                                             "websocket.close")
+        finally:
+            pump_task.cancel()
+            worker.in_flight.pop(request_id, None)
+        if error is not None:
+            print(f"Error in isolated plugin {self.plugin_name}: {error}")
+            if not started:
+                await self._unavailable(scope, send, error, status_code=500)
+
+    async def _unavailable(self, scope: Scope, send: Send, detail: str, status_code: int = 503):
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1011 if status_code == 500 else 1013, "reason": detail})
+            return
+        body = detail.encode()
+        await send({"type": "http.response.start", "status": status_code,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+class IsolatedPlugin(PluginManifest):
+    # A plugin with "isolation": "thread" or "process" in its plugin.json.
+    # It is never imported by the app itself; its workers run while it is on.
+    loaded = True
+
+    def __init__(self, plugin_name: str, manifest: dict):
+        super().__init__(manifest)
+        self.router = WorkerPool(plugin_name, manifest['isolation'], manifest.get('workers', 1))
+        self.background_tasks = {}
+        self.topics = {}
+
+    async def on_startup(self):
+        await self.router.start(self.settings())
+
+    async def on_enable(self):
+        await self.router.start(self.settings())
+
+    async def on_disable(self):
+        await self.router.stop()
+
+    async def on_shutdown(self):
+        await self.router.stop()
+
+    async def restart(self):
+        # New workers import the plugin code afresh
+        if self.router.running:
+            await self.router.stop()
+            await self.router.start(self.settings())
@@ -0,0 +1,165 @@
+# backend/core/metrics.py
+
+import bisect
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CORE = "core"  # Plugin label of requests the app itself answers
+RECENT_REQUESTS = 1000  # Latencies kept per plugin for percentiles
+PERCENTILES = (50, 90, 99)
+
+class MetricFamily:
+    def __init__(self, name: str, type: str, help: str):
+        self.name = name
+        self.type = type  # gauge, counter or histogram
+        self.help = help
+        self.samples: List[Tuple[str, Dict[str, str], float]] = []
+
+    def add(self, value: float, suffix: str = "", **labels):
+        self.samples.append((suffix, labels, value))
+        return self
+
+def gauge(name: str, help: str, value: Optional[float] = None, **labels) -> MetricFamily:
+    family = MetricFamily(name, "gauge", help)
+    if value is not None:
+        family.add(value, **labels)
+    return family
+
+def counter(name: str, help: str, value: Optional[float] = None, **labels) -> MetricFamily:
+    family = MetricFamily(name, "counter", help)
+    if value is not None:
+        family.add(value, "_total", **labels)
+    return family
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and value == float('inf'):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+def render(families: List[MetricFamily]) -> str:
+    lines = []
+    for family in families:
+        lines.append(f"# TYPE {family.name} {family.type}")
+        lines.append(f"# HELP {family.name} {escape(family.help)}")
+        for suffix, labels, value in family.samples:
+            label_text = ",".join(f'{key}="{escape(label)}"' for key, label in labels.items())
+            name = family.name + suffix
+            lines.append(f"{name}{{{label_text}}} {format_value(value)}" if label_text else f"{name} {format_value(value)}")
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+class RequestMetrics:
+    # Request counts, latency histograms and open websockets per plugin.
+    # Recording is a few dict and list operations per request.
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.requests: Dict[Tuple[str, str], int] = {}
+        # Per plugin: a count per bucket plus one for +Inf, then the sum
+        self.latency: Dict[str, List[float]] = {}
+        self.websockets: Dict[str, int] = {}
+        # Latest latencies per plugin; sorted only when percentiles are read
+        self.recent: Dict[str, deque] = {}
+
+    def observe(self, plugin: str, status: int, seconds: float):
+        key = (plugin, str(status))
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get(plugin)
+        if histogram is None:
+            histogram = self.latency[plugin] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+        histogram[-1] += seconds
+        recent = self.recent.get(plugin)
+        if recent is None:
+            recent = self.recent[plugin] = deque(maxlen=RECENT_REQUESTS)
+        recent.append(seconds)
+
+    def percentiles(self) -> Dict[str, Dict]:
+        # Over the last RECENT_REQUESTS requests of each plugin, in ms
+        report = {}
+        for plugin, recent in sorted(self.recent.items()):
+            latencies = sorted(recent)
+            report[plugin] = {
+                "requests": sum(count for (owner, _), count in self.requests.items() if owner == plugin),
+                **{f"p{p}_ms": round(latencies[min(len(latencies) - 1, len(latencies) * p // 100)] * 1000, 2)
+                   for p in PERCENTILES},
+                "max_ms": round(latencies[-1] * 1000, 2),
+            }
+        return report
+
+    def families(self) -> List[MetricFamily]:
+        requests = MetricFamily("pi_cm_http_requests", "counter", "HTTP requests by owning plugin and status code.")
+        for (plugin, code), count in sorted(self.requests.items()):
+            requests.add(count, "_total", plugin=plugin, code=code)
+        latency = MetricFamily("pi_cm_http_request_duration_seconds", "histogram",
+                               "HTTP request latency by owning plugin.")
+        for plugin, histogram in sorted(self.latency.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histogram):
+                cumulative += count
+                latency.add(cumulative, "_bucket", plugin=plugin, le=format_value(float(bound)))
+            latency.add(cumulative, "_count", plugin=plugin)
+            latency.add(histogram[-1], "_sum", plugin=plugin)
+        websockets = gauge("pi_cm_open_websockets", "Open websocket connections by owning plugin.")
+        for plugin, count in sorted(self.websockets.items()):
+            websockets.add(count, plugin=plugin)
+        return [requests, latency, websockets]
+
+class RequestMetricsMiddleware:
+    # The plugin dispatcher adds the owning plugin to the scope when it
+    # matches a request; anything else is counted as "core".
+
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            await self.handle_http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self.handle_websocket(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def handle_http(self, scope: Scope, receive: Receive, send: Send):
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.observe(scope.get("plugin", CORE), status, time.perf_counter() - started)
+
+    async def handle_websocket(self, scope: Scope, receive: Receive, send: Send):
+        plugin = None
+        websockets = self.metrics.websockets
+
+        async def send_wrapper(message: Message):
+            nonlocal plugin
+            if message["type"] == "websocket.accept" and plugin is None:
+                plugin = scope.get("plugin", CORE)
+                websockets[plugin] = websockets.get(plugin, 0) + 1
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if plugin is not None:
+                websockets[plugin] -= 1
@@ -0,0 +1,137 @@
+# backend/core/perf.py
+
+import asyncio
+import gc
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Event loop stalls at least this long are reported, with the code that ran
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+HEARTBEAT_INTERVAL = 0.05  # Seconds between loop heartbeats and watchdog checks
+MAX_STALLS = 50  # Recent stalls kept for /debug/perf
+STACK_DEPTH = 5  # Backend frames shown per stall
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def describe_frame(frame) -> str:
+    path = frame.f_code.co_filename
+    if path.startswith(BACKEND_DIR + os.sep):
+        path = os.path.relpath(path, BACKEND_DIR)
+    return f"{path}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+def describe_stack(frame) -> Dict:
+    # The innermost frame says what was running; the backend frames around
+    # it say which handler called it
+    innermost = describe_frame(frame)
+    backend = []
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(BACKEND_DIR + os.sep) and frame.f_code.co_filename != __file__:
+            backend.append(describe_frame(frame))
+        frame = frame.f_back
+    return {
+        "handler": backend[0] if backend else innermost,
+        "innermost": innermost,
+        "stack": backend[:STACK_DEPTH],
+    }
+
+class LoopMonitor:
+    # A heartbeat task measures how late the event loop wakes it up. A
+    # watchdog thread checks the heartbeat; when it is overdue it takes the
+    # stack of the loop thread, which names the callback that is blocking.
+    # GC pauses are timed as well, since they stall the loop the same way.
+
+    def __init__(self, threshold_ms: float = LOOP_LAG_THRESHOLD_MS, interval: float = HEARTBEAT_INTERVAL,
+                 max_stalls: int = MAX_STALLS):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.stalls = deque(maxlen=max_stalls)
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self.beats = 0
+        self.total_lag = 0.0
+        self.gc: Dict[int, Dict] = {}
+        self.beat = time.monotonic()
+        self.blocked: Optional[Dict] = None  # Stack taken by the watchdog during a stall
+        self._gc_started: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread: Optional[int] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self.beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self.heartbeat())
+        self._thread = threading.Thread(target=self.watchdog, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        gc.callbacks.append(self.on_gc)
+
+    def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        self._stopped.set()
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+
+    async def heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.beat = now
+            self.beats += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.record_stall(lag)
+            self.blocked = None
+
+    def record_stall(self, lag: float):
+        self.stall_count += 1
+        stall = {"at": round(time.time(), 3), "lag_ms": round(lag * 1000, 1)}
+        # Short stalls can end before the watchdog looks
+        stall.update(self.blocked or {"handler": None})
+        self.stalls.append(stall)
+        print(f"Event loop blocked for {stall['lag_ms']} ms by {stall['handler'] or 'unknown code'}.")
+
+    def watchdog(self):
+        while not self._stopped.wait(self.interval):
+            if self.blocked is None and time.monotonic() - self.beat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self.blocked = describe_stack(frame)
+
+    def on_gc(self, phase: str, info: Dict):
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            pause = time.perf_counter() - self._gc_started
+            self._gc_started = None
+            stats = self.gc.setdefault(info["generation"], {"collections": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["collections"] += 1
+            stats["total_ms"] += pause * 1000
+            stats["max_ms"] = max(stats["max_ms"], pause * 1000)
+
+    def report(self) -> Dict:
+        return {
+            "running": self._task is not None,
+            "threshold_ms": self.threshold * 1000,
+            "mean_lag_ms": round(self.total_lag / self.beats * 1000, 2) if self.beats else None,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stall_count,
+            "recent_stalls": list(self.stalls),
+            "gc": {
+                str(generation): {**stats, "total_ms": round(stats["total_ms"], 2), "max_ms": round(stats["max_ms"], 2)}
+                for generation, stats in sorted(self.gc.items())
+            },
+        }
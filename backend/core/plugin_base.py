@@ -1,8 +1,33 @@
 # backend/core/plugin_base.py
 
 from fastapi import APIRouter
+from core.cache import response_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Plugin parameters kept in the manifest and the settings file
+PLUGIN_ATTRS = ['name', 'icon', 'description', 'version', 'author', 'enabled', 'position']
+PLUGIN_ATTR_TYPES = {'name': str, 'icon': str, 'description': str, 'version': str, 'author': str,
+                     'enabled': bool, 'position': int}
+
+def valid_settings(settings: dict) -> dict:
+    # Plugin parameters from a manifest or the settings file; values of the
+    # wrong type (e.g. a hand-edited "position": "top") are ignored
+    valid = {}
+    for attr in PLUGIN_ATTRS:
+        if attr not in settings:
+            continue
+        value = settings[attr]
+        expected = PLUGIN_ATTR_TYPES[attr]
+        if isinstance(value, expected) and not (expected is int and isinstance(value, bool)):
+            valid[attr] = value
+        else:
+            print(f"Ignoring {attr}={value!r} in plugin settings: expected {expected.__name__}.")
+    return valid
 
 class BasePlugin:
+    loaded = True
+    lazy = False
+
     def __init__(self):
         self.name = "Unnamed Plugin"
         self.icon = ""  # Default icon (Nerd Font code)
@@ -11,7 +36,14 @@ class BasePlugin:
         self.author = "Unknown"
         self.enabled = True
         self.position = -1  # Default position
+        # The package name under plugins/, which the plugin manager uses as its id
+        module = type(self).__module__.split('.')
+        self.plugin_id = module[1] if module[0] == 'plugins' and len(module) > 1 else type(self).__module__
         self.router = APIRouter()
+        # Started by the plugin manager while the plugin is enabled
+        self.background_tasks: Dict[str, Callable[[], Awaitable]] = {}
+        # Streams offered on the core /ws endpoint as "<plugin id>.<name>"
+        self.topics: Dict[str, Tuple[Callable, str, Optional[Callable]]] = {}
 
         # Register routes when the plugin is initialized
         self.register_routes()
@@ -20,8 +52,81 @@ class BasePlugin:
         # Method to be overridden by plugins to register their routes
         pass
 
+    def add_background_task(self, name: str, factory: Callable[[], Awaitable]):
+        # factory() returns the coroutine to run; it is called again to
+        # restart the task after a failure
+        self.background_tasks[name] = factory
+
+    def add_topic(self, name: str, run: Callable[[str, Callable[[Any], None]], Awaitable],
+                  mode: str = "latest", check: Optional[Callable[[str], Optional[str]]] = None):
+        # run(topic, publish) produces the topic's values while anyone is
+        # subscribed. "latest" topics publish JSON values of which a slow
+        # client only gets the newest; "append" topics publish text that is
+        # joined. check(argument) vets the part after ':' in the topic name.
+        self.topics[name] = (run, mode, check)
+
+    def cached(self, ttl: float):
+        # Serve a GET route from the shared response cache for `ttl` seconds:
+        #
+        #   @self.router.get("/services")
+        #   @self.cached(ttl=5)
+        #   async def list_services(): ...
+        return response_cache.cached(self.plugin_id, ttl)
+
+    def invalidate_cache(self):
+        # Drop this plugin's cached responses, e.g. after changing state
+        response_cache.invalidate(self.plugin_id)
+
+    # Lifecycle hooks, called by the plugin manager. on_startup/on_shutdown run
+    # once per instance (app start and stop, or a reload); on_enable/on_disable
+    # run when the plugin is switched on or off while the app is up.
+    async def on_startup(self):
+        pass
+
+    async def on_shutdown(self):
+        pass
+
+    async def on_enable(self):
+        pass
+
+    async def on_disable(self):
+        pass
+
+    def collect_metrics(self) -> list:
+        # core.metrics.MetricFamily objects to add to /metrics. Called on every
+        # scrape, so it should only read state the plugin already keeps.
+        return []
+
     def update_from_settings(self, settings: dict):
         # Update plugin parameters from settings if they exist
-        for attr in ['name', 'icon', 'description', 'version', 'author', 'enabled', 'position']:
-            if attr in settings:
-                setattr(self, attr, settings[attr])
+        for attr, value in valid_settings(settings).items():
+            setattr(self, attr, value)
+
+class PluginManifest:
+    # Stands in for a plugin that has not been imported yet, with the
+    # parameters from its plugin.json. "lazy": false plugins are still
+    # imported at startup.
+    loaded = False
+
+    def __init__(self, manifest: dict):
+        self.name = "Unnamed Plugin"
+        self.icon = ""
+        self.description = "No description provided."
+        self.version = "0.1"
+        self.author = "Unknown"
+        self.enabled = True
+        self.position = -1
+        self.lazy = manifest.get('lazy', True)
+        self.update_from_settings(manifest)
+
+    def update_from_settings(self, settings: dict):
+        for attr, value in valid_settings(settings).items():
+            setattr(self, attr, value)
+
+    def settings(self) -> dict:
+        return {attr: getattr(self, attr) for attr in PLUGIN_ATTRS}
+
+    def invalidate_cache(self):
+        # Nothing is cached for a plugin that is not imported here; isolated
+        # plugins serve their routes from their workers
+        pass
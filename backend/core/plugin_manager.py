@@ -1,13 +1,32 @@
 # backend/core/plugin_manager.py
 
+import anyio
+import asyncio
 import importlib
+import inspect
+import json
 import os
 import sys
-from typing import List, Dict
-from core.plugin_base import BasePlugin
-import json
+import time
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional
+from fastapi import APIRouter
+from fastapi.openapi.utils import get_openapi
+from core.plugin_base import PLUGIN_ATTRS, BasePlugin, PluginManifest
+from core.dispatcher import PluginDispatcher
+from core.metrics import gauge
+from core.cache import response_cache
+from core.isolation import IsolatedPlugin
+from core.pubsub import TopicHub
+from core.supervisor import TaskSupervisor
+from settings.store import SettingsStore
 import threading
 
+# Reload a plugin package when its files change (for development)
+PLUGIN_HOT_RELOAD = os.getenv("PLUGIN_HOT_RELOAD", "false").lower() == "true"
+RELOAD_POLL_INTERVAL = 1.0  # Seconds between checks of the plugin files
+PLUGIN_LIST_CACHE = "plugin_list"  # Response cache owner of GET /plugins
+
 class PluginManager:
     def __init__(self, app):
         self.app = app  # Reference to the FastAPI app
@@ -16,15 +35,49 @@ class PluginManager:
         sys.path.append(os.path.abspath(os.path.join(self.plugins_dir, '..')))
         self.plugins: Dict[str, BasePlugin] = {}
         self.enabled_plugins: Dict[str, BasePlugin] = {}
-        self.plugin_routes: Dict[str, List] = {}  # Keep track of plugin routes
+        # One app route dispatches to every enabled plugin's router
+        self.dispatcher = PluginDispatcher()
+        self.app.router.routes.append(self.dispatcher)
+        self.app.openapi = self.openapi
+        # Plugin lifecycle runs inside the app's lifespan; plugins loaded
+        # after startup are started right away
+        self.app_started = False
+        self.started_plugins: Dict[str, BasePlugin] = {}  # Instances whose on_startup ran
+        self.supervisor = TaskSupervisor()
+        self.watch_task: Optional[asyncio.Task] = None
+        # Topics plugins publish on the core /ws endpoint
+        self.hub = TopicHub()
+        self.hub.resolver = self.ensure_started
+        self.load_locks: Dict[str, anyio.Lock] = {}  # Per plugin, held while it is imported on request
+        app_lifespan = self.app.router.lifespan_context
+
+        @asynccontextmanager
+        async def lifespan(app):
+            async with app_lifespan(app) as state:
+                await self.startup()
+                try:
+                    yield state
+                finally:
+                    await self.shutdown()
+
+        self.app.router.lifespan_context = lifespan
+        # Per-plugin import and init cost, for /debug/startup
+        self.timings: Dict[str, Dict] = {}
+        self.startup_ms = 0.0
+        self.ordered_plugins: List[BasePlugin] = []  # Enabled plugins by position, kept up to date
         self.settings_file = os.path.join(os.path.dirname(__file__), '..', 'settings', 'plugins_settings.json')
+        # Settings live in memory; changes reach the file in one debounced write
+        self.settings = SettingsStore(self.settings_file, indent=4)
         self.load_plugins()
 
     def load_plugins(self):
+        started = time.perf_counter()
         # Clear previous plugins and routes
         self.plugins.clear()
         self.enabled_plugins.clear()
-        self.plugin_routes.clear()
+        self.dispatcher.routers.clear()
+        self.dispatcher.loaders.clear()
+        self.timings.clear()
 
         # Load settings
         plugins_settings = self.load_settings()
@@ -32,99 +85,444 @@ class PluginManager:
             plugin_path = os.path.join(self.plugins_dir, plugin_name)
             if os.path.isdir(plugin_path) and '__init__.py' in os.listdir(plugin_path):
                 try:
-                    module = importlib.import_module(f'plugins.{plugin_name}')
-                    plugin_class = getattr(module, 'Plugin', None)
-                    if plugin_class and issubclass(plugin_class, BasePlugin):
-                        plugin_instance: BasePlugin = plugin_class()
-                        # Apply settings overrides
-                        if plugin_name in plugins_settings:
-                            plugin_instance.update_from_settings(plugins_settings[plugin_name])
-                        self.plugins[plugin_name] = plugin_instance
-                        if plugin_instance.enabled:
-                            self.enabled_plugins[plugin_name] = plugin_instance
-                            # Include plugin routes
-                            self.include_plugin_routes(plugin_name, plugin_instance)
+                    manifest_file = os.path.join(plugin_path, 'plugin.json')
+                    if os.path.exists(manifest_file):
+                        # Known from its manifest; imported when first needed
+                        with open(manifest_file, 'r', encoding='utf-8') as f:
+                            manifest = json.load(f)
+                        if manifest.get('isolation'):
+                            # Served by worker threads or processes instead
+                            plugin = IsolatedPlugin(plugin_name, manifest)
+                        else:
+                            plugin = PluginManifest(manifest)
                     else:
-                        print(f"Plugin {plugin_name} does not have a valid Plugin class.")
+                        plugin = self.import_plugin(plugin_name, "startup")
+                        if plugin is None:
+                            continue
+                    # Apply settings overrides
+                    if plugin_name in plugins_settings:
+                        plugin.update_from_settings(plugins_settings[plugin_name])
+                    self.plugins[plugin_name] = plugin
+                    if plugin.enabled:
+                        self.enabled_plugins[plugin_name] = plugin
+                        if not plugin.loaded and not plugin.lazy:
+                            plugin = self.load_plugin(plugin_name, "startup")
+                        # Include plugin routes
+                        self.include_plugin_routes(plugin_name, plugin)
                 except Exception as e:
                     print(f"Error loading plugin {plugin_name}: {e}")
+        self.update_ordering()
+        self.startup_ms = (time.perf_counter() - started) * 1000
+
+    def import_plugin(self, plugin_name: str, trigger: str) -> Optional[BasePlugin]:
+        started = time.perf_counter()
+        module = importlib.import_module(f'plugins.{plugin_name}')
+        imported = time.perf_counter()
+        plugin_class = getattr(module, 'Plugin', None)
+        if not (plugin_class and issubclass(plugin_class, BasePlugin)):
+            print(f"Plugin {plugin_name} does not have a valid Plugin class.")
+            return None
+        plugin_instance: BasePlugin = plugin_class()
+        self.timings[plugin_name] = {
+            "trigger": trigger,
+            "import_ms": round((imported - started) * 1000, 2),
+            "init_ms": round((time.perf_counter() - imported) * 1000, 2),
+        }
+        return plugin_instance
+
+    def load_plugin(self, plugin_name: str, trigger: str,
+                    plugin_instance: Optional[BasePlugin] = None) -> BasePlugin:
+        # Replaces a manifest with the imported plugin (or `plugin_instance`,
+        # imported by the caller)
+        manifest = self.plugins[plugin_name]
+        if manifest.loaded:
+            return manifest
+        if plugin_instance is None:
+            plugin_instance = self.import_plugin(plugin_name, trigger)
+        if plugin_instance is None:
+            raise ImportError(f"Plugin {plugin_name} does not have a valid Plugin class.")
+        # Settings and updates made before it was loaded carry over
+        plugin_instance.update_from_settings(manifest.settings())
+        plugin_instance.lazy = manifest.lazy
+        self.plugins[plugin_name] = plugin_instance
+        if plugin_name in self.enabled_plugins:
+            self.enabled_plugins[plugin_name] = plugin_instance
+            self.update_ordering()
+        return plugin_instance
+
+    async def load_on_request(self, plugin_name: str):
+        # Dispatcher loader for lazy plugins. The import runs in a worker
+        # thread, once even when several first requests arrive together.
+        async with self.load_locks.setdefault(plugin_name, anyio.Lock()):
+            plugin_instance = self.plugins[plugin_name]
+            if plugin_instance.loaded:
+                # Loaded by the request holding the lock before this one
+                return self.dispatcher.routers.get(plugin_name)
+            try:
+                imported = await anyio.to_thread.run_sync(self.import_plugin, plugin_name, "request")
+                if imported is None:
+                    raise ImportError(f"Plugin {plugin_name} does not have a valid Plugin class.")
+                if plugin_name not in self.dispatcher.loaders:
+                    # Disabled while it was imported
+                    return None
+                plugin_instance = self.load_plugin(plugin_name, "request", imported)
+            except Exception as e:
+                print(f"Error loading plugin {plugin_name}: {e}")
+                self.dispatcher.unmount(plugin_name)
+                return None
+        self.include_plugin_routes(plugin_name, plugin_instance)
+        if self.app_started:
+            # The request is served while on_startup is still running
+            asyncio.ensure_future(self.start_plugin(plugin_name))
+        return plugin_instance.router
+
+    async def startup(self):
+        self.app_started = True
+        for plugin_name in list(self.enabled_plugins):
+            await self.start_plugin(plugin_name)
+        if PLUGIN_HOT_RELOAD:
+            self.watch_task = asyncio.ensure_future(self.watch_plugins())
+
+    async def shutdown(self):
+        if self.watch_task is not None:
+            self.watch_task.cancel()
+            self.watch_task = None
+        for plugin_name, plugin_instance in list(self.started_plugins.items()):
+            await self.stop_plugin(plugin_name, plugin_instance)
+        self.app_started = False
+
+    async def call_hook(self, plugin_name: str, hook):
+        # A failing hook is reported but does not take the app down
+        try:
+            result = hook()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"Error in {getattr(hook, '__name__', 'hook')} of plugin {plugin_name}: {e}")
+
+    async def start_plugin(self, plugin_name: str):
+        plugin_instance = self.plugins[plugin_name]
+        if not plugin_instance.loaded or self.started_plugins.get(plugin_name) is plugin_instance:
+            return
+        self.started_plugins[plugin_name] = plugin_instance
+        # Plain router startup handlers are still honoured
+        for handler in plugin_instance.router.on_startup:
+            await self.call_hook(plugin_name, handler)
+        await self.call_hook(plugin_name, plugin_instance.on_startup)
+        if plugin_instance.enabled:
+            self.start_background_tasks(plugin_name, plugin_instance)
+            self.register_topics(plugin_name, plugin_instance)
+
+    async def ensure_started(self, plugin_name: str):
+        # Hub resolver: a subscription to a lazy plugin's topic loads it
+        if plugin_name not in self.enabled_plugins or not self.app_started:
+            return
+        if not self.plugins[plugin_name].loaded and await self.load_on_request(plugin_name) is None:
+            return
+        await self.start_plugin(plugin_name)
+
+    async def stop_plugin(self, plugin_name: str, plugin_instance: BasePlugin):
+        if self.started_plugins.get(plugin_name) is not plugin_instance:
+            return
+        del self.started_plugins[plugin_name]
+        self.hub.remove_provider(plugin_name)
+        # A replacement instance starts with an empty cache
+        response_cache.forget(plugin_name)
+        await self.supervisor.stop(plugin_name)
+        await self.call_hook(plugin_name, plugin_instance.on_shutdown)
+        for handler in plugin_instance.router.on_shutdown:
+            await self.call_hook(plugin_name, handler)
+
+    def start_background_tasks(self, plugin_name: str, plugin_instance: BasePlugin):
+        for task_name, factory in plugin_instance.background_tasks.items():
+            self.supervisor.start(plugin_name, task_name, factory)
+
+    def register_topics(self, plugin_name: str, plugin_instance: BasePlugin):
+        for topic_name, (run, mode, check) in plugin_instance.topics.items():
+            self.hub.add_provider(plugin_name, f"{plugin_name}.{topic_name}", run, mode, check)
+
+    def health_report(self) -> Dict:
+        tasks = self.supervisor.health()
+        return {
+            plugin_name: {
+                "loaded": plugin.loaded,
+                "enabled": plugin.enabled,
+                "started": self.started_plugins.get(plugin_name) is plugin,
+                "tasks": tasks.get(plugin_name, {}),
+                **({"workers": plugin.router.health()} if isinstance(plugin, IsolatedPlugin) else {}),
+            }
+            for plugin_name, plugin in self.plugins.items()
+        }
+
+    def collect_metrics(self) -> List:
+        up = gauge("pi_cm_plugin_up", "Whether the plugin is enabled and started.")
+        for plugin_name, plugin in self.plugins.items():
+            up.add(plugin.enabled and self.started_plugins.get(plugin_name) is plugin, plugin=plugin_name)
+        families = [up, gauge("pi_cm_topic_connections", "Open connections to the /ws endpoint.",
+                              len(self.hub.connections))]
+        for plugin_name, plugin_instance in list(self.started_plugins.items()):
+            if not hasattr(plugin_instance, 'collect_metrics'):
+                continue
+            try:
+                families.extend(plugin_instance.collect_metrics())
+            except Exception as e:
+                print(f"Error collecting metrics of plugin {plugin_name}: {e}")
+        return families
+
+    def plugin_mtimes(self) -> Dict[str, float]:
+        # Newest modification time of the files in each plugin package
+        mtimes = {}
+        for plugin_name in self.plugins:
+            newest = 0.0
+            for root, dirs, files in os.walk(os.path.join(self.plugins_dir, plugin_name)):
+                dirs[:] = [d for d in dirs if d != '__pycache__']
+                for file_name in files:
+                    if file_name.endswith(('.py', '.json')):
+                        try:
+                            newest = max(newest, os.stat(os.path.join(root, file_name)).st_mtime)
+                        except OSError:
+                            pass
+            mtimes[plugin_name] = newest
+        return mtimes
+
+    async def watch_plugins(self):
+        known = self.plugin_mtimes()
+        while True:
+            await asyncio.sleep(RELOAD_POLL_INTERVAL)
+            current = self.plugin_mtimes()
+            for plugin_name, mtime in current.items():
+                if mtime != known.get(plugin_name):
+                    try:
+                        await self.reload_plugin(plugin_name)
+                        print(f"Reloaded plugin {plugin_name}.")
+                    except Exception as e:
+                        print(f"Error reloading plugin {plugin_name}: {e}")
+            known = current
+
+    def purge_modules(self, plugin_name: str) -> Dict:
+        # Drops the plugin's modules so the next import runs its code afresh;
+        # returns them so a failed reload can put them back
+        package = f'plugins.{plugin_name}'
+        purged = {name: module for name, module in sys.modules.items()
+                  if name == package or name.startswith(package + '.')}
+        for name in purged:
+            del sys.modules[name]
+        parent = sys.modules.get('plugins')
+        if parent is not None and hasattr(parent, plugin_name):
+            delattr(parent, plugin_name)
+        importlib.invalidate_caches()
+        return purged
+
+    async def reload_plugin(self, plugin_name: str) -> bool:
+        # Imports the plugin package again and swaps the new instance in.
+        # Other plugins are untouched; if the new code fails to import, the
+        # old instance keeps serving.
+        if plugin_name not in self.plugins:
+            return False
+        old_instance = self.plugins[plugin_name]
+        old_router = self.dispatcher.routers.get(plugin_name)
+        purged = self.purge_modules(plugin_name)
+        if isinstance(old_instance, IsolatedPlugin):
+            await self.dispatcher.drain(old_instance.router)
+            await old_instance.restart()
+            return True
+        if not old_instance.loaded:
+            # Nothing imported yet; the next load picks up the new code
+            return True
+        try:
+            plugin_instance = self.import_plugin(plugin_name, "reload")
+            if plugin_instance is None:
+                raise ImportError(f"Plugin {plugin_name} does not have a valid Plugin class.")
+        except Exception:
+            self.purge_modules(plugin_name)
+            sys.modules.update(purged)
+            raise
+        plugin_instance.update_from_settings({attr: getattr(old_instance, attr) for attr in PLUGIN_ATTRS})
+        plugin_instance.lazy = old_instance.lazy
+        self.plugins[plugin_name] = plugin_instance
+        if plugin_name in self.enabled_plugins:
+            self.enabled_plugins[plugin_name] = plugin_instance
+            self.update_ordering()
+            self.include_plugin_routes(plugin_name, plugin_instance)
+        # The old instance stops before the new one starts its background work
+        await self.stop_plugin(plugin_name, old_instance)
+        if old_router is not None:
+            await self.dispatcher.drain(old_router)
+        if self.app_started and plugin_instance.enabled:
+            await self.start_plugin(plugin_name)
+        return True
+
+    def startup_report(self) -> Dict:
+        return {
+            "total_ms": round(self.startup_ms, 2),
+            "plugins": {
+                plugin_name: {
+                    "loaded": plugin.loaded,
+                    "lazy": plugin.lazy,
+                    **self.timings.get(plugin_name, {}),
+                }
+                for plugin_name, plugin in self.plugins.items()
+            },
+        }
 
     def include_plugin_routes(self, plugin_name: str, plugin_instance: BasePlugin):
         with self.lock:
-            num_routes_before = len(self.app.router.routes)
-            prefix = f"/plugins/{plugin_name}"
-            self.app.include_router(plugin_instance.router, prefix=prefix, tags=[plugin_instance.name])
-            # Get the routes after including the plugin
-            new_routes = self.app.router.routes[num_routes_before:]
-            # Store the new routes associated with the plugin
-            self.plugin_routes[plugin_name] = new_routes
+            if not plugin_instance.loaded:
+                self.dispatcher.defer(plugin_name, lambda: self.load_on_request(plugin_name))
+                return
+            self.dispatcher.mount(plugin_name, plugin_instance.router)
+            self.app.openapi_schema = None
 
     def get_plugins(self) -> List[BasePlugin]:
         # Return enabled plugins sorted by position
-        return sorted(self.enabled_plugins.values(), key=lambda x: x.position if x.position != -1 else float('inf'))
+        return list(self.ordered_plugins)
+
+    def update_ordering(self):
+        # Called whenever positions or the enabled set change, not on every read
+        self.ordered_plugins = self.ordering()
+
+    def ordering(self, changes: Optional[Dict[str, Dict]] = None) -> List[BasePlugin]:
+        # Enabled plugins by position, as they would be with `changes`
+        # ({plugin id: {attr: value}}) applied
+        changes = changes or {}
 
-    def enable_plugin(self, plugin_name: str):
+        def position(plugin_name: str):
+            position = changes.get(plugin_name, {}).get('position', self.enabled_plugins[plugin_name].position)
+            return position if position != -1 else float('inf')
+
+        return [self.enabled_plugins[plugin_name] for plugin_name in sorted(self.enabled_plugins, key=position)]
+
+    async def enable_plugin(self, plugin_name: str):
         if plugin_name in self.plugins:
-            self.plugins[plugin_name].enabled = True
-            self.enabled_plugins[plugin_name] = self.plugins[plugin_name]
+            plugin_instance = self.plugins[plugin_name]
+            if plugin_instance.enabled and self.started_plugins.get(plugin_name) is plugin_instance:
+                # Already enabled and running
+                return True
+            # Loaded first, so a plugin that fails to import is not left enabled
+            plugin_instance = self.load_plugin(plugin_name, "enable")
+            plugin_instance.enabled = True
+            self.enabled_plugins[plugin_name] = plugin_instance
+            self.update_ordering()
             # Include plugin routes
-            self.include_plugin_routes(plugin_name, self.plugins[plugin_name])
+            self.include_plugin_routes(plugin_name, plugin_instance)
             self.save_plugin_settings(plugin_name)
+            if self.app_started:
+                if self.started_plugins.get(plugin_name) is not plugin_instance:
+                    await self.start_plugin(plugin_name)
+                await self.call_hook(plugin_name, plugin_instance.on_enable)
+                self.start_background_tasks(plugin_name, plugin_instance)
+                self.register_topics(plugin_name, plugin_instance)
             return True
         return False
 
-    def disable_plugin(self, plugin_name: str):
+    async def disable_plugin(self, plugin_name: str):
         if plugin_name in self.plugins:
-            self.plugins[plugin_name].enabled = False
+            plugin_instance = self.plugins[plugin_name]
+            plugin_instance.enabled = False
             if plugin_name in self.enabled_plugins:
                 del self.enabled_plugins[plugin_name]
+                self.update_ordering()
             # Remove plugin routes
             self.remove_plugin_routes(plugin_name)
             self.save_plugin_settings(plugin_name)
+            if self.started_plugins.get(plugin_name) is plugin_instance:
+                # Stop its work, not just its routes
+                self.hub.remove_provider(plugin_name)
+                plugin_instance.invalidate_cache()
+                await self.supervisor.stop(plugin_name)
+                await self.call_hook(plugin_name, plugin_instance.on_disable)
+            if plugin_instance.loaded:
+                await self.dispatcher.drain(plugin_instance.router, code=1001, reason="Plugin disabled")
             return True
         return False
 
     def remove_plugin_routes(self, plugin_name: str):
         with self.lock:
-            if plugin_name in self.plugin_routes:
-                routes_to_remove = self.plugin_routes[plugin_name]
-                # Remove the routes associated with the plugin
-                self.app.router.routes = [route for route in self.app.router.routes if route not in routes_to_remove]
-                del self.plugin_routes[plugin_name]
+            self.dispatcher.unmount(plugin_name)
+            self.app.openapi_schema = None
+
+    def openapi(self):
+        # Plugin routes are not in app.routes, so the schema adds them back
+        if self.app.openapi_schema is None:
+            docs = APIRouter()
+            for plugin_name, router in self.dispatcher.routers.items():
+                if not isinstance(router, APIRouter):
+                    # Isolated plugins are only known by their paths
+                    continue
+                docs.include_router(router, prefix=f"/plugins/{plugin_name}", tags=[self.plugins[plugin_name].name])
+            self.app.openapi_schema = get_openapi(
+                title=self.app.title,
+                version=self.app.version,
+                routes=[route for route in self.app.routes if route is not self.dispatcher] + docs.routes,
+            )
+        return self.app.openapi_schema
 
     def set_plugin_position(self, plugin_name: str, position: int):
         if plugin_name in self.plugins:
             with self.lock:
                 self.plugins[plugin_name].position = position
+                self.update_ordering()
                 self.save_plugin_settings(plugin_name)
             return True
         return False
 
-    def update_plugin_attribute(self, plugin_name: str, attr: str, value):
+    async def update_plugin_attribute(self, plugin_name: str, attr: str, value):
+        return await self.update_plugin_attributes(plugin_name, {attr: value})
+
+    async def update_plugin_attributes(self, plugin_name: str, values: Dict):
         if plugin_name in self.plugins:
-            with self.lock:
-                setattr(self.plugins[plugin_name], attr, value)
-                self.save_plugin_settings(plugin_name)
+            await self.apply_batch([], {plugin_name: values})
             return True
         return False
 
+    async def apply_batch(self, order: List[str], updates: Dict[str, Dict]):
+        # Applies attribute patches, then positions 0..n-1 following `order`,
+        # under one lock with one save. Callers validate names and types
+        # first; the new ordering is built before any plugin is changed.
+        # `enabled` patches then go through enable_plugin / disable_plugin,
+        # so routes, background tasks and topics follow the flag.
+        toggles = {}
+        with self.lock:
+            changes = {}
+            for plugin_name, values in updates.items():
+                changes[plugin_name] = dict(values)
+                enabled = changes[plugin_name].pop('enabled', None)
+                if enabled is not None and enabled != self.plugins[plugin_name].enabled:
+                    toggles[plugin_name] = enabled
+            for position, plugin_name in enumerate(order):
+                changes.setdefault(plugin_name, {})['position'] = position
+            ordered = self.ordering(changes)
+            for plugin_name, values in changes.items():
+                for attr, value in values.items():
+                    setattr(self.plugins[plugin_name], attr, value)
+            self.ordered_plugins = ordered
+            self.save_plugins_settings(changes)
+        for plugin_name, enabled in toggles.items():
+            if enabled:
+                await self.enable_plugin(plugin_name)
+            else:
+                await self.disable_plugin(plugin_name)
+
     def load_settings(self):
-        if not os.path.exists(self.settings_file):
-            return {}
-        with open(self.settings_file, 'r') as f:
-            return json.load(f)
+        return self.settings.load()
 
     def save_plugin_settings(self, plugin_name: str):
-        settings = self.load_settings()
-        if plugin_name not in settings:
-            settings[plugin_name] = {}
-        plugin = self.plugins[plugin_name]
-        settings[plugin_name]['enabled'] = plugin.enabled
-        settings[plugin_name]['position'] = plugin.position
-        settings[plugin_name]['name'] = plugin.name
-        settings[plugin_name]['icon'] = plugin.icon
-        settings[plugin_name]['description'] = plugin.description
-        settings[plugin_name]['version'] = plugin.version
-        settings[plugin_name]['author'] = plugin.author
-        with open(self.settings_file, 'w') as f:
-            json.dump(settings, f, indent=4)
+        self.save_plugins_settings([plugin_name])
+
+    def save_plugins_settings(self, plugin_names):
+        with self.settings.lock:
+            settings = self.settings.load()
+            for plugin_name in plugin_names:
+                plugin = self.plugins[plugin_name]
+                if plugin_name not in settings:
+                    settings[plugin_name] = {}
+                settings[plugin_name]['enabled'] = plugin.enabled
+                settings[plugin_name]['position'] = plugin.position
+                settings[plugin_name]['name'] = plugin.name
+                settings[plugin_name]['icon'] = plugin.icon
+                settings[plugin_name]['description'] = plugin.description
+                settings[plugin_name]['version'] = plugin.version
+                settings[plugin_name]['author'] = plugin.author
+            self.settings.save()
+        # Every change to the plugin list is saved through here
+        response_cache.invalidate(PLUGIN_LIST_CACHE)
@@ -0,0 +1,258 @@
+# backend/core/pubsub.py
+
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+TOPIC_MODES = ("latest", "append")
+MAX_PENDING_BYTES = 256 * 1024  # Per topic and connection, for "append" topics
+KEEPALIVE_INTERVAL = 30.0  # Seconds of silence before the server pings
+
+class Provider:
+    def __init__(self, owner: str, run: Callable[[str, Callable[[Any], None]], Awaitable],
+                 mode: str, check: Optional[Callable[[str], Optional[str]]]):
+        self.owner = owner
+        self.run = run
+        self.mode = mode
+        self.check = check
+
+class Topic:
+    def __init__(self, name: str, provider: Provider):
+        self.name = name
+        self.provider = provider
+        self.subscribers: Set['Connection'] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.published = 0
+
+class Connection:
+    # One client of /ws. Everything it is sent goes through `pending`, keyed by
+    # topic: a "latest" topic keeps only its newest value and an "append"
+    # topic joins its text, so a slow client gets fewer, bigger frames
+    # instead of an ever-growing queue.
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.topics: Set[str] = set()
+        self.pending: 'OrderedDict[str, Any]' = OrderedDict()
+        self.skipped: Dict[str, int] = {}
+        self.control: List[str] = []
+        self.coalesced = 0
+        self._ready = asyncio.Event()
+
+    def offer(self, topic: str, mode: str, data: Any):
+        # data is the JSON-encoded value for "latest" topics, text otherwise
+        if mode == "latest":
+            if topic in self.pending:
+                self.coalesced += 1
+            self.pending[topic] = data
+        else:
+            chunks = self.pending.setdefault(topic, [])
+            chunks.append(data)
+            size = sum(len(chunk) for chunk in chunks)
+            while size > MAX_PENDING_BYTES and len(chunks) > 1:
+                dropped = chunks.pop(0)
+                size -= len(dropped)
+                self.skipped[topic] = self.skipped.get(topic, 0) + len(dropped)
+                self.coalesced += 1
+        self._ready.set()
+
+    def send_control(self, message: Dict):
+        self.control.append(json.dumps(message))
+        self._ready.set()
+
+    def next_frame(self) -> Optional[str]:
+        if self.control:
+            return self.control.pop(0)
+        if not self.pending:
+            return None
+        topic, data = self.pending.popitem(last=False)
+        if isinstance(data, list):
+            text = ''.join(data)
+            skipped = self.skipped.pop(topic, 0)
+            if skipped:
+                text = f"[... {skipped} bytes skipped ...]\n{text}"
+            data = json.dumps(text)
+        return f'{{"topic":{json.dumps(topic)},"data":{data}}}'
+
+    async def sender(self):
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    frame = '{"op":"ping"}'
+                else:
+                    continue
+            await self.websocket.send_text(frame)
+
+class TopicHub:
+    # Plugins register topic providers; clients of the core /ws endpoint
+    # subscribe to topics by name. A topic's provider runs once, while the
+    # topic has subscribers, and each value it publishes is encoded once and
+    # handed to every subscribed connection.
+    #
+    # Topic names are "<plugin>.<stream>", optionally followed by ":<argument>"
+    # (e.g. "log_viewer.logs:/var/log/syslog"); the provider is found by the
+    # part before the colon.
+
+    def __init__(self):
+        self.providers: Dict[str, Provider] = {}
+        self.topics: Dict[str, Topic] = {}
+        self.connections: Set[Connection] = set()
+        # Called with a plugin name before subscribing to one of its topics,
+        # so plugins that are not loaded yet can register their providers
+        self.resolver: Optional[Callable[[str], Awaitable]] = None
+
+    def add_provider(self, owner: str, name: str, run: Callable[[str, Callable[[Any], None]], Awaitable],
+                     mode: str = "latest", check: Optional[Callable[[str], Optional[str]]] = None):
+        # run(topic, publish) is started for the first subscriber and cancelled
+        # after the last one leaves; when it returns the topic is closed.
+        # check(argument) returns an error message to refuse a subscription.
+        if mode not in TOPIC_MODES:
+            raise ValueError(f"Unknown topic mode '{mode}'.")
+        if not name.startswith(owner + "."):
+            raise ValueError(f"Topic '{name}' must start with '{owner}.'.")
+        self.providers[name] = Provider(owner, run, mode, check)
+
+    def remove_provider(self, owner: str):
+        # Called when the owning plugin stops; its topics are closed
+        for name in [name for name, provider in self.providers.items() if provider.owner == owner]:
+            del self.providers[name]
+        for topic in list(self.topics.values()):
+            if topic.provider.owner == owner:
+                self.close_topic(topic, "Topic is no longer available.")
+
+    def publish(self, topic_name: str, data: Any, encoded: Optional[str] = None):
+        # `encoded` passes a value already serialized as JSON
+        topic = self.topics.get(topic_name)
+        if topic is None or not topic.subscribers:
+            return
+        topic.published += 1
+        if topic.provider.mode == "latest":
+            data = encoded if encoded is not None else json.dumps(data, separators=(',', ':'))
+        for connection in topic.subscribers:
+            connection.offer(topic_name, topic.provider.mode, data)
+
+    async def subscribe(self, connection: Connection, topic_name: str) -> Optional[str]:
+        # Returns an error message, or None once subscribed
+        if topic_name in connection.topics:
+            return None
+        name, _, argument = topic_name.partition(":")
+        if name not in self.providers and self.resolver is not None:
+            await self.resolver(name.split(".", 1)[0])
+        provider = self.providers.get(name)
+        if provider is None:
+            return f"Unknown topic '{topic_name}'."
+        if provider.check is not None:
+            error = provider.check(argument)
+            if error:
+                return error
+        topic = self.topics.get(topic_name)
+        if topic is None:
+            topic = self.topics[topic_name] = Topic(topic_name, provider)
+        topic.subscribers.add(connection)
+        connection.topics.add(topic_name)
+        if topic.task is None:
+            topic.task = asyncio.ensure_future(self._run(topic))
+        return None
+
+    def unsubscribe(self, connection: Connection, topic_name: str):
+        connection.topics.discard(topic_name)
+        connection.pending.pop(topic_name, None)
+        connection.skipped.pop(topic_name, None)
+        topic = self.topics.get(topic_name)
+        if topic is None:
+            return
+        topic.subscribers.discard(connection)
+        if not topic.subscribers:
+            del self.topics[topic_name]
+            if topic.task is not None:
+                topic.task.cancel()
+
+    async def _run(self, topic: Topic):
+        try:
+            await topic.provider.run(topic.name, lambda data, encoded=None: self.publish(topic.name, data, encoded))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in topic {topic.name}: {e}")
+            self.close_topic(topic, str(e))
+            return
+        self.close_topic(topic, None)
+
+    def close_topic(self, topic: Topic, reason: Optional[str]):
+        if self.topics.get(topic.name) is not topic:
+            return
+        del self.topics[topic.name]
+        if topic.task is not None and topic.task is not asyncio.current_task():
+            topic.task.cancel()
+        for connection in topic.subscribers:
+            # Values already published are still delivered before the notice
+            connection.topics.discard(topic.name)
+            message = {"op": "closed", "topic": topic.name}
+            if reason:
+                message["reason"] = reason
+            connection.send_control(message)
+        topic.subscribers.clear()
+
+    async def handle_message(self, connection: Connection, message: Any):
+        if not isinstance(message, dict) or not isinstance(message.get("topic"), str):
+            connection.send_control({"op": "error", "detail": "Expected {\"op\": ..., \"topic\": ...}."})
+            return
+        op, topic_name = message.get("op"), message["topic"]
+        if op == "subscribe":
+            error = await self.subscribe(connection, topic_name)
+            if error:
+                connection.send_control({"op": "error", "topic": topic_name, "detail": error})
+            else:
+                connection.send_control({"op": "subscribed", "topic": topic_name})
+        elif op == "unsubscribe":
+            self.unsubscribe(connection, topic_name)
+            connection.send_control({"op": "unsubscribed", "topic": topic_name})
+        else:
+            connection.send_control({"op": "error", "topic": topic_name, "detail": f"Unknown op '{op}'."})
+
+    async def serve(self, websocket: WebSocket):
+        # Client messages: {"op": "subscribe" | "unsubscribe", "topic": name}.
+        # Server messages: {"topic": name, "data": value} for topic data, and
+        # {"op": "subscribed" | "unsubscribed" | "closed" | "error" | "ping", ...}.
+        await websocket.accept()
+        connection = Connection(websocket)
+        self.connections.add(connection)
+        sender = asyncio.ensure_future(connection.sender())
+        try:
+            while True:
+                receiver = asyncio.ensure_future(websocket.receive_text())
+                done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+                if sender in done:
+                    # The client went away while we were sending
+                    receiver.cancel()
+                    sender.result()
+                    break
+                try:
+                    message = json.loads(receiver.result())
+                except ValueError:
+                    connection.send_control({"op": "error", "detail": "Messages must be JSON."})
+                    continue
+                await self.handle_message(connection, message)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            print(f"Error in /ws connection: {e}")
+        finally:
+            sender.cancel()
+            self.connections.discard(connection)
+            for topic_name in list(connection.topics):
+                self.unsubscribe(connection, topic_name)
+
+    def stats(self) -> Dict:
+        return {
+            "connections": len(self.connections),
+            "topics": {name: {"subscribers": len(topic.subscribers), "published": topic.published}
+                       for name, topic in self.topics.items()},
+        }
@@ -0,0 +1,87 @@
+# backend/core/supervisor.py
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+INITIAL_BACKOFF = 1.0  # Seconds before the first restart of a failed task
+MAX_BACKOFF = 60.0  # Upper bound for the doubling restart delay
+STABLE_AFTER = 60.0  # A run at least this long resets the backoff
+
+class SupervisedTask:
+    def __init__(self, plugin_name: str, name: str, factory: Callable[[], Awaitable]):
+        self.plugin_name = plugin_name
+        self.name = name
+        self.factory = factory
+        self.state = "starting"  # running, backoff, finished or stopped
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def health(self) -> Dict:
+        return {
+            "state": self.state,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "uptime": round(time.monotonic() - self.started_at, 1) if self.state == "running" else None,
+        }
+
+class TaskSupervisor:
+    # Runs plugin background tasks. A task that raises is restarted after a
+    # delay that doubles on every quick failure; a task that returns is done.
+    # All tasks of a plugin are cancelled together when it is disabled.
+
+    def __init__(self, initial_backoff: float = INITIAL_BACKOFF, max_backoff: float = MAX_BACKOFF):
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.tasks: Dict[str, Dict[str, SupervisedTask]] = {}
+
+    def start(self, plugin_name: str, name: str, factory: Callable[[], Awaitable]):
+        # factory() returns a fresh coroutine for every (re)start
+        tasks = self.tasks.setdefault(plugin_name, {})
+        entry = tasks.get(name)
+        if entry is not None and entry.task is not None and not entry.task.done():
+            return
+        entry = SupervisedTask(plugin_name, name, factory)
+        entry.task = asyncio.ensure_future(self._supervise(entry))
+        tasks[name] = entry
+
+    async def _supervise(self, entry: SupervisedTask):
+        backoff = self.initial_backoff
+        while True:
+            entry.state = "running"
+            entry.started_at = time.monotonic()
+            try:
+                await entry.factory()
+                entry.state = "finished"
+                return
+            except asyncio.CancelledError:
+                entry.state = "stopped"
+                raise
+            except Exception as e:
+                entry.last_error = f"{type(e).__name__}: {e}"
+                print(f"Background task {entry.plugin_name}.{entry.name} failed: {entry.last_error}")
+            if time.monotonic() - entry.started_at >= STABLE_AFTER:
+                backoff = self.initial_backoff
+            entry.state = "backoff"
+            entry.restarts += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def stop(self, plugin_name: str):
+        tasks = self.tasks.pop(plugin_name, {})
+        for entry in tasks.values():
+            entry.task.cancel()
+        if tasks:
+            await asyncio.gather(*(entry.task for entry in tasks.values()), return_exceptions=True)
+
+    async def stop_all(self):
+        for plugin_name in list(self.tasks):
+            await self.stop(plugin_name)
+
+    def health(self) -> Dict[str, Dict]:
+        return {
+            plugin_name: {name: entry.health() for name, entry in tasks.items()}
+            for plugin_name, tasks in self.tasks.items()
+        }
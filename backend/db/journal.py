@@ -0,0 +1,145 @@
+# backend/db/journal.py
+
+import bisect
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+JOURNAL_FILE = os.path.join(os.path.dirname(__file__), 'command_tasks.jsonl')
+FLUSH_INTERVAL = 0.2  # Seconds state changes are grouped before one write + fsync
+MAX_RECORDS = 5000  # Tasks kept when the journal is compacted
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+class TaskJournal:
+    # Append-only JSON-lines journal of command task states. Every state
+    # change appends one line; a background thread writes whatever piled up
+    # during FLUSH_INTERVAL with a single fsync. On start the file is replayed
+    # into an in-memory index by task id and by queue time, and it is
+    # rewritten (atomically) only when dead lines outnumber live ones.
+
+    def __init__(self, path: str = JOURNAL_FILE, flush_interval: float = FLUSH_INTERVAL,
+                 max_records: int = MAX_RECORDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_records = max_records
+        self.records: Dict[str, Dict] = {}
+        self.by_time: List[tuple] = []  # Sorted (queued_at, task_id)
+        self._pending: List[str] = []
+        self._lines = 0
+        self._cond = threading.Condition()  # Guards the index and _pending; never held during I/O
+        self._io = threading.Lock()  # One writer of the file at a time
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            for line in f:
+                self._lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    continue
+                self._index(record)
+        # Tasks that were in flight when the backend stopped never finished
+        for record in list(self.records.values()):
+            if record.get("status") not in FINISHED_STATES:
+                self.record(record["task_id"], dict(
+                    record, status="failed", success=False, error="Interrupted by backend restart."
+                ))
+
+    def _index(self, record: Dict):
+        task_id = record["task_id"]
+        if task_id not in self.records:
+            bisect.insort(self.by_time, (record.get("queued_at") or "", task_id))
+        self.records[task_id] = record
+
+    def record(self, task_id: str, status: Dict):
+        record = dict(status, task_id=task_id)
+        line = json.dumps(record) + "\n"
+        with self._cond:
+            self._index(record)
+            self._pending.append(line)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="task-journal", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        return self.records.get(task_id)
+
+    def query(self, command_key: Optional[str] = None, status: Optional[str] = None,
+              limit: int = 50) -> List[Dict]:
+        # Newest first. Compaction may drop records meanwhile, so the index
+        # is read under the lock; it is only held for in-memory work.
+        results = []
+        with self._cond:
+            for _, task_id in reversed(self.by_time):
+                record = self.records[task_id]
+                if command_key is not None and record.get("command_key") != command_key:
+                    continue
+                if status is not None and record.get("status") != status:
+                    continue
+                results.append(record)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+            # Let more changes pile up so they share one fsync
+            if not self._closed:
+                with self._cond:
+                    self._cond.wait(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        # Pending lines are swapped out under the lock and written outside
+        # it, so record() on the event loop never waits for an fsync
+        with self._io:
+            with self._cond:
+                lines, self._pending = self._pending, []
+            if not lines:
+                return
+            with open(self.path, 'a') as f:
+                f.write(''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self._lines += len(lines)
+            if self._lines > 2 * len(self.records) + 1000:
+                self._compact()
+
+    def _compact(self):
+        # Keeps the newest max_records tasks, one line each. Changes recorded
+        # while the file is rewritten are still pending and are appended to
+        # the new file by the next flush.
+        with self._cond:
+            if len(self.by_time) > self.max_records:
+                for _, task_id in self.by_time[:-self.max_records]:
+                    del self.records[task_id]
+                self.by_time = self.by_time[-self.max_records:]
+            lines = [json.dumps(self.records[task_id]) + "\n" for _, task_id in self.by_time]
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write(''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+        self._lines = len(lines)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
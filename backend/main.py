@@ -1,9 +1,35 @@
 import os
-from fastapi import FastAPI, HTTPException, Body
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from core.plugin_manager import PluginManager
+from fastapi.responses import Response
+from pydantic import BaseModel, ConfigDict
+from typing import Dict, List, Optional
+from core.cache import response_cache
+from core.metrics import CONTENT_TYPE, RequestMetrics, RequestMetricsMiddleware, render
+from core.perf import LoopMonitor
+from core.plugin_manager import PLUGIN_LIST_CACHE, PluginManager
+from settings.store import flush_all
 
-app = FastAPI()
+# Reports callbacks that block the event loop, at /debug/perf
+PERF_MONITOR = os.getenv("PERF_MONITOR", "true").lower() == "true"
+loop_monitor = LoopMonitor()
+
+@asynccontextmanager
+async def lifespan(app):
+    # The plugin manager runs inside this: plugins start after the code
+    # before yield and have stopped before the code after it runs
+    if PERF_MONITOR:
+        loop_monitor.start()
+    try:
+        yield
+    finally:
+        # Write out settings changes still waiting for their debounce,
+        # including any made while plugins shut down
+        flush_all()
+        loop_monitor.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS settings
 app.add_middleware(
@@ -14,6 +40,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counts and latency per plugin, exported at /metrics
+request_metrics = RequestMetrics()
+app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+
+class PluginUpdate(BaseModel):
+    # Plugin attributes clients may change. Values of the wrong type are
+    # rejected with 422; other attributes are kept to be refused with 400.
+    model_config = ConfigDict(extra="allow")
+    name: Optional[str] = None
+    icon: Optional[str] = None
+    description: Optional[str] = None
+    version: Optional[str] = None
+    author: Optional[str] = None
+    enabled: Optional[bool] = None
+    position: Optional[int] = None
+
+    def changes(self) -> Dict:
+        # The attributes that were given; null leaves an attribute as it is
+        if self.model_extra:
+            raise HTTPException(status_code=400, detail=f"Attribute '{next(iter(self.model_extra))}' is not allowed.")
+        return self.model_dump(include=set(type(self).model_fields), exclude_unset=True, exclude_none=True)
+
+class PluginBatch(BaseModel):
+    order: List[str] = []
+    updates: Dict[str, PluginUpdate] = {}
+
 # Check environment variable to decide whether to load plugins
 LOAD_PLUGINS = os.getenv("LOAD_PLUGINS", "true").lower() == "true"
 
@@ -28,6 +80,7 @@ async def root():
     return {"message": "Backend is running"}
 
 @app.get("/plugins")
+@response_cache.cached(PLUGIN_LIST_CACHE, ttl=60)  # Invalidated by every change
 async def list_plugins():
     plugins_info = []
     for plugin_name, plugin in plugin_manager.plugins.items():
@@ -43,20 +96,79 @@ async def list_plugins():
         })
     return {"plugins": plugins_info}
 
+@app.get("/metrics")
+async def openmetrics():
+    # OpenMetrics exposition for scrapers; only reads state already in memory
+    families = request_metrics.families()
+    if plugin_manager is not None:
+        families += plugin_manager.collect_metrics()
+    return Response(render(families), media_type=CONTENT_TYPE)
+
+@app.websocket("/ws")
+async def multiplexed_websocket(websocket: WebSocket):
+    # One connection for every plugin stream, e.g.
+    # {"op": "subscribe", "topic": "system_monitor.metrics"}
+    await plugin_manager.hub.serve(websocket)
+
+@app.get("/plugins/health")
+async def plugins_health():
+    # Lifecycle state and background task health of every plugin
+    return {"plugins": plugin_manager.health_report()}
+
+@app.get("/debug/startup")
+async def startup_report():
+    # Plugin loading time, and what each plugin cost to import and initialise
+    return plugin_manager.startup_report()
+
+@app.get("/debug/perf")
+async def perf_report():
+    # Latency percentiles per plugin and event loop stalls
+    return {"requests": request_metrics.percentiles(), "loop": loop_monitor.report()}
+
+@app.post("/plugins/batch")
+async def update_plugins(batch: PluginBatch):
+    # {"order": [ids...], "updates": {id: {attr: value}}}; nothing is applied
+    # unless everything is valid
+    order = batch.order
+    if len(set(order)) != len(order):
+        raise HTTPException(status_code=400, detail="Plugins may appear only once in 'order'.")
+    for plugin_id in list(order) + list(batch.updates):
+        if plugin_id not in plugin_manager.plugins:
+            raise HTTPException(status_code=404, detail=f"Plugin '{plugin_id}' not found.")
+    updates = {plugin_id: update.changes() for plugin_id, update in batch.updates.items()}
+    try:
+        await plugin_manager.apply_batch(order, updates)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update plugins: {e}")
+    return {"status": f"{len(set(order) | set(updates))} plugins updated successfully."}
+
 @app.post("/plugins/{plugin_id}/enable")
 async def enable_plugin(plugin_id: str):
-    success = plugin_manager.enable_plugin(plugin_id)
+    try:
+        success = await plugin_manager.enable_plugin(plugin_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to enable plugin '{plugin_id}': {e}")
     if not success:
         raise HTTPException(status_code=404, detail="Plugin not found.")
     return {"status": f"Plugin '{plugin_id}' has been enabled."}
 
 @app.post("/plugins/{plugin_id}/disable")
 async def disable_plugin(plugin_id: str):
-    success = plugin_manager.disable_plugin(plugin_id)
+    success = await plugin_manager.disable_plugin(plugin_id)
     if not success:
         raise HTTPException(status_code=404, detail="Plugin not found.")
     return {"status": f"Plugin '{plugin_id}' has been disabled."}
 
+@app.post("/plugins/{plugin_id}/reload")
+async def reload_plugin(plugin_id: str):
+    try:
+        success = await plugin_manager.reload_plugin(plugin_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to reload plugin '{plugin_id}': {e}")
+    if not success:
+        raise HTTPException(status_code=404, detail="Plugin not found.")
+    return {"status": f"Plugin '{plugin_id}' has been reloaded."}
+
 @app.post("/plugins/{plugin_id}/position/{position}")
 async def set_plugin_position(plugin_id: str, position: int):
     success = plugin_manager.set_plugin_position(plugin_id, position)
@@ -65,14 +177,12 @@ async def set_plugin_position(plugin_id: str, position: int):
     return {"status": f"Plugin '{plugin_id}' position set to {position}."}
 
 @app.post("/plugins/{plugin_id}/update")
-async def update_plugin(plugin_id: str, data: dict = Body(...)):
-    allowed_attrs = ['name', 'icon', 'description', 'version', 'author', 'enabled', 'position']
-    success = False
-    for attr, value in data.items():
-        if attr in allowed_attrs:
-            success = plugin_manager.update_plugin_attribute(plugin_id, attr, value)
-        else:
-            raise HTTPException(status_code=400, detail=f"Attribute '{attr}' is not allowed.")
+async def update_plugin(plugin_id: str, data: PluginUpdate):
+    # All attributes are applied together and saved once
+    try:
+        success = await plugin_manager.update_plugin_attributes(plugin_id, data.changes())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update plugin '{plugin_id}': {e}")
     if not success:
         raise HTTPException(status_code=404, detail="Plugin not found.")
     return {"status": f"Plugin '{plugin_id}' updated successfully."}
@@ -1,12 +1,16 @@
 # backend/plugins/command_executor/__init__.py
 
 from core.plugin_base import BasePlugin
-from fastapi import HTTPException, BackgroundTasks
-import subprocess
+from fastapi import HTTPException, Query, WebSocket, WebSocketDisconnect
 import asyncio
-import datetime
-import uuid
-from typing import Dict, List
+import os
+from typing import Dict, List, Optional
+from core.metrics import gauge
+from db.journal import JOURNAL_FILE, TaskJournal
+from .output import output_message
+from .scheduler import TaskScheduler, utcnow
+
+EVICT_INTERVAL = 60.0  # Seconds between sweeps of finished task records
 
 class Plugin(BasePlugin):
     def __init__(self):
@@ -18,26 +22,53 @@ class Plugin(BasePlugin):
         self.author = "Your Name"
         self.enabled = True
         self.position = 4
-        # Define allowed commands
+        # Define allowed commands. Commands sharing a "lock" never run more
+        # than "max_concurrent" (default 1) at a time; without a lock the
+        # command key is used, so each command runs once at a time.
         self.ALLOWED_COMMANDS = {
             "update_system": {
                 "command": ["sudo", "apt-get", "update"],
-                "description": "Update the system package list"
+                "description": "Update the system package list",
+                "lock": "dpkg"
             },
             "upgrade_system": {
                 "command": ["sudo", "apt-get", "upgrade", "-y"],
-                "description": "Upgrade all packages to the newest version"
+                "description": "Upgrade all packages to the newest version",
+                "lock": "dpkg"
             },
             "reboot_system": {
                 "command": ["sudo", "reboot"],
                 "description": "Reboot the system"
             },
         }
-        # Command statuses
-        self.command_statuses: Dict[str, Dict] = {}
+        # Queues, limits, coalesces and evicts command tasks; the journal keeps
+        # their history across restarts
+        self.journal = TaskJournal(os.environ.get("COMMAND_JOURNAL_FILE", JOURNAL_FILE))
+        self.scheduler = TaskScheduler(self.run_task, journal=self.journal)
+        # Command statuses and bounded output (stdout and stderr interleaved)
+        self.command_statuses: Dict[str, Dict] = self.scheduler.statuses
+        self.command_outputs = self.scheduler.outputs
+        # Finished tasks also age out while nobody submits new ones
+        self.add_background_task("evict_finished", self.evict_finished)
+
+    async def evict_finished(self):
+        while True:
+            await asyncio.sleep(EVICT_INTERVAL)
+            self.scheduler.evict()
+
+    async def on_shutdown(self):
+        # Task states still waiting for the journal's next group write
+        self.journal.flush()
+
+    def collect_metrics(self):
+        return [
+            gauge("pi_cm_command_queue_depth", "Commands waiting for a worker.", self.scheduler.queue_depth),
+            gauge("pi_cm_command_running", "Commands running now.", len(self.scheduler.running)),
+        ]
 
     def register_routes(self):
         @self.router.get("/commands")
+        @self.cached(ttl=60)
         async def list_commands():
             commands = []
             for key, value in self.ALLOWED_COMMANDS.items():
@@ -48,44 +79,89 @@ class Plugin(BasePlugin):
             return {"commands": commands}
 
         @self.router.post("/commands/{command_key}")
-        async def execute_command(command_key: str, background_tasks: BackgroundTasks):
+        async def execute_command(command_key: str):
             if command_key not in self.ALLOWED_COMMANDS:
                 raise HTTPException(status_code=400, detail="Invalid command.")
 
             command_info = self.ALLOWED_COMMANDS[command_key]
-            command = command_info["command"]
-
-            task_id = str(uuid.uuid4())
-            self.command_statuses[task_id] = {
-                "status": "pending",
-                "command_key": command_key,
-                "started_at": datetime.datetime.utcnow().isoformat(),
-                "completed_at": None,
-                "success": None,
-                "error": None
-            }
-
-            background_tasks.add_task(self.run_command, task_id, command)
+            task_id, coalesced = self.scheduler.submit(
+                command_key, command_info.get("lock"), command_info.get("max_concurrent", 1)
+            )
+            if coalesced:
+                return {"task_id": task_id, "status": "Command already queued.", "coalesced": True}
+            if self.command_statuses[task_id]["started_at"] is None:
+                return {"task_id": task_id, "status": "Command queued.", "coalesced": False}
+            return {"task_id": task_id, "status": "Command execution started.", "coalesced": False}
 
-            return {"task_id": task_id, "status": "Command execution started."}
+        @self.router.post("/commands/cancel/{task_id}")
+        async def cancel_command(task_id: str):
+            if task_id not in self.command_statuses:
+                raise HTTPException(status_code=404, detail="Task ID not found.")
+            if not self.scheduler.cancel(task_id):
+                raise HTTPException(status_code=409, detail="Task has already finished.")
+            return {"task_id": task_id, "status": "Cancellation requested."}
 
         @self.router.get("/commands/status/{task_id}")
         async def get_command_status(task_id: str):
-            status = self.command_statuses.get(task_id)
+            status = self.scheduler.lookup(task_id)
             if not status:
                 raise HTTPException(status_code=404, detail="Task ID not found.")
             return status
 
+        @self.router.get("/commands/history")
+        async def get_command_history(command_key: Optional[str] = None, status: Optional[str] = None,
+                                      limit: int = Query(50, ge=1, le=500)):
+            # Most recent tasks first, including ones from before a restart
+            return {"tasks": self.journal.query(command_key, status, limit)}
+
+        @self.router.get("/commands/output/{task_id}")
+        async def get_command_output(task_id: str, since: int = Query(0, ge=0)):
+            # `next` of one response is the `since` of the following one
+            buffer = self.command_outputs.get(task_id)
+            if buffer is None:
+                raise HTTPException(status_code=404, detail="Task ID not found.")
+            return output_message(buffer, since)
+
+        @self.router.websocket("/commands/stream/{task_id}")
+        async def stream_command_output(websocket: WebSocket, task_id: str, since: int = 0):
+            await websocket.accept()
+            buffer = self.command_outputs.get(task_id)
+            if buffer is None:
+                await websocket.close(code=1008, reason="Task ID not found.")
+                return
+            try:
+                while True:
+                    await buffer.wait(since)
+                    message = output_message(buffer, since)
+                    await websocket.send_json(message)
+                    if message["done"]:
+                        break
+                    since = message["next"]
+                await websocket.close()
+            except WebSocketDisconnect:
+                print("Client disconnected from command output websocket.")
+
+    async def run_task(self, task_id: str):
+        command_key = self.command_statuses[task_id]["command_key"]
+        await self.run_command(task_id, self.ALLOWED_COMMANDS[command_key]["command"])
+
     async def run_command(self, task_id: str, command: List[str]):
+        process = None
         try:
             self.command_statuses[task_id]["status"] = "running"
 
+            output = self.command_outputs[task_id]
             process = await asyncio.create_subprocess_exec(
                 *command,
-                stdout=asyncio.subprocess.DEVNULL,
-                stderr=asyncio.subprocess.DEVNULL
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
             )
-            await process.communicate()
+            while True:
+                chunk = await process.stdout.read(4096)
+                if not chunk:
+                    break
+                output.write(chunk)
+            await process.wait()
 
             if process.returncode == 0:
                 self.command_statuses[task_id]["status"] = "completed"
@@ -94,9 +170,20 @@ class Plugin(BasePlugin):
                 self.command_statuses[task_id]["status"] = "failed"
                 self.command_statuses[task_id]["success"] = False
                 self.command_statuses[task_id]["error"] = f"Return code: {process.returncode}"
+        except asyncio.CancelledError:
+            self.command_statuses[task_id]["status"] = "cancelled"
+            self.command_statuses[task_id]["success"] = False
+            self.command_statuses[task_id]["error"] = "Cancelled while running."
+            if process is not None and process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), 5)
+                except asyncio.TimeoutError:
+                    process.kill()
+            raise
         except Exception as e:
             self.command_statuses[task_id]["status"] = "failed"
             self.command_statuses[task_id]["success"] = False
             self.command_statuses[task_id]["error"] = str(e)
         finally:
-            self.command_statuses[task_id]["completed_at"] = datetime.datetime.utcnow().isoformat()
+            self.command_statuses[task_id]["completed_at"] = utcnow()
@@ -0,0 +1,70 @@
+# backend/plugins/command_executor/output.py
+
+import asyncio
+from typing import Tuple
+
+DEFAULT_MAX_BYTES = 256 * 1024  # Output kept per task; older bytes are evicted first
+
+class OutputBuffer:
+    # Fixed-size byte ring addressed by absolute stream offsets. Offset 0 is
+    # the first byte the command ever wrote; only the last `max_bytes` remain
+    # readable, so memory stays constant however much the command prints.
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._ring = bytearray(max_bytes)
+        self.end_offset = 0
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    @property
+    def start_offset(self) -> int:
+        return max(0, self.end_offset - self.max_bytes)
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+        end = self.end_offset + len(chunk)
+        if len(chunk) > self.max_bytes:
+            chunk = chunk[-self.max_bytes:]
+        position = (end - len(chunk)) % self.max_bytes
+        first = min(len(chunk), self.max_bytes - position)
+        self._ring[position:position + first] = chunk[:first]
+        self._ring[:len(chunk) - first] = chunk[first:]
+        self.end_offset = end
+        self._notify()
+
+    def close(self):
+        self.closed = True
+        self._notify()
+
+    def _notify(self):
+        # Waiters hold the old event, which stays set; new waiters get a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def read(self, since: int = 0) -> Tuple[bytes, int, bool]:
+        # Returns (data, offset of its first byte, whether bytes before it were lost)
+        start = max(since, self.start_offset)
+        if start >= self.end_offset:
+            return b'', self.end_offset, since < self.start_offset
+        position = start % self.max_bytes
+        length = self.end_offset - start
+        first = min(length, self.max_bytes - position)
+        data = bytes(self._ring[position:position + first]) + bytes(self._ring[:length - first])
+        return data, start, since < start
+
+    async def wait(self, offset: int):
+        # Returns once there is data past `offset` or the command has finished
+        while self.end_offset <= offset and not self.closed:
+            await self._changed.wait()
+
+def output_message(buffer: OutputBuffer, since: int) -> dict:
+    data, offset, truncated = buffer.read(since)
+    return {
+        "offset": offset,
+        "next": offset + len(data),
+        "truncated": truncated,
+        "done": buffer.closed and offset + len(data) >= buffer.end_offset,
+        "data": data.decode('utf-8', errors='replace'),
+    }
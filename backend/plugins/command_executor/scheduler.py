@@ -0,0 +1,156 @@
+# backend/plugins/command_executor/scheduler.py
+
+import asyncio
+import datetime
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .output import OutputBuffer
+
+MAX_WORKERS = 2  # Commands running at the same time, whatever they are
+MAX_FINISHED = 200  # Finished task records kept in memory
+FINISHED_TTL = 3600.0  # Seconds a finished task record is kept
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+def utcnow() -> str:
+    return datetime.datetime.utcnow().isoformat()
+
+class TaskScheduler:
+    # FIFO queue of command tasks with a global worker cap and per-lock
+    # concurrency limits. Identical requests that have not started yet are
+    # coalesced into one task, and finished records are evicted by age and
+    # count. All lookups are dict operations.
+
+    def __init__(self, runner: Callable[[str], Awaitable[None]], max_workers: int = MAX_WORKERS,
+                 max_finished: int = MAX_FINISHED, finished_ttl: float = FINISHED_TTL,
+                 journal=None):
+        # runner(task_id) executes the task and records its outcome in statuses;
+        # every state change is also appended to the journal, if any
+        self.runner = runner
+        self.journal = journal
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self.finished_ttl = finished_ttl
+        self.statuses: Dict[str, Dict] = {}
+        self.outputs: Dict[str, OutputBuffer] = {}
+        self.queue = deque()
+        self.pending_by_key: Dict[str, str] = {}
+        self.running: Dict[str, asyncio.Task] = {}
+        self.running_by_lock: Dict[str, int] = {}
+        self.finished: "OrderedDict[str, float]" = OrderedDict()
+        self._locks: Dict[str, Tuple[str, int]] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.queue)
+
+    def submit(self, command_key: str, lock: Optional[str] = None, limit: int = 1) -> Tuple[str, bool]:
+        # Returns (task id, whether an already queued task was reused)
+        self.evict()
+        queued = self.pending_by_key.get(command_key)
+        if queued is not None:
+            return queued, True
+
+        task_id = str(uuid.uuid4())
+        self.statuses[task_id] = {
+            "status": "pending",
+            "command_key": command_key,
+            "queued_at": utcnow(),
+            "started_at": None,
+            "completed_at": None,
+            "success": None,
+            "error": None
+        }
+        self.outputs[task_id] = OutputBuffer()
+        self._locks[task_id] = (lock or command_key, limit)
+        self.pending_by_key[command_key] = task_id
+        self.queue.append(task_id)
+        self._record(task_id)
+        self._dispatch()
+        return task_id, False
+
+    def cancel(self, task_id: str) -> bool:
+        status = self.statuses.get(task_id)
+        if status is None or status["status"] in FINISHED_STATES:
+            return False
+        task = self.running.get(task_id)
+        if task is not None:
+            # The runner sees CancelledError and stops the process
+            task.cancel()
+            return True
+        self.queue.remove(task_id)
+        self.pending_by_key.pop(status["command_key"], None)
+        status["status"] = "cancelled"
+        status["success"] = False
+        status["error"] = "Cancelled before it started."
+        self._finish(task_id)
+        return True
+
+    def _dispatch(self):
+        if len(self.running) >= self.max_workers:
+            return
+        for task_id in list(self.queue):
+            lock, limit = self._locks[task_id]
+            if self.running_by_lock.get(lock, 0) >= limit:
+                continue
+            self.queue.remove(task_id)
+            self.pending_by_key.pop(self.statuses[task_id]["command_key"], None)
+            self.running_by_lock[lock] = self.running_by_lock.get(lock, 0) + 1
+            self.statuses[task_id]["status"] = "running"
+            self.statuses[task_id]["started_at"] = utcnow()
+            self._record(task_id)
+            task = asyncio.ensure_future(self.runner(task_id))
+            self.running[task_id] = task
+            # A callback rather than a finally block, which would never run
+            # for a task cancelled before its first step
+            task.add_done_callback(lambda task, task_id=task_id: self._done(task_id, task))
+            if len(self.running) >= self.max_workers:
+                return
+
+    def _done(self, task_id: str, task: asyncio.Task):
+        lock, _ = self._locks[task_id]
+        self.running.pop(task_id, None)
+        self.running_by_lock[lock] -= 1
+        if not self.running_by_lock[lock]:
+            del self.running_by_lock[lock]
+        status = self.statuses[task_id]
+        if task.cancelled() and status["status"] not in FINISHED_STATES:
+            # The runner never got to record it
+            status["status"] = "cancelled"
+            status["success"] = False
+            status["error"] = "Cancelled while running."
+        self._finish(task_id)
+        self._dispatch()
+
+    def _finish(self, task_id: str):
+        status = self.statuses[task_id]
+        if status["completed_at"] is None:
+            status["completed_at"] = utcnow()
+        self.outputs[task_id].close()
+        self._locks.pop(task_id, None)
+        self.finished[task_id] = time.monotonic()
+        self._record(task_id)
+
+    def _record(self, task_id: str):
+        if self.journal is not None:
+            self.journal.record(task_id, self.statuses[task_id])
+
+    def lookup(self, task_id: str) -> Optional[Dict]:
+        # Evicted and pre-restart tasks are still answered from the journal
+        status = self.statuses.get(task_id)
+        if status is None and self.journal is not None:
+            status = self.journal.get(task_id)
+        return status
+
+    def evict(self):
+        # Finished records leave oldest first once too old or too many
+        cutoff = time.monotonic() - self.finished_ttl
+        while self.finished:
+            task_id, finished_at = next(iter(self.finished.items()))
+            if finished_at > cutoff and len(self.finished) <= self.max_finished:
+                break
+            del self.finished[task_id]
+            self.statuses.pop(task_id, None)
+            self.outputs.pop(task_id, None)
@@ -15,6 +15,12 @@ class Plugin(BasePlugin):
         self.author = "Your Name"
         self.enabled = True
         self.position = 5
+        self.add_topic("datetime", self.publish_datetime)
+
+    async def publish_datetime(self, topic, publish):
+        while True:
+            publish(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            await asyncio.sleep(1)
 
     def register_routes(self):
         @self.router.websocket("/ws/datetime")
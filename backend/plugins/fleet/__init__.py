@@ -0,0 +1,80 @@
+# backend/plugins/fleet/__init__.py
+
+from core.plugin_base import BasePlugin
+from fastapi import Body, HTTPException, Query
+from functools import partial
+from typing import List, Optional
+from urllib.parse import quote
+import os
+import time
+from .fleet import TOP_METRICS, Fleet
+
+# Base URLs of the backends to aggregate, e.g. "http://pi-01:8000,http://pi-02:8000"
+FLEET_HOSTS = os.getenv("FLEET_HOSTS", "")
+# Requests a dispatch sends out at the same time
+FLEET_CONCURRENCY = int(os.getenv("FLEET_CONCURRENCY", "8"))
+
+class Plugin(BasePlugin):
+    def __init__(self):
+        super().__init__()
+        self.name = "Fleet"
+        self.icon = ""  # Nerd Font code for server icon
+        self.description = "Combined view of many pi_cm hosts."
+        self.version = "1.0"
+        self.author = "Your Name"
+        self.enabled = False  # Aggregator mode is opt-in
+        self.position = 6
+        self.fleet = Fleet([url.strip() for url in FLEET_HOSTS.split(',') if url.strip()], FLEET_CONCURRENCY)
+        # One supervised, reconnecting metrics subscription per host
+        for host in self.fleet.hosts:
+            self.add_background_task(f"follow:{host}", partial(self.fleet.follow, host))
+
+    async def on_disable(self):
+        await self.fleet.close()
+
+    async def on_shutdown(self):
+        await self.fleet.close()
+
+    def target_hosts(self, hosts: Optional[List[str]]) -> List[str]:
+        if not hosts:
+            return list(self.fleet.hosts)
+        unknown = [host for host in hosts if host not in self.fleet.hosts]
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Unknown hosts: {', '.join(unknown)}.")
+        return hosts
+
+    async def dispatch(self, hosts: Optional[List[str]], path: str):
+        try:
+            return {"results": await self.fleet.dispatch(self.target_hosts(hosts), "POST", path)}
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+    def register_routes(self):
+        @self.router.get("/hosts")
+        async def list_hosts():
+            now = time.monotonic()
+            return {"hosts": [state.info(now) for state in self.fleet.hosts.values()]}
+
+        @self.router.get("/metrics")
+        async def fleet_metrics():
+            return {
+                "summary": self.fleet.summary(),
+                "hosts": {state.host: state.metrics for state in self.fleet.online()},
+            }
+
+        @self.router.get("/top")
+        async def top_hosts(metric: str = "cpu", n: int = Query(5, ge=1, le=100)):
+            if metric not in TOP_METRICS:
+                raise HTTPException(status_code=400, detail=f"Cannot rank by '{metric}'.")
+            return {"metric": metric, "hosts": self.fleet.top(metric, n)}
+
+        # Fan-out actions; an empty or missing "hosts" list means every host
+        @self.router.post("/services/{service_name}/{action}")
+        async def control_service(service_name: str, action: str, hosts: Optional[List[str]] = Body(None, embed=True)):
+            path = f"/plugins/service_manager/services/{quote(service_name, safe='')}/{quote(action, safe='')}"
+            return await self.dispatch(hosts, path)
+
+        @self.router.post("/commands/{command_key}")
+        async def execute_command(command_key: str, hosts: Optional[List[str]] = Body(None, embed=True)):
+            path = f"/plugins/command_executor/commands/{quote(command_key, safe='')}"
+            return await self.dispatch(hosts, path)
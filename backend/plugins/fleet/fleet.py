@@ -0,0 +1,167 @@
+# backend/plugins/fleet/fleet.py
+
+import asyncio
+import heapq
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    import httpx
+except ImportError:  # Optional dependency, only needed in aggregator mode
+    httpx = None
+try:
+    import websockets
+except ImportError:  # Optional dependency, only needed in aggregator mode
+    websockets = None
+
+METRICS_TOPIC = "system_monitor.metrics"
+STALE_AFTER = 10.0  # Seconds without metrics before a host counts as offline
+REQUEST_TIMEOUT = 10.0
+# Metrics hosts can be ranked by, as paths into a system_monitor snapshot
+TOP_METRICS: Dict[str, Tuple[str, ...]] = {
+    "cpu": ("cpu_percent",),
+    "memory": ("memory", "percent"),
+    "disk": ("disk", "percent"),
+}
+
+def metric_value(metrics: Dict, path: Tuple[str, ...]):
+    for key in path:
+        metrics = metrics[key]
+    return metrics
+
+class HostState:
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.host = urlsplit(self.url).netloc or self.url
+        self.connected = False
+        self.metrics: Optional[Dict] = None
+        self.updated_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.connects = 0
+
+    def online(self, now: float) -> bool:
+        return self.updated_at is not None and now - self.updated_at < STALE_AFTER
+
+    def info(self, now: float) -> Dict:
+        return {
+            "host": self.host,
+            "url": self.url,
+            "connected": self.connected,
+            "online": self.online(now),
+            "age": round(now - self.updated_at, 1) if self.updated_at is not None else None,
+            "connects": self.connects,
+            "error": self.error,
+        }
+
+class Fleet:
+    # Follows the metrics of many backends over one persistent /ws connection
+    # each, keeps their latest snapshot in memory, and fans requests out to
+    # them through one pooled HTTP client with bounded concurrency.
+
+    def __init__(self, urls: List[str], concurrency: int = 8, transport=None):
+        self.hosts: Dict[str, HostState] = {}
+        for url in urls:
+            state = HostState(url)
+            self.hosts[state.host] = state
+        self.concurrency = max(1, concurrency)
+        self.transport = transport  # For tests: an httpx transport to use instead of the network
+        self.client = None
+
+    def http(self):
+        # Connections to each host are kept alive between calls
+        if self.client is None:
+            if httpx is None:
+                raise RuntimeError("Fleet mode needs the 'httpx' package.")
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self.client = httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=limits, transport=self.transport)
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def follow(self, host: str):
+        # Runs as a supervised background task per host: it raises when the
+        # connection drops and the supervisor reconnects with backoff
+        if websockets is None:
+            raise RuntimeError("Fleet mode needs the 'websockets' package.")
+        state = self.hosts[host]
+        url = "ws" + state.url[len("http"):] + "/ws"
+        try:
+            async with websockets.connect(url, open_timeout=REQUEST_TIMEOUT) as websocket:
+                state.connected = True
+                state.connects += 1
+                state.error = None
+                await websocket.send(json.dumps({"op": "subscribe", "topic": METRICS_TOPIC}))
+                async for frame in websocket:
+                    message = json.loads(frame)
+                    if message.get("topic") == METRICS_TOPIC:
+                        self.update(host, message["data"])
+                    elif message.get("op") in ("error", "closed"):
+                        raise ConnectionError(message.get("detail") or message.get("reason") or "Topic closed.")
+            raise ConnectionError("Connection closed.")
+        except Exception as e:
+            state.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            state.connected = False
+
+    def update(self, host: str, metrics: Dict, now: Optional[float] = None):
+        state = self.hosts[host]
+        state.metrics = metrics
+        state.updated_at = time.monotonic() if now is None else now
+
+    def online(self, now: Optional[float] = None) -> List[HostState]:
+        now = time.monotonic() if now is None else now
+        return [state for state in self.hosts.values() if state.online(now)]
+
+    def summary(self, now: Optional[float] = None) -> Dict:
+        online = self.online(now)
+
+        def total(*path):
+            return sum(metric_value(state.metrics, path) for state in online)
+
+        def usage(group):
+            size, used = total(group, "total"), total(group, "used")
+            return {"total": size, "used": used, "percent": round(used / size * 100, 1) if size else None}
+
+        cpu = [state.metrics["cpu_percent"] for state in online]
+        return {
+            "hosts": len(self.hosts),
+            "online": len(online),
+            "cpu_percent": {
+                "avg": round(sum(cpu) / len(cpu), 1) if cpu else None,
+                "max": max(cpu) if cpu else None,
+            },
+            "memory": usage("memory"),
+            "disk": usage("disk"),
+            "network": {"bytes_sent": total("network", "bytes_sent"), "bytes_recv": total("network", "bytes_recv")},
+        }
+
+    def top(self, metric: str, n: int, now: Optional[float] = None) -> List[Dict]:
+        path = TOP_METRICS[metric]
+        ranked = heapq.nlargest(n, self.online(now), key=lambda state: metric_value(state.metrics, path))
+        return [{"host": state.host, "value": metric_value(state.metrics, path)} for state in ranked]
+
+    async def dispatch(self, hosts: List[str], method: str, path: str) -> Dict[str, Dict]:
+        # Sends the same request to every host, at most `concurrency` at once
+        client = self.http()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def call(state: HostState):
+            async with semaphore:
+                try:
+                    response = await client.request(method, state.url + path)
+                except httpx.HTTPError as e:
+                    return state.host, {"error": f"{type(e).__name__}: {e}"}
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            return state.host, {"status": response.status_code, "body": body}
+
+        results = await asyncio.gather(*(call(self.hosts[host]) for host in hosts))
+        return dict(results)
@@ -1,12 +1,16 @@
 from core.plugin_base import BasePlugin
-from fastapi import WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import WebSocket, WebSocketDisconnect, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import os
 import asyncio
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import threading
-from queue import Queue
+import hashlib
+import json
 import urllib.parse
+from typing import Optional
+from .catalog import REFRESH_INTERVAL, LogCatalog, SORT_KEYS
+from .index import LogIndexer, compile_check
+from .tail import TailEngine
 
 class Plugin(BasePlugin):
     def __init__(self):
@@ -21,26 +25,124 @@ class Plugin(BasePlugin):
         # Define allowed log directories and excluded files
         self.ALLOWED_LOG_DIRS = ["/var/log", "/home/ykovrigin/logs"]
         self.EXCLUDED_FILES = ["/var/log/secure", "/var/log/auth.log"]
+        # One reader per followed file, shared by every websocket watching it
+        self.tail_engine = TailEngine()
+        # Persistent sparse line indexes for random access and search
+        self.indexer = LogIndexer()
+        # Cached listing of ALLOWED_LOG_DIRS with resolved roots and exclusions
+        self.catalog = LogCatalog(self.ALLOWED_LOG_DIRS, self.EXCLUDED_FILES)
+        self.catalog.on_change = self.invalidate_cache
+        # "log_viewer.logs:<path>" on /ws follows one file
+        self.add_topic("logs", self.publish_log, mode="append", check=self.check_log_topic)
+
+    def get_catalog(self):
+        # Picks up changes to ALLOWED_LOG_DIRS / EXCLUDED_FILES made after init
+        self.catalog.configure(self.ALLOWED_LOG_DIRS, self.EXCLUDED_FILES)
+        return self.catalog
 
     def is_allowed_file(self, file_path):
+        return self.get_catalog().is_allowed(file_path)
+
+    def resolve_log_path(self, path):
+        # Paths arrive without their leading slash when not URL-encoded
+        file_path = urllib.parse.unquote(path)
+        if not file_path.startswith('/'):
+            file_path = '/' + file_path
+        if not self.is_allowed_file(file_path):
+            raise HTTPException(status_code=403, detail="Access to this file is forbidden.")
         real_path = os.path.realpath(file_path)
-        for allowed_dir in self.ALLOWED_LOG_DIRS:
-            if real_path.startswith(os.path.realpath(allowed_dir)):
-                if real_path not in self.EXCLUDED_FILES:
-                    return True
-        return False
+        if not os.path.isfile(real_path):
+            raise HTTPException(status_code=404, detail="Log file not found.")
+        return real_path
+
+    def check_log_topic(self, log_file):
+        if not self.is_allowed_file(log_file):
+            return "Access to this file is forbidden."
+        if not os.path.isfile(os.path.realpath(log_file)):
+            return "Log file not found."
+        return None
+
+    async def publish_log(self, topic, publish):
+        log_file = os.path.realpath(topic.partition(":")[2])
+        subscriber = self.tail_engine.subscribe(log_file)
+        try:
+            while True:
+                text = await subscriber.get()
+                if text is None:
+                    break
+                publish(text)
+            if subscriber.close_message:
+                publish(subscriber.close_message)
+        finally:
+            self.tail_engine.unsubscribe(log_file, subscriber)
+
+    # Release the open log files and their polling tasks
+    async def on_disable(self):
+        self.tail_engine.close()
+
+    async def on_shutdown(self):
+        self.tail_engine.close()
 
     def register_routes(self):
         @self.router.get("/logs")
-        async def list_logs():
-            log_files = []
-            for log_dir in self.ALLOWED_LOG_DIRS:
-                for root, dirs, files in os.walk(log_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        if self.is_allowed_file(file_path):
-                            log_files.append(file_path)
-            return {"log_files": log_files}
+        @self.cached(ttl=REFRESH_INTERVAL)
+        async def list_logs(
+            request: Request,
+            offset: int = Query(0, ge=0),
+            limit: Optional[int] = Query(None, ge=1),
+            sort: str = "path",
+            order: str = "asc",
+        ):
+            if sort not in SORT_KEYS:
+                raise HTTPException(status_code=400, detail=f"Cannot sort by '{sort}'.")
+            if order not in ("asc", "desc"):
+                raise HTTPException(status_code=400, detail="Order must be 'asc' or 'desc'.")
+            catalog = self.get_catalog()
+            await run_in_threadpool(catalog.refresh)
+
+            etag = '"' + hashlib.sha1(f"{catalog.digest}:{request.url.query}".encode()).hexdigest() + '"'
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+
+            entries = catalog.entries(sort, order == "desc")
+            page = entries[offset:offset + limit if limit is not None else None]
+            content = json.dumps({
+                "log_files": [entry["path"] for entry in page],
+                "entries": page,
+                "total": len(entries),
+                "offset": offset,
+            })
+            return Response(content=content, media_type="application/json", headers={"ETag": etag})
+
+        @self.router.get("/logs/{path:path}/lines")
+        async def read_log_lines(path: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=5000)):
+            real_path = self.resolve_log_path(path)
+            # Index upkeep and reads touch the disk, keep them off the event loop
+            result = await run_in_threadpool(self.indexer.read_lines, real_path, offset, limit)
+            lines = result["lines"]
+            return {
+                "path": real_path,
+                "offset": offset,
+                "total_lines": result["total_lines"],
+                "lines": lines,
+                "next_offset": offset + len(lines),
+            }
+
+        @self.router.get("/logs/{path:path}/search")
+        async def search_log(path: str, q: str, regex: bool = False, ignore_case: bool = False,
+                             limit: int = Query(1000, ge=1, le=100000)):
+            real_path = self.resolve_log_path(path)
+            error = compile_check(q, regex)
+            if error:
+                raise HTTPException(status_code=400, detail=error)
+
+            def stream_matches():
+                # A sync generator is iterated in the threadpool by Starlette
+                matches = self.indexer.search(real_path, q.encode('utf-8'), regex, ignore_case, limit)
+                for line, text in matches:
+                    yield json.dumps({"line": line, "text": text}) + "\n"
+
+            return StreamingResponse(stream_matches(), media_type="application/x-ndjson")
 
         @self.router.websocket("/ws/logs")
         async def websocket_log_stream(websocket: WebSocket):
@@ -62,40 +164,27 @@ class Plugin(BasePlugin):
                 await websocket.close(code=1011)
 
     async def tail_log_file(self, log_file, websocket):
-        loop = asyncio.get_event_loop()
-        q = Queue()
-
-        class TailHandler(FileSystemEventHandler):
-            def __init__(self, file_path):
-                self.file_path = file_path
-                self.file = open(self.file_path, 'r')
-                self.file.seek(0, os.SEEK_END)
-
-            def on_modified(self, event):
-                if event.src_path == self.file_path:
-                    line = self.file.readline()
-                    if line:
-                        q.put(line)
-
-            def on_deleted(self, event):
-                if event.src_path == self.file_path:
-                    q.put(None)
-
-        event_handler = TailHandler(log_file)
-        observer = Observer()
-        observer.schedule(event_handler, path=os.path.dirname(log_file), recursive=False)
-        observer.start()
+        # Symlinked paths share the reader of the file they point to
+        log_file = os.path.realpath(log_file)
+        subscriber = self.tail_engine.subscribe(log_file)
+
+        async def watch_disconnect():
+            # Notice clients leaving even while the file is quiet
+            try:
+                while (await websocket.receive())["type"] != "websocket.disconnect":
+                    pass
+            finally:
+                subscriber.close()
 
+        watcher = asyncio.create_task(watch_disconnect())
         try:
             while True:
-                if not q.empty():
-                    line = q.get()
-                    if line is None:
-                        await websocket.send_text("Log file deleted.")
-                        break
-                    await websocket.send_text(line)
-                await asyncio.sleep(0.1)
+                text = await subscriber.get()
+                if text is None:
+                    break
+                await websocket.send_text(text)
+            if subscriber.close_message:
+                await websocket.send_text(subscriber.close_message)
         finally:
-            observer.stop()
-            observer.join()
-            event_handler.file.close()
+            watcher.cancel()
+            self.tail_engine.unsubscribe(log_file, subscriber)
@@ -0,0 +1,126 @@
+# backend/plugins/log_viewer/catalog.py
+
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+REFRESH_INTERVAL = 2.0  # Seconds a catalog snapshot is served without re-checking the disk
+SORT_KEYS = ('path', 'size', 'mtime')
+
+class LogCatalog:
+    # Cached listing of the allowed log directories. A directory is only
+    # re-listed when its mtime changes (entries added, removed or renamed);
+    # files are re-stat'ed on refresh to keep size/mtime current, and the
+    # realpath check runs once per new file instead of on every request.
+
+    def __init__(self, allowed_dirs: Sequence[str] = (), excluded_files: Sequence[str] = (),
+                 refresh_interval: float = REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        # Called (from the refreshing thread) when the listing changes
+        self.on_change: Optional[Callable[[], None]] = None
+        self.config: Optional[Tuple] = None
+        self.configure(allowed_dirs, excluded_files)
+
+    def configure(self, allowed_dirs: Sequence[str], excluded_files: Sequence[str]):
+        config = (tuple(allowed_dirs), tuple(excluded_files))
+        if config == self.config:
+            return
+        with self.lock:
+            self.config = config
+            self.allowed_dirs = config[0]
+            self.roots = tuple(os.path.realpath(d) for d in self.allowed_dirs)
+            self.excluded = frozenset(config[1]) | frozenset(os.path.realpath(f) for f in config[1])
+            self._dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}
+            self._entries: Dict[str, Dict] = {}
+            self._checked_at = float('-inf')
+            self._views: Dict[Tuple[str, bool], List[Dict]] = {}
+            self.digest = ''
+
+    def is_allowed(self, file_path: str) -> bool:
+        real_path = os.path.realpath(file_path)
+        if real_path in self.excluded:
+            return False
+        for root in self.roots:
+            if real_path == root or real_path.startswith(root.rstrip(os.sep) + os.sep):
+                return True
+        return False
+
+    def refresh(self, force: bool = False):
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self._checked_at < self.refresh_interval:
+                return
+            self._checked_at = now
+            entries: Dict[str, Dict] = {}
+            dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}
+            stack = list(self.allowed_dirs)
+            while stack:
+                directory = stack.pop()
+                if directory in dirs:
+                    continue
+                listing = self._list_dir(directory)
+                if listing is None:
+                    continue
+                dirs[directory] = listing
+                _, files, subdirs = listing
+                stack.extend(os.path.join(directory, name) for name in subdirs)
+                for name in files:
+                    entry = self._entry(os.path.join(directory, name))
+                    if entry is not None:
+                        entries[entry['path']] = entry
+            self._dirs = dirs
+            if entries != self._entries or not self.digest:
+                self._entries = entries
+                self._views = {}
+                self.digest = hashlib.sha1(repr(sorted(
+                    (e['path'], e['size'], e['mtime']) for e in entries.values()
+                )).encode()).hexdigest()
+                if self.on_change is not None:
+                    self.on_change()
+
+    def _list_dir(self, directory: str) -> Optional[Tuple[int, List[str], List[str]]]:
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._dirs.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached
+        files, subdirs = [], []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    # Like os.walk: do not descend into symlinked directories.
+                    # Only regular files (or links to them) are logs; links to
+                    # directories, sockets, FIFOs and dangling links are skipped.
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+        except OSError:
+            return None
+        return mtime, files, subdirs
+
+    def _entry(self, file_path: str) -> Optional[Dict]:
+        previous = self._entries.get(file_path)
+        if previous is None and not self.is_allowed(file_path):
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if previous is not None and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+            return previous
+        return {'path': file_path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def entries(self, sort: str = 'path', descending: bool = False) -> List[Dict]:
+        # Sorted views are built once per catalog change
+        key = (sort, descending)
+        view = self._views.get(key)
+        if view is None:
+            view = sorted(self._entries.values(), key=lambda e: (e[sort], e['path']), reverse=descending)
+            self._views[key] = view
+        return view
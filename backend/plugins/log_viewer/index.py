@@ -0,0 +1,251 @@
+# backend/plugins/log_viewer/index.py
+
+import bisect
+import gzip
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+INDEX_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'db', 'log_index')
+INDEX_INTERVAL = 1024  # Lines between two recorded offsets
+INDEX_SAVE_STEP = 64  # New offsets recorded before the index is written back to disk
+SCAN_BLOCK = 8 * 1024  # Newlines are counted per block, only boundary blocks are walked
+MAX_LINE_LENGTH = 64 * 1024  # Longer lines are cut when returned
+
+# Index file: device, inode, indexed bytes, newline count, interval, then offsets
+INDEX_HEADER = struct.Struct('<QQQQI')
+
+def index_file_for(path: str, index_dir: str) -> str:
+    digest = hashlib.sha1(path.encode('utf-8', errors='surrogateescape')).hexdigest()
+    return os.path.join(index_dir, f"{digest}.idx")
+
+def decode_line(line: bytes) -> str:
+    return line[:MAX_LINE_LENGTH].decode('utf-8', errors='replace')
+
+class LineIndex:
+    # Sparse line-offset index of one plain-text file: offsets[k] is the byte
+    # offset where line k * interval starts. It is extended from where the last
+    # scan stopped as the file grows, and rebuilt if the file was replaced or
+    # truncated. Memory is 8 bytes per `interval` lines (~250 KB for 30M lines).
+    # The index file is only rewritten once `save_step` offsets were added, so
+    # a slowly growing log does not cost a write on every refresh.
+
+    def __init__(self, path: str, index_dir: str = INDEX_DIR, interval: int = INDEX_INTERVAL,
+                 save_step: int = INDEX_SAVE_STEP):
+        self.path = path
+        self.index_dir = index_dir
+        self.index_file = index_file_for(path, index_dir)
+        self.interval = interval
+        self.save_step = save_step
+        self.lock = threading.Lock()
+        # Offsets in the index file, None while there is no file
+        self.saved: Optional[int] = None
+        self._reset(None)
+        self._load()
+
+    def _reset(self, identity):
+        self.identity = identity
+        self.indexed_size = 0
+        self.newlines = 0
+        self.offsets = array('q', [0])
+
+    def _load(self):
+        try:
+            with open(self.index_file, 'rb') as f:
+                header = f.read(INDEX_HEADER.size)
+                dev, ino, indexed_size, newlines, interval = INDEX_HEADER.unpack(header)
+                offsets = array('q')
+                offsets.frombytes(f.read())
+        except (OSError, struct.error, ValueError):
+            return
+        if interval != self.interval or not offsets:
+            return
+        self.identity = (dev, ino)
+        self.indexed_size = indexed_size
+        self.newlines = newlines
+        self.offsets = offsets
+        self.saved = len(offsets)
+
+    def _save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(INDEX_HEADER.pack(self.identity[0], self.identity[1], self.indexed_size,
+                                      self.newlines, self.interval))
+            self.offsets.tofile(f)
+        os.replace(temp_file, self.index_file)
+        self.saved = len(self.offsets)
+
+    @property
+    def total_lines(self) -> int:
+        return self.newlines
+
+    def refresh(self, mm, stat: os.stat_result):
+        # Extend the index up to the current size of the file
+        identity = (stat.st_dev, stat.st_ino)
+        size = len(mm) if mm is not None else 0
+        if identity != self.identity or size < self.indexed_size:
+            if self.saved is not None:
+                # The index file describes the replaced file
+                try:
+                    os.remove(self.index_file)
+                except OSError:
+                    pass
+                self.saved = None
+            self._reset(identity)
+        if size == self.indexed_size:
+            return
+
+        position = self.indexed_size
+        newlines = self.newlines
+        next_mark = len(self.offsets) * self.interval
+        while position < size:
+            block_end = min(position + SCAN_BLOCK, size)
+            count = mm[position:block_end].count(b'\n')
+            # Walk the block only when it holds the start of the next marked line
+            while newlines + count >= next_mark:
+                cursor = position
+                for _ in range(next_mark - newlines):
+                    cursor = mm.find(b'\n', cursor, block_end) + 1
+                self.offsets.append(cursor)
+                count -= next_mark - newlines
+                newlines = next_mark
+                position = cursor
+                next_mark += self.interval
+            newlines += count
+            position = block_end
+        self.indexed_size = size
+        self.newlines = newlines
+        if len(self.offsets) - (self.saved or 1) >= self.save_step:
+            self._save()
+
+    def locate(self, mm, line: int) -> int:
+        # Byte offset where `line` starts, walking at most interval - 1 lines
+        checkpoint = min(line // self.interval, len(self.offsets) - 1)
+        position = self.offsets[checkpoint]
+        for _ in range(line - checkpoint * self.interval):
+            position = mm.find(b'\n', position) + 1
+            if position == 0:
+                return len(mm)
+        return position
+
+    def line_number(self, mm, position: int, hint: Tuple[int, int] = (0, 0)) -> int:
+        # Line containing byte `position`; `hint` is a known (offset, line) pair
+        # before it, so sequential lookups only count the bytes in between.
+        checkpoint = bisect.bisect_right(self.offsets, position) - 1
+        start, line = self.offsets[checkpoint], checkpoint * self.interval
+        if hint[0] > start:
+            start, line = hint
+        return line + mm[start:position].count(b'\n')
+
+class LogIndexer:
+    def __init__(self, index_dir: str = INDEX_DIR, interval: int = INDEX_INTERVAL,
+                 save_step: int = INDEX_SAVE_STEP):
+        self.index_dir = index_dir
+        self.interval = interval
+        self.save_step = save_step
+        self.indexes: Dict[str, LineIndex] = {}
+        self.lock = threading.Lock()
+
+    def index_for(self, path: str) -> LineIndex:
+        with self.lock:
+            index = self.indexes.get(path)
+            if index is None:
+                index = self.indexes[path] = LineIndex(path, self.index_dir, self.interval, self.save_step)
+            return index
+
+    def read_lines(self, path: str, offset: int, limit: int) -> Dict:
+        if path.endswith('.gz'):
+            return self._read_gzip_lines(path, offset, limit)
+        index = self.index_for(path)
+        with open(path, 'rb') as f, index.lock:
+            stat = os.fstat(f.fileno())
+            if stat.st_size == 0:
+                index.refresh(None, stat)
+                return {"total_lines": 0, "lines": []}
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                index.refresh(mm, stat)
+                lines = []
+                position = index.locate(mm, offset)
+                while len(lines) < limit and position < len(mm):
+                    end = mm.find(b'\n', position)
+                    if end == -1:
+                        end = len(mm)
+                    lines.append(decode_line(mm[position:end]))
+                    position = end + 1
+                # A final line without its newline still counts
+                total = index.total_lines + (1 if mm[len(mm) - 1:] != b'\n' else 0)
+                return {"total_lines": total, "lines": lines}
+
+    def search(self, path: str, pattern: bytes, regex: bool, ignore_case: bool,
+               limit: int) -> Iterator[Tuple[int, str]]:
+        # Yields (line number, text) of matching lines, one match per line
+        # MULTILINE so that ^ and $ anchor to each line of the mapped file
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        matcher = re.compile(pattern if regex else re.escape(pattern), flags)
+        if path.endswith('.gz'):
+            yield from self._search_gzip(path, matcher, limit)
+            return
+        index = self.index_for(path)
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with index.lock:
+                    index.refresh(mm, stat)
+                found = 0
+                hint = (0, 0)
+                position = 0
+                while found < limit:
+                    match = matcher.search(mm, position)
+                    if match is None:
+                        break
+                    start = mm.rfind(b'\n', 0, match.start()) + 1
+                    end = mm.find(b'\n', match.start())
+                    if end == -1:
+                        end = len(mm)
+                    line = index.line_number(mm, start, hint)
+                    hint = (start, line)
+                    yield line, decode_line(mm[start:end])
+                    found += 1
+                    position = end + 1
+
+    # Compressed rotations cannot be memory-mapped or seeked cheaply, so they
+    # are streamed through the decompressor instead of being indexed.
+
+    def _read_gzip_lines(self, path: str, offset: int, limit: int) -> Dict:
+        lines: List[str] = []
+        total = 0
+        with gzip.open(path, 'rb') as f:
+            for number, line in enumerate(f):
+                if offset <= number < offset + limit:
+                    lines.append(decode_line(line.rstrip(b'\n')))
+                total = number + 1
+        return {"total_lines": total, "lines": lines}
+
+    def _search_gzip(self, path: str, matcher, limit: int) -> Iterator[Tuple[int, str]]:
+        found = 0
+        with gzip.open(path, 'rb') as f:
+            for number, line in enumerate(f):
+                if matcher.search(line):
+                    yield number, decode_line(line.rstrip(b'\n'))
+                    found += 1
+                    if found >= limit:
+                        return
+
+def compile_check(pattern: str, regex: bool) -> Optional[str]:
+    # Returns an error message for an unusable search pattern
+    if not pattern:
+        return "Search query must not be empty."
+    if regex:
+        try:
+            re.compile(pattern.encode('utf-8'))
+        except re.error as e:
+            return f"Invalid regular expression: {e}"
+    return None
@@ -0,0 +1,216 @@
+# backend/plugins/log_viewer/tail.py
+
+import asyncio
+import os
+from collections import deque
+from typing import Dict, Optional, Set
+
+CHUNK_SIZE = 64 * 1024
+MAX_READ_PER_PASS = 1024 * 1024  # Yield to the event loop between big bursts
+MAX_PARTIAL_LINE = 64 * 1024  # Flush an unterminated line once it gets this long
+MIN_POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1.0
+MAX_PENDING_BYTES = 1024 * 1024  # Per subscriber, oldest text is dropped beyond this
+DELETE_GRACE_PERIOD = 5.0  # How long a missing file may take to be recreated
+
+class TailSubscriber:
+    def __init__(self, max_pending: int = MAX_PENDING_BYTES):
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.skipped_bytes = 0
+        self.closed = False
+        self.close_message: Optional[str] = None
+        self._ready = asyncio.Event()
+
+    def offer(self, text: str):
+        self.pending.append(text)
+        self.pending_bytes += len(text)
+        # A slow client loses the oldest text rather than growing without bound
+        while self.pending_bytes > self.max_pending and len(self.pending) > 1:
+            dropped = self.pending.popleft()
+            self.pending_bytes -= len(dropped)
+            self.skipped_bytes += len(dropped)
+        self._ready.set()
+
+    def close(self, message: Optional[str] = None):
+        self.closed = True
+        self.close_message = message
+        self._ready.set()
+
+    async def get(self) -> Optional[str]:
+        # Returns everything pending as one block, or None once closed
+        while not self.pending:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        text = ''.join(self.pending)
+        self.pending.clear()
+        self.pending_bytes = 0
+        if self.skipped_bytes:
+            text = f"[... {self.skipped_bytes} bytes skipped ...]\n{text}"
+            self.skipped_bytes = 0
+        return text
+
+class FileTailer:
+    # Follows one file for any number of subscribers with a single descriptor
+    # and a single polling task. The poll interval backs off while the file is
+    # idle and snaps back as soon as new data shows up.
+
+    def __init__(self, path: str, engine: 'TailEngine'):
+        self.path = path
+        self.engine = engine
+        self.subscribers: Set[TailSubscriber] = set()
+        self._fd: Optional[int] = None
+        self._inode = None
+        self._position = 0
+        self._partial = b''
+        # Why the file could not be (re)opened, while it is missing
+        self._missing_reason = "Log file deleted."
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._open(from_end=True)
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._close()
+
+    def _open(self, from_end: bool):
+        fd = os.open(self.path, os.O_RDONLY)
+        stat = os.fstat(fd)
+        self._fd = fd
+        self._inode = (stat.st_dev, stat.st_ino)
+        self._position = os.lseek(fd, 0, os.SEEK_END) if from_end else 0
+        self._partial = b''
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _read_available(self) -> bytes:
+        chunks = []
+        total = 0
+        while total < MAX_READ_PER_PASS:
+            chunk = os.read(self._fd, CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            total += len(chunk)
+        self._position += total
+        return b''.join(chunks)
+
+    def _split(self, data: bytes) -> Optional[str]:
+        # Only complete lines are sent; the tail waits for its newline
+        data = self._partial + data if self._partial else data
+        cut = data.rfind(b'\n') + 1
+        if cut == 0 and len(data) < MAX_PARTIAL_LINE:
+            self._partial = data
+            return None
+        if cut == 0:
+            cut = len(data)
+        self._partial = data[cut:]
+        return data[:cut].decode('utf-8', errors='replace')
+
+    def _broadcast(self, text: str):
+        for subscriber in self.subscribers:
+            subscriber.offer(text)
+
+    def _check_rotation(self) -> Optional[bool]:
+        # True if the file was truncated or replaced, None if it is missing
+        # or its replacement cannot be opened (yet)
+        try:
+            stat = os.stat(self.path)
+            if self._fd is None or (stat.st_dev, stat.st_ino) != self._inode:
+                # Renamed away (logrotate): whatever was left was read above
+                self._close()
+                self._open(from_end=False)
+                return True
+        except FileNotFoundError:
+            self._missing_reason = "Log file deleted."
+            return None
+        except OSError as e:
+            self._missing_reason = f"Log file cannot be read: {e.strerror or e}"
+            return None
+        if stat.st_size < self._position:
+            # Truncated in place (copytruncate)
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            self._position = 0
+            self._partial = b''
+            return True
+        return False
+
+    async def run(self):
+        try:
+            await self._follow()
+        except OSError as e:
+            # Subscribers are closed rather than left waiting on a dead tailer
+            self.engine.discard(self, f"Log file cannot be read: {e.strerror or e}")
+
+    async def _follow(self):
+        interval = MIN_POLL_INTERVAL
+        missing_since = None
+        loop = asyncio.get_running_loop()
+        while True:
+            data = self._read_available() if self._fd is not None else b''
+            if data:
+                text = self._split(data)
+                if text:
+                    self._broadcast(text)
+                interval = MIN_POLL_INTERVAL
+                await asyncio.sleep(0)
+                continue
+
+            state = self._check_rotation()
+            if state is None:
+                if missing_since is None:
+                    missing_since = loop.time()
+                elif loop.time() - missing_since >= DELETE_GRACE_PERIOD:
+                    self.engine.discard(self, self._missing_reason)
+                    return
+            else:
+                missing_since = None
+            if state:
+                interval = MIN_POLL_INTERVAL
+                continue
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+class TailEngine:
+    def __init__(self):
+        self.tailers: Dict[str, FileTailer] = {}
+
+    def subscribe(self, path: str) -> TailSubscriber:
+        tailer = self.tailers.get(path)
+        if tailer is None:
+            tailer = FileTailer(path, self)
+            tailer.start()
+            self.tailers[path] = tailer
+        subscriber = TailSubscriber()
+        tailer.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, path: str, subscriber: TailSubscriber):
+        tailer = self.tailers.get(path)
+        if tailer is None:
+            return
+        tailer.subscribers.discard(subscriber)
+        if not tailer.subscribers:
+            self.discard(tailer)
+
+    def discard(self, tailer: FileTailer, message: Optional[str] = None):
+        if self.tailers.get(tailer.path) is tailer:
+            del self.tailers[tailer.path]
+        for subscriber in tailer.subscribers:
+            subscriber.close(message)
+        tailer.subscribers.clear()
+        tailer.stop()
+
+    def close(self):
+        for tailer in list(self.tailers.values()):
+            self.discard(tailer)
@@ -1,9 +1,25 @@
 # backend/plugins/service_manager/__init__.py
 
 from core.plugin_base import BasePlugin
-from fastapi import HTTPException
-import subprocess
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import anyio
+import json
+import os
 import re
+from .batch import run_batch
+from .inventory import ServiceError, ServiceInventory, StubBackend, SystemctlBackend
+
+class Operation(BaseModel):
+    service: str
+    action: str
+
+class BatchRequest(BaseModel):
+    operations: List[Operation] = Field(..., min_length=1)
+    concurrency: Optional[int] = Field(None, ge=1)
+    timeout: Optional[float] = Field(None, gt=0)
 
 class Plugin(BasePlugin):
     def __init__(self):
@@ -16,6 +32,17 @@ class Plugin(BasePlugin):
         self.enabled = True
         self.position = 3
         self.EXCLUDED_SERVICES = ["ssh", "networking"]
+        self.ALLOWED_ACTIONS = ["start", "stop", "restart"]
+        # Batch defaults; a request may lower the concurrency but not raise it past the max
+        self.BATCH_CONCURRENCY = 4
+        self.MAX_BATCH_CONCURRENCY = 16
+        self.BATCH_TIMEOUT = 60.0
+        # SERVICE_MANAGER_BACKEND=stub runs against an in-memory fake systemd
+        if os.getenv("SERVICE_MANAGER_BACKEND", "systemctl").lower() == "stub":
+            backend = StubBackend()
+        else:
+            backend = SystemctlBackend()
+        self.inventory = ServiceInventory(backend)
 
     def is_valid_service_name(self, service_name):
         pattern = r'^[a-zA-Z0-9_\-\.@]+$'
@@ -24,57 +51,100 @@ class Plugin(BasePlugin):
     def is_service_excluded(self, service_name):
         return service_name in self.EXCLUDED_SERVICES
 
+    def check_operation(self, service_name, action):
+        # Returns (status code, detail) if the operation must be refused
+        if not self.is_valid_service_name(service_name):
+            return 400, "Invalid service name."
+        if self.is_service_excluded(service_name):
+            return 403, "Control of this service is not allowed."
+        if action not in self.ALLOWED_ACTIONS:
+            return 400, "Invalid action."
+        return None
+
+    def visible_services(self, units):
+        return [unit for unit in units if not self.is_service_excluded(unit["name"])]
+
     def register_routes(self):
         @self.router.get("/services")
+        @self.cached(ttl=2)
         async def list_services():
             try:
-                result = subprocess.run(
-                    ["systemctl", "list-units", "--type=service", "--all", "--no-pager", "--no-legend"],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    check=True
-                )
-                services = []
-                for line in result.stdout.strip().split('\n'):
-                    if line:
-                        parts = line.split()
-                        service_name = parts[0]
-                        service_load = parts[1]
-                        service_active = parts[2]
-                        service_sub = parts[3]
-                        service_description = ' '.join(parts[4:])
-                        if not self.is_service_excluded(service_name):
-                            services.append({
-                                "name": service_name,
-                                "load": service_load,
-                                "active": service_active,
-                                "sub": service_sub,
-                                "description": service_description
-                            })
-                return {"services": services}
-            except subprocess.CalledProcessError as e:
+                units = await self.inventory.list()
+            except ServiceError:
                 raise HTTPException(status_code=500, detail="Failed to list services.")
+            return {"services": self.visible_services(units)}
 
-        @self.router.post("/services/{service_name}/{action}")
-        async def control_service(service_name: str, action: str):
-            if not self.is_valid_service_name(service_name):
-                raise HTTPException(status_code=400, detail="Invalid service name.")
+        @self.router.websocket("/ws/services")
+        async def stream_services(websocket: WebSocket, name: Optional[str] = None, state: Optional[str] = None):
+            # Sends a filtered snapshot, then only the transitions that pass
+            # the filter: ?name=<glob>&state=<active or sub states, comma separated>
+            await websocket.accept()
+            states = [s for s in (state or "").split(",") if s]
+            subscriber = self.inventory.subscribe(name, states)
+
+            async def watch_disconnect(scope: anyio.CancelScope):
+                try:
+                    while (await websocket.receive())["type"] != "websocket.disconnect":
+                        pass
+                finally:
+                    scope.cancel()
 
-            if self.is_service_excluded(service_name):
-                raise HTTPException(status_code=403, detail="Control of this service is not allowed.")
+            try:
+                async with anyio.create_task_group() as tasks:
+                    tasks.start_soon(watch_disconnect, tasks.cancel_scope)
+                    try:
+                        await self.inventory.list()
+                        event = None
+                        while True:
+                            if event is None:
+                                event = subscriber.snapshot(self.visible_services(self.inventory.units.values()))
+                            if event["type"] == "snapshot" or not self.is_service_excluded(event["service"]["name"]):
+                                await websocket.send_json(event)
+                            event = await self.inventory.next_event(subscriber)
+                    except WebSocketDisconnect:
+                        print("Client disconnected from service_manager websocket.")
+                    except ServiceError:
+                        await websocket.close(code=1011)
+                    finally:
+                        tasks.cancel_scope.cancel()
+            finally:
+                self.inventory.unsubscribe(subscriber)
+
+        @self.router.post("/services/batch")
+        async def control_services(batch: BatchRequest):
+            # Everything is validated before anything runs
+            errors = []
+            for index, operation in enumerate(batch.operations):
+                refusal = self.check_operation(operation.service, operation.action)
+                if refusal:
+                    errors.append({"index": index, "service": operation.service, "status": refusal[0], "detail": refusal[1]})
+            if errors:
+                status_code = 403 if all(error["status"] == 403 for error in errors) else 400
+                raise HTTPException(status_code=status_code, detail=errors)
+
+            concurrency = min(batch.concurrency or self.BATCH_CONCURRENCY, self.MAX_BATCH_CONCURRENCY)
+            timeout = batch.timeout or self.BATCH_TIMEOUT
+            operations = [operation.model_dump() for operation in batch.operations]
+
+            async def stream_results():
+                try:
+                    async for result in run_batch(self.inventory, operations, concurrency, timeout):
+                        self.invalidate_cache()
+                        yield json.dumps(result) + "\n"
+                finally:
+                    self.invalidate_cache()
 
-            if action not in ["start", "stop", "restart"]:
-                raise HTTPException(status_code=400, detail="Invalid action.")
+            return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+        @self.router.post("/services/{service_name}/{action}")
+        async def control_service(service_name: str, action: str):
+            refusal = self.check_operation(service_name, action)
+            if refusal:
+                raise HTTPException(status_code=refusal[0], detail=refusal[1])
 
             try:
-                subprocess.run(
-                    ["sudo", "systemctl", action, service_name],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    check=True
-                )
+                await self.inventory.control(service_name, action)
+                self.invalidate_cache()
                 return {"status": f"Service {service_name} {action}ed successfully."}
-            except subprocess.CalledProcessError as e:
+            except ServiceError:
                 raise HTTPException(status_code=500, detail=f"Failed to {action} service {service_name}.")
@@ -0,0 +1,62 @@
+# backend/plugins/service_manager/batch.py
+
+import math
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List
+
+import anyio
+
+from .inventory import ServiceError, ServiceInventory
+
+async def run_batch(inventory: ServiceInventory, operations: List[Dict], concurrency: int,
+                    timeout: float) -> AsyncIterator[Dict]:
+    # Runs already validated operations with at most `concurrency` units in
+    # flight and yields each result as soon as it is known. Operations on the
+    # same unit run one after another in request order; different units run
+    # in parallel.
+    by_service: Dict[str, List] = OrderedDict()
+    for index, operation in enumerate(operations):
+        by_service.setdefault(operation["service"], []).append((index, operation["action"]))
+
+    limiter = anyio.CapacityLimiter(concurrency)
+    # Unbounded, so a unit never waits for the client to read its results
+    send, receive = anyio.create_memory_object_stream(math.inf)
+
+    async def run_unit(service: str, steps: List):
+        # Shielded: a client going away does not leave a deploy half-applied.
+        # The task group below waits for every unit; each step still has its
+        # own timeout.
+        with anyio.CancelScope(shield=True):
+            async with limiter:
+                for index, action in steps:
+                    started = time.monotonic()
+                    try:
+                        with anyio.fail_after(timeout):
+                            await inventory.control(service, action)
+                        status, detail = "ok", f"Service {service} {action}ed successfully."
+                    except TimeoutError:
+                        status, detail = "timeout", f"Timed out after {timeout:g}s."
+                    except ServiceError:
+                        status, detail = "error", f"Failed to {action} service {service}."
+                    except Exception as e:
+                        # Every step must report, or the stream waits for it forever
+                        status, detail = "error", f"Failed to {action} service {service}: {e}"
+                    send.send_nowait({
+                        "index": index,
+                        "service": service,
+                        "action": action,
+                        "status": status,
+                        "detail": detail,
+                        "elapsed": round(time.monotonic() - started, 3),
+                    })
+
+    succeeded = 0
+    async with anyio.create_task_group() as tasks:
+        for service, steps in by_service.items():
+            tasks.start_soon(run_unit, service, steps)
+        for _ in range(len(operations)):
+            result = await receive.receive()
+            succeeded += result["status"] == "ok"
+            yield result
+    yield {"done": True, "succeeded": succeeded, "failed": len(operations) - succeeded}
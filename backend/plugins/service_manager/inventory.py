@@ -0,0 +1,296 @@
+# backend/plugins/service_manager/inventory.py
+
+import fnmatch
+import time
+from typing import Dict, List, Optional, Sequence, Set
+
+import anyio
+
+CACHE_TTL = 5.0  # Seconds the unit list is served from memory
+LIST_UNITS_COMMAND = ["systemctl", "list-units", "--type=service", "--all", "--no-pager", "--no-legend", "--plain"]
+SHOW_PROPERTIES = "Id,LoadState,ActiveState,SubState,Description"
+WATCH_INTERVAL = 2.0  # Seconds between refreshes while someone is watching
+STOP_TIMEOUT = 5.0  # Seconds an abandoned systemctl gets to exit after SIGTERM
+MAX_PENDING_EVENTS = 1000  # Per subscriber; beyond this it gets a fresh snapshot
+
+class ServiceError(Exception):
+    pass
+
+def parse_list_units(output: str) -> List[Dict]:
+    units = []
+    for line in output.strip().split('\n'):
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+        # Older systemd prints a status bullet in front of failed units
+        if parts[0] in ('●', '*'):
+            parts = parts[1:]
+        units.append({
+            "name": parts[0],
+            "load": parts[1],
+            "active": parts[2],
+            "sub": parts[3],
+            "description": ' '.join(parts[4:])
+        })
+    return units
+
+def parse_show(output: str) -> Optional[Dict]:
+    properties = dict(line.split('=', 1) for line in output.splitlines() if '=' in line)
+    if not properties.get("Id") or properties.get("LoadState") == "not-found":
+        return None
+    return {
+        "name": properties["Id"],
+        "load": properties.get("LoadState", ""),
+        "active": properties.get("ActiveState", ""),
+        "sub": properties.get("SubState", ""),
+        "description": properties.get("Description", "")
+    }
+
+class SystemctlBackend:
+    # Runs systemctl as a subprocess without blocking the event loop
+
+    async def _run(self, *command: str) -> str:
+        try:
+            process = await anyio.open_process(command)
+        except OSError as e:
+            raise ServiceError(str(e))
+        output: Dict[str, bytes] = {}
+
+        async def drain(name: str, stream):
+            output[name] = b''.join([chunk async for chunk in stream])
+
+        async with process:
+            try:
+                async with anyio.create_task_group() as tasks:
+                    tasks.start_soon(drain, 'stdout', process.stdout)
+                    tasks.start_soon(drain, 'stderr', process.stderr)
+                    await process.wait()
+            except anyio.get_cancelled_exc_class():
+                # Timed out or abandoned: stop the action rather than leave it
+                # running unobserved. sudo passes SIGTERM on to systemctl.
+                with anyio.CancelScope(shield=True):
+                    await self._stop(process)
+                raise
+        stdout, stderr = output['stdout'], output['stderr']
+        if process.returncode != 0:
+            raise ServiceError(stderr.decode(errors='replace').strip() or f"Return code: {process.returncode}")
+        return stdout.decode(errors='replace')
+
+    async def _stop(self, process):
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            with anyio.move_on_after(STOP_TIMEOUT):
+                await process.wait()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        except ProcessLookupError:
+            pass
+
+    async def list_units(self) -> List[Dict]:
+        return parse_list_units(await self._run(*LIST_UNITS_COMMAND))
+
+    async def show_unit(self, name: str) -> Optional[Dict]:
+        return parse_show(await self._run("systemctl", "show", name, f"--property={SHOW_PROPERTIES}"))
+
+    async def control(self, name: str, action: str):
+        await self._run("sudo", "systemctl", action, name)
+
+class StubBackend:
+    # In-memory systemd stand-in for tests and benchmarks
+
+    STATES = {
+        "start": ("active", "running"),
+        "restart": ("active", "running"),
+        "stop": ("inactive", "dead"),
+    }
+
+    def __init__(self, units: Optional[List[Dict]] = None, delay: float = 0.0):
+        self.units: Dict[str, Dict] = {unit["name"]: dict(unit) for unit in units or []}
+        self.calls: List[tuple] = []
+        # Simulated duration of a control action
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def list_units(self) -> List[Dict]:
+        self.calls.append(("list",))
+        return [dict(unit) for unit in self.units.values()]
+
+    async def show_unit(self, name: str) -> Optional[Dict]:
+        self.calls.append(("show", name))
+        unit = self.units.get(name)
+        return dict(unit) if unit else None
+
+    async def control(self, name: str, action: str):
+        self.calls.append((action, name))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await anyio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        unit = self.units.get(name)
+        if unit is None:
+            raise ServiceError(f"Unit {name} not found.")
+        unit["active"], unit["sub"] = self.STATES[action]
+
+class ServiceSubscriber:
+    def __init__(self, pattern: Optional[str] = None, states: Sequence[str] = ()):
+        self.pattern = pattern
+        self.states = set(states)
+        self._send, self._receive = anyio.create_memory_object_stream(MAX_PENDING_EVENTS)
+        # Set when events were dropped; the client then gets a new snapshot
+        self.resync = False
+
+    def matches(self, unit: Optional[Dict]) -> bool:
+        if unit is None:
+            return False
+        if self.pattern and not fnmatch.fnmatchcase(unit["name"], self.pattern):
+            return False
+        if self.states and unit["active"] not in self.states and unit["sub"] not in self.states:
+            return False
+        return True
+
+    def notify(self, before: Optional[Dict], after: Optional[Dict]):
+        # Transitions are relative to what this subscriber's filter lets through
+        was_visible, is_visible = self.matches(before), self.matches(after)
+        if was_visible and is_visible:
+            event = {"type": "changed", "service": after}
+        elif is_visible:
+            event = {"type": "added", "service": after}
+        elif was_visible:
+            event = {"type": "removed", "service": before}
+        else:
+            return
+        if self.resync:
+            return
+        try:
+            self._send.send_nowait(event)
+        except anyio.WouldBlock:
+            # Too far behind: drop the backlog, the consumer sends a snapshot instead
+            while self._receive.statistics().current_buffer_used:
+                self._receive.receive_nowait()
+            self.resync = True
+            self._send.send_nowait(None)
+
+    async def receive(self) -> Optional[Dict]:
+        # The next event, or None when a snapshot must be sent instead
+        return await self._receive.receive()
+
+    def snapshot(self, units: Sequence[Dict]) -> Dict:
+        self.resync = False
+        return {"type": "snapshot", "services": [unit for unit in units if self.matches(unit)]}
+
+class Refresh:
+    # One in-flight unit list load that concurrent callers wait on
+    __slots__ = ('done', 'finished', 'error')
+
+    def __init__(self):
+        self.done = anyio.Event()
+        self.finished = False
+        self.error: Optional[BaseException] = None
+
+class ServiceInventory:
+    # Unit list cache in front of a backend. Listing is a memory read while
+    # the cache is fresh, concurrent refreshes share one backend call, and
+    # control actions patch only the affected unit afterwards. While there
+    # are subscribers the list is reloaded every watch_interval by whichever
+    # subscriber waits longest for an event, so there is no background task.
+
+    def __init__(self, backend=None, ttl: float = CACHE_TTL):
+        self.backend = backend or SystemctlBackend()
+        self.ttl = ttl
+        self.units: Dict[str, Dict] = {}
+        self.loaded_at = float('-inf')
+        self._refreshing: Optional[Refresh] = None
+        self.subscribers: Set[ServiceSubscriber] = set()
+        self.watch_interval = WATCH_INTERVAL
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() - self.loaded_at < self.ttl
+
+    async def list(self) -> List[Dict]:
+        if not self.fresh:
+            await self.refresh()
+        return list(self.units.values())
+
+    async def refresh(self):
+        while self._refreshing is not None:
+            refreshing = self._refreshing
+            await refreshing.done.wait()
+            if refreshing.error is not None:
+                raise refreshing.error
+            if refreshing.finished:
+                return
+            # The caller that ran it was cancelled: the next waiter takes over
+        refreshing = self._refreshing = Refresh()
+        try:
+            await self._load()
+            refreshing.finished = True
+        except Exception as e:
+            # Waiting callers fail the same way
+            refreshing.error = e
+            raise
+        finally:
+            self._refreshing = None
+            refreshing.done.set()
+
+    async def _load(self):
+        units = {unit["name"]: unit for unit in await self.backend.list_units()}
+        previous, self.units = self.units, units
+        # The first load is not a transition, subscribers get it as a snapshot
+        initial = self.loaded_at == float('-inf')
+        self.loaded_at = time.monotonic()
+        if self.subscribers and not initial:
+            for name in previous.keys() | units.keys():
+                self._publish(previous.get(name), units.get(name))
+
+    async def update_unit(self, name: str):
+        unit = await self.backend.show_unit(name)
+        previous = self.units.get(name)
+        if unit is None:
+            self.units.pop(name, None)
+        else:
+            self.units[unit["name"]] = unit
+        self._publish(previous, unit)
+
+    def _publish(self, before: Optional[Dict], after: Optional[Dict]):
+        if before == after:
+            return
+        for subscriber in self.subscribers:
+            subscriber.notify(before, after)
+
+    def subscribe(self, pattern: Optional[str] = None, states: Sequence[str] = ()) -> ServiceSubscriber:
+        subscriber = ServiceSubscriber(pattern, states)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: ServiceSubscriber):
+        self.subscribers.discard(subscriber)
+
+    async def next_event(self, subscriber: ServiceSubscriber) -> Optional[Dict]:
+        # Waits for the subscriber's next event, reloading the list when it
+        # is older than watch_interval. All subscribers share each reload,
+        # whatever their filters.
+        while True:
+            with anyio.move_on_after(self.watch_interval):
+                return await subscriber.receive()
+            if time.monotonic() - self.loaded_at < self.watch_interval:
+                continue
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep watching; the next tick may well succeed
+                print(f"Service watcher refresh failed: {e}")
+
+    async def control(self, name: str, action: str):
+        await self.backend.control(name, action)
+        try:
+            await self.update_unit(name)
+        except ServiceError:
+            # The action itself succeeded; let the next refresh catch up
+            self.loaded_at = float('-inf')
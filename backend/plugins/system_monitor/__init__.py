@@ -1,86 +1,149 @@
 # backend/plugins/system_monitor/__init__.py
 
 from core.plugin_base import BasePlugin
-from fastapi import WebSocket, WebSocketDisconnect
+from core.metrics import MetricFamily, counter, gauge
+from fastapi import WebSocket, WebSocketDisconnect, HTTPException, Query
+from fastapi.responses import Response
+from typing import Optional
+import os
 import psutil
-import asyncio
+import time
+from . import protocol
+from .history import MetricsHistory
+from .sampler import MetricsSampler, StubMetrics
 
 class Plugin(BasePlugin):
     def __init__(self):
+        # The sampler must exist before BasePlugin registers the routes.
+        # SYSTEM_MONITOR_BACKEND=stub samples fake metrics instead of psutil.
+        self.stub = os.getenv("SYSTEM_MONITOR_BACKEND", "psutil").lower() == "stub"
+        self.sampler = MetricsSampler(StubMetrics()) if self.stub else MetricsSampler()
+        self.history = MetricsHistory()
+        self.sampler.listeners.append(lambda snapshot: self.history.add(snapshot.timestamp, snapshot.metrics))
         super().__init__()
         self.name = "System Monitor"
-        self.icon = ""  # Nerd Font code for system monitor icon
+        self.icon = ""  # Nerd Font code for system monitor icon
         self.description = "Monitor CPU, memory, disk, and network usage."
         self.version = "1.0"
         self.author = "Your Name"
         self.enabled = True
         self.position = 1  # Set default position
+        # Prime the CPU counter so the first non-blocking sample is meaningful
+        if not self.stub:
+            psutil.cpu_percent(interval=None)
+        self.add_topic("metrics", self.publish_metrics)
+
+    async def publish_metrics(self, topic, publish):
+        # Every tick is sent to all /ws subscribers in one publish
+        subscriber = self.sampler.subscribe()
+        try:
+            while True:
+                snapshot = await subscriber.get()
+                publish(snapshot.metrics, encoded=snapshot.payload)
+        finally:
+            self.sampler.unsubscribe(subscriber)
+
+    # Keep sampling for the history store for as long as the plugin is on
+    async def on_startup(self):
+        self.sampler.start()
+
+    async def on_enable(self):
+        self.sampler.start()
+
+    async def on_disable(self):
+        self.sampler.stop()
+
+    async def on_shutdown(self):
+        self.sampler.stop()
+
+    def collect_metrics(self):
+        # From the sampler's last snapshot: a scrape never samples or sleeps
+        snapshot = self.sampler.snapshot
+        if snapshot is None:
+            return []
+        metrics = snapshot.metrics
+        memory = gauge("pi_cm_memory_bytes", "Memory by state.")
+        for state in ('total', 'used', 'available'):
+            memory.add(metrics['memory'][state], state=state)
+        disk = gauge("pi_cm_disk_bytes", "Root filesystem space by state.")
+        for state in ('total', 'used', 'free'):
+            disk.add(metrics['disk'][state], state=state)
+        network_bytes = MetricFamily("pi_cm_network_bytes", "counter", "Network traffic by direction.")
+        network_packets = MetricFamily("pi_cm_network_packets", "counter", "Network packets by direction.")
+        for direction in ('sent', 'recv'):
+            network_bytes.add(metrics['network'][f'bytes_{direction}'], "_total", direction=direction)
+            network_packets.add(metrics['network'][f'packets_{direction}'], "_total", direction=direction)
+        return [
+            gauge("pi_cm_cpu_percent", "CPU usage in percent.", metrics['cpu_percent']),
+            gauge("pi_cm_memory_percent", "Memory usage in percent.", metrics['memory']['percent']),
+            memory,
+            gauge("pi_cm_disk_percent", "Root filesystem usage in percent.", metrics['disk']['percent']),
+            disk,
+            network_bytes,
+            network_packets,
+            gauge("pi_cm_sample_age_seconds", "Age of the sampled system metrics.",
+                  round(time.monotonic() - snapshot.sampled_at, 3)),
+            counter("pi_cm_samples", "System metric samples taken.", snapshot.seq),
+        ]
 
     def register_routes(self):
         @self.router.get("/metrics")
         async def get_metrics():
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            net_io = psutil.net_io_counters()
-
-            metrics = {
-                'cpu_percent': cpu_percent,
-                'memory': {
-                    'total': memory.total,
-                    'used': memory.used,
-                    'available': memory.available,
-                    'percent': memory.percent
-                },
-                'disk': {
-                    'total': disk.total,
-                    'used': disk.used,
-                    'free': disk.free,
-                    'percent': disk.percent
-                },
-                'network': {
-                    'bytes_sent': net_io.bytes_sent,
-                    'bytes_recv': net_io.bytes_recv,
-                    'packets_sent': net_io.packets_sent,
-                    'packets_recv': net_io.packets_recv
-                }
-            }
+            # Served from the shared snapshot, already serialized
+            snapshot = self.sampler.latest()
+            return Response(content=snapshot.payload, media_type="application/json")
 
-            return metrics
+        @self.router.get("/history")
+        async def get_history(
+            metric: str,
+            from_: Optional[float] = Query(None, alias="from"),
+            to: Optional[float] = None,
+            step: Optional[int] = Query(None, gt=0),
+        ):
+            now = time.time()
+            end = to if to is not None else now
+            start = from_ if from_ is not None else end - 3600
+            if start >= end:
+                raise HTTPException(status_code=400, detail="'from' must be earlier than 'to'.")
+            try:
+                step, points = self.history.query(metric, start, end, step, now=now)
+            except KeyError:
+                raise HTTPException(status_code=400, detail=f"Unknown metric '{metric}'.")
+            return {"metric": metric, "from": start, "to": end, "step": step, "points": points}
 
         @self.router.websocket("/ws/metrics")
-        async def websocket_endpoint(websocket: WebSocket):
+        async def websocket_endpoint(websocket: WebSocket, mode: str = "full", format: Optional[str] = None):
+            # Plain JSON of every tick stays the default; mode=delta and/or
+            # format=json|msgpack|struct opt into the framed protocol.
             await websocket.accept()
+            legacy = mode == "full" and format is None
+            fmt = format or "json"
+            error = protocol.check_protocol(mode, fmt)
+            if error:
+                await websocket.close(code=1003, reason=error)
+                return
+            subscriber = self.sampler.subscribe()
+            last_seq = None
             try:
                 while True:
-                    cpu_percent = psutil.cpu_percent(interval=None)
-                    memory = psutil.virtual_memory()
-                    disk = psutil.disk_usage('/')
-                    net_io = psutil.net_io_counters()
-
-                    metrics = {
-                        'cpu_percent': cpu_percent,
-                        'memory': {
-                            'total': memory.total,
-                            'used': memory.used,
-                            'available': memory.available,
-                            'percent': memory.percent
-                        },
-                        'disk': {
-                            'total': disk.total,
-                            'used': disk.used,
-                            'free': disk.free,
-                            'percent': disk.percent
-                        },
-                        'network': {
-                            'bytes_sent': net_io.bytes_sent,
-                            'bytes_recv': net_io.bytes_recv,
-                            'packets_sent': net_io.packets_sent,
-                            'packets_recv': net_io.packets_recv
-                        }
-                    }
-
-                    await websocket.send_json(metrics)
-                    await asyncio.sleep(1)
+                    snapshot = await subscriber.get()
+                    if legacy:
+                        await websocket.send_text(snapshot.payload)
+                        continue
+                    if mode == "delta" and last_seq is not None and snapshot.seq == last_seq + 1:
+                        if not snapshot.changes:
+                            last_seq = snapshot.seq
+                            continue
+                        frame = snapshot.frame("delta", fmt)
+                    else:
+                        # First frame, or the client skipped a tick: resync
+                        frame = snapshot.frame("full", fmt)
+                    last_seq = snapshot.seq
+                    if isinstance(frame, bytes):
+                        await websocket.send_bytes(frame)
+                    else:
+                        await websocket.send_text(frame)
             except WebSocketDisconnect:
                 print("Client disconnected from system_monitor websocket.")
+            finally:
+                self.sampler.unsubscribe(subscriber)
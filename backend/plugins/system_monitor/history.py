@@ -0,0 +1,148 @@
+# backend/plugins/system_monitor/history.py
+
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .sampler import flatten
+
+# Numeric metrics kept in history, as dotted paths into a sampler snapshot.
+# Totals are left out on purpose: they are constant and always in /metrics.
+METRICS = (
+    'cpu_percent',
+    'memory.used',
+    'memory.available',
+    'memory.percent',
+    'disk.used',
+    'disk.free',
+    'disk.percent',
+    'network.bytes_sent',
+    'network.bytes_recv',
+    'network.packets_sent',
+    'network.packets_recv',
+)
+
+# (resolution in seconds, number of buckets): 1s for 1h, 1m for 24h, 10m for 30d
+TIERS = ((1, 3600), (60, 1440), (600, 4320))
+
+# Upper bound on points returned by a query without an explicit step
+DEFAULT_MAX_POINTS = 300
+
+class RingTier:
+    # One fixed-size ring of rollup buckets. Every slot remembers which bucket
+    # it currently holds, so stale slots are detected without ever clearing
+    # the ring. Each slot costs 12 bytes plus 24 bytes per metric.
+
+    def __init__(self, resolution: int, size: int, metrics: Sequence[str]):
+        self.resolution = resolution
+        self.size = size
+        self.buckets = array('q', [-1]) * size
+        self.counts = array('I', [0]) * size
+        self.mins = {metric: array('d', [0.0]) * size for metric in metrics}
+        self.maxs = {metric: array('d', [0.0]) * size for metric in metrics}
+        self.sums = {metric: array('d', [0.0]) * size for metric in metrics}
+
+    @property
+    def retention(self) -> int:
+        return self.resolution * self.size
+
+    @property
+    def nbytes(self) -> int:
+        total = self.buckets.itemsize * self.size + self.counts.itemsize * self.size
+        for columns in (self.mins, self.maxs, self.sums):
+            total += sum(column.itemsize * len(column) for column in columns.values())
+        return total
+
+    def add(self, timestamp: float, values: Dict[str, float]):
+        bucket = int(timestamp // self.resolution)
+        slot = bucket % self.size
+        if self.buckets[slot] != bucket:
+            self.buckets[slot] = bucket
+            self.counts[slot] = 0
+        first = self.counts[slot] == 0
+        for metric, value in values.items():
+            if first:
+                self.mins[metric][slot] = value
+                self.maxs[metric][slot] = value
+                self.sums[metric][slot] = value
+            else:
+                if value < self.mins[metric][slot]:
+                    self.mins[metric][slot] = value
+                if value > self.maxs[metric][slot]:
+                    self.maxs[metric][slot] = value
+                self.sums[metric][slot] += value
+        self.counts[slot] += 1
+
+    def buckets_between(self, metric: str, start: float, end: float):
+        # Yields (bucket start time, min, max, sum, count) for live buckets in range
+        mins, maxs, sums = self.mins[metric], self.maxs[metric], self.sums[metric]
+        first = max(int(start // self.resolution), int(end // self.resolution) - self.size + 1)
+        for bucket in range(first, int(end // self.resolution) + 1):
+            slot = bucket % self.size
+            if self.buckets[slot] == bucket and self.counts[slot]:
+                yield bucket * self.resolution, mins[slot], maxs[slot], sums[slot], self.counts[slot]
+
+class MetricsHistory:
+    # Fixed-memory time-series store fed by the sampler. With the default
+    # metrics and tiers it allocates ~2.6 MB up front and never grows.
+
+    def __init__(self, metrics: Sequence[str] = METRICS, tiers: Sequence[Tuple[int, int]] = TIERS):
+        self.metrics = tuple(metrics)
+        self.tiers = [RingTier(resolution, size, self.metrics) for resolution, size in sorted(tiers)]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(tier.nbytes for tier in self.tiers)
+
+    def add(self, timestamp: float, metrics: Dict):
+        flat = flatten(metrics)
+        values = {metric: float(flat[metric]) for metric in self.metrics if metric in flat}
+        if not values:
+            return
+        for tier in self.tiers:
+            tier.add(timestamp, values)
+
+    def select_tier(self, start: float, now: float) -> RingTier:
+        # Finest tier that still covers the start of the requested range
+        for tier in self.tiers:
+            if now - start <= tier.retention:
+                return tier
+        return self.tiers[-1]
+
+    def query(self, metric: str, start: float, end: float, step: Optional[int] = None,
+              now: Optional[float] = None) -> Tuple[int, List[Dict]]:
+        if metric not in self.metrics:
+            raise KeyError(metric)
+        if now is None:
+            now = time.time()
+        tier = self.select_tier(start, now)
+        if step is None:
+            step = int((end - start) // DEFAULT_MAX_POINTS)
+        # Steps are whole multiples of the tier resolution
+        step = max(tier.resolution, -(-int(step) // tier.resolution) * tier.resolution)
+
+        points: List[Dict] = []
+        current = None
+        for bucket_start, low, high, total, count in tier.buckets_between(metric, start, end):
+            bucket = bucket_start - bucket_start % step
+            if current is None or current['t'] != bucket:
+                if current is not None:
+                    points.append(self._finish(current))
+                current = {'t': bucket, 'min': low, 'max': high, 'sum': total, 'count': count}
+            else:
+                current['min'] = min(current['min'], low)
+                current['max'] = max(current['max'], high)
+                current['sum'] += total
+                current['count'] += count
+        if current is not None:
+            points.append(self._finish(current))
+        return step, points
+
+    @staticmethod
+    def _finish(point: Dict) -> Dict:
+        return {
+            't': point['t'],
+            'min': point['min'],
+            'avg': point['sum'] / point['count'],
+            'max': point['max'],
+        }
@@ -0,0 +1,79 @@
+# backend/plugins/system_monitor/protocol.py
+
+import json
+import math
+import struct
+from typing import Dict, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency, only needed for format=msgpack
+    msgpack = None
+
+MODES = ('full', 'delta')
+FORMATS = ('json', 'msgpack', 'struct')
+
+# Fixed field order of the struct layout. Every frame starts with a
+# little-endian header of frame type (uint8) and sequence number (uint32).
+# A full frame then carries every field as a float64; a delta frame carries
+# a uint32 bitmask of changed fields followed by only those values.
+FIELDS = (
+    'cpu_percent',
+    'memory.total',
+    'memory.used',
+    'memory.available',
+    'memory.percent',
+    'disk.total',
+    'disk.used',
+    'disk.free',
+    'disk.percent',
+    'network.bytes_sent',
+    'network.bytes_recv',
+    'network.packets_sent',
+    'network.packets_recv',
+)
+FRAME_FULL = 0
+FRAME_DELTA = 1
+HEADER = struct.Struct('<BI')
+FULL_BODY = struct.Struct(f'<{len(FIELDS)}d')
+DELTA_MASK = struct.Struct('<I')
+
+def check_protocol(mode: str, fmt: str) -> Optional[str]:
+    # Returns an error message if the requested protocol cannot be served
+    if mode not in MODES:
+        return f"Unknown mode '{mode}'."
+    if fmt not in FORMATS:
+        return f"Unknown format '{fmt}'."
+    if fmt == 'msgpack' and msgpack is None:
+        return "msgpack is not installed on this host."
+    return None
+
+def diff(previous: Optional[Dict], current: Dict) -> Dict:
+    if previous is None:
+        return dict(current)
+    return {path: value for path, value in current.items() if previous.get(path) != value}
+
+def encode(snapshot, mode: str, fmt: str) -> Union[str, bytes]:
+    # `snapshot` is a sampler Snapshot; the frame is built from its full
+    # metrics or from the fields that changed since the previous tick.
+    if fmt == 'struct':
+        if mode == 'full':
+            values = [float(snapshot.flat.get(field, math.nan)) for field in FIELDS]
+            return HEADER.pack(FRAME_FULL, snapshot.seq) + FULL_BODY.pack(*values)
+        changes = snapshot.changes
+        mask = 0
+        values = []
+        for index, field in enumerate(FIELDS):
+            if field in changes:
+                mask |= 1 << index
+                values.append(float(changes[field]))
+        return (HEADER.pack(FRAME_DELTA, snapshot.seq) + DELTA_MASK.pack(mask)
+                + struct.pack(f'<{len(values)}d', *values))
+
+    if mode == 'full':
+        frame = {'type': 'full', 'seq': snapshot.seq, 'data': snapshot.metrics}
+    else:
+        frame = {'type': 'delta', 'seq': snapshot.seq, 'data': snapshot.changes}
+    if fmt == 'msgpack':
+        return msgpack.packb(frame)
+    return json.dumps(frame, separators=(',', ':'))
@@ -0,0 +1,196 @@
+# backend/plugins/system_monitor/sampler.py
+
+import asyncio
+import json
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+import psutil
+
+from . import protocol
+
+def collect_metrics() -> Dict:
+    cpu_percent = psutil.cpu_percent(interval=None)
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+    net_io = psutil.net_io_counters()
+
+    return {
+        'cpu_percent': cpu_percent,
+        'memory': {
+            'total': memory.total,
+            'used': memory.used,
+            'available': memory.available,
+            'percent': memory.percent
+        },
+        'disk': {
+            'total': disk.total,
+            'used': disk.used,
+            'free': disk.free,
+            'percent': disk.percent
+        },
+        'network': {
+            'bytes_sent': net_io.bytes_sent,
+            'bytes_recv': net_io.bytes_recv,
+            'packets_sent': net_io.packets_sent,
+            'packets_recv': net_io.packets_recv
+        }
+    }
+
+class StubMetrics:
+    # Deterministic stand-in for psutil (SYSTEM_MONITOR_BACKEND=stub), for
+    # benchmarks and machines without real counters
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self) -> Dict:
+        self.calls += 1
+        tick = self.calls
+        return {
+            'cpu_percent': float(tick % 100),
+            'memory': {'total': 4 * 2**30, 'used': 2**30 + tick % 1024 * 2**20,
+                       'available': 3 * 2**30 - tick % 1024 * 2**20, 'percent': 25.0 + tick % 25},
+            'disk': {'total': 64 * 2**30, 'used': 16 * 2**30, 'free': 48 * 2**30, 'percent': 25.0},
+            'network': {'bytes_sent': tick * 1500, 'bytes_recv': tick * 3000,
+                        'packets_sent': tick, 'packets_recv': tick * 2},
+        }
+
+def flatten(metrics: Dict, prefix: str = '') -> Dict:
+    flat = {}
+    for key, value in metrics.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{path}."))
+        else:
+            flat[path] = value
+    return flat
+
+class Snapshot:
+    __slots__ = ('seq', 'timestamp', 'sampled_at', 'metrics', 'payload',
+                 '_previous_flat', '_flat', '_changes', '_frames')
+
+    def __init__(self, seq: int, metrics: Dict, previous: Optional['Snapshot'] = None):
+        self.seq = seq
+        self.timestamp = time.time()
+        self.sampled_at = time.monotonic()
+        self.metrics = metrics
+        # Serialized once per tick and shared by every subscriber
+        self.payload = json.dumps(metrics, separators=(',', ':'))
+        # Only the previous values are kept, never the previous snapshot itself
+        self._previous_flat = previous.flat if previous is not None else None
+        self._flat: Optional[Dict] = None
+        self._changes: Optional[Dict] = None
+        self._frames: Dict[Tuple[str, str], Union[str, bytes]] = {}
+
+    @property
+    def flat(self) -> Dict:
+        if self._flat is None:
+            self._flat = flatten(self.metrics)
+        return self._flat
+
+    @property
+    def changes(self) -> Dict:
+        # Flattened fields that differ from the previous tick
+        if self._changes is None:
+            self._changes = protocol.diff(self._previous_flat, self.flat)
+            self._previous_flat = None
+        return self._changes
+
+    def frame(self, mode: str, fmt: str) -> Union[str, bytes]:
+        # Encoded at most once per tick for each protocol variant in use
+        key = (mode, fmt)
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self._frames[key] = protocol.encode(self, mode, fmt)
+        return frame
+
+class Subscriber:
+    def __init__(self):
+        # Holds at most one pending snapshot: a slow client skips stale ticks
+        # instead of buffering them or holding up the sampler.
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.dropped = 0
+
+    def offer(self, snapshot: Snapshot):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(snapshot)
+
+    async def get(self) -> Snapshot:
+        return await self.queue.get()
+
+class MetricsSampler:
+    def __init__(self, collect: Callable[[], Dict] = collect_metrics, interval: float = 1.0):
+        self.collect = collect
+        self.interval = interval
+        self.snapshot: Optional[Snapshot] = None
+        self.subscribers: Set[Subscriber] = set()
+        # Called with every new snapshot, e.g. to feed the history store
+        self.listeners: List[Callable[[Snapshot], None]] = []
+        # When set, the loop keeps sampling without websocket subscribers
+        self.keep_running = False
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def sample(self) -> Snapshot:
+        self._seq += 1
+        snapshot = Snapshot(self._seq, self.collect(), self.snapshot)
+        self.snapshot = snapshot
+        for listener in self.listeners:
+            listener(snapshot)
+        for subscriber in self.subscribers:
+            subscriber.offer(snapshot)
+        return snapshot
+
+    def latest(self) -> Snapshot:
+        # Reuse the shared snapshot while it is fresh; only sample inline when
+        # the background loop is not running (e.g. no websocket clients).
+        snapshot = self.snapshot
+        if snapshot is None or time.monotonic() - snapshot.sampled_at >= self.interval:
+            snapshot = self.sample()
+        return snapshot
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber()
+        # A running loop already has a fresh snapshot; a starting one samples immediately
+        if self.running and self.snapshot is not None:
+            subscriber.offer(self.snapshot)
+        self.subscribers.add(subscriber)
+        self._ensure_running()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and not self.keep_running:
+            self._cancel()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _ensure_running(self):
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def start(self):
+        self.keep_running = True
+        self._ensure_running()
+
+    def stop(self):
+        self.keep_running = False
+        self._cancel()
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"System monitor sampler error: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
@@ -1,20 +1,18 @@
-import json
+import copy
 import os
+from settings.store import SettingsStore
 
 SETTINGS_FILE = os.path.join(os.path.dirname(__file__), 'settings.json')
 
+store = SettingsStore(SETTINGS_FILE, defaults={
+    "background_color": "#FFFFFF",
+    "opacity": 1.0,
+    "plugins": {}
+})
+
 def load_settings():
-    if not os.path.exists(SETTINGS_FILE):
-        default_settings = {
-            "background_color": "#FFFFFF",
-            "opacity": 1.0,
-            "plugins": {}
-        }
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(default_settings, f)
-    with open(SETTINGS_FILE, 'r') as f:
-        return json.load(f)
+    with store.lock:
+        return copy.deepcopy(store.load())
 
 def save_settings(settings):
-    with open(SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f)
\ No newline at end of file
+    store.save(copy.deepcopy(settings))
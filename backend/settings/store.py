@@ -0,0 +1,84 @@
+# backend/settings/store.py
+
+import atexit
+import json
+import os
+import threading
+from typing import Optional
+
+DEBOUNCE_DELAY = 0.5  # Seconds of quiet before pending changes are written
+
+_stores = []
+
+class SettingsStore:
+    # In-memory copy of a JSON settings file that is authoritative while the
+    # backend runs. save() only marks it dirty and (re)starts a short timer,
+    # so a burst of changes ends up as one write. Writes go to a temp file
+    # that is fsynced and renamed over the original, so a crash leaves
+    # either the old or the new file, never half of one.
+
+    def __init__(self, path: str, defaults: Optional[dict] = None, delay: float = DEBOUNCE_DELAY,
+                 indent: Optional[int] = None):
+        self.path = path
+        self.defaults = defaults
+        self.delay = delay
+        self.indent = indent
+        self.lock = threading.RLock()  # Hold while mutating the dict from load(); never held during I/O
+        self._io = threading.Lock()  # One writer of the file at a time
+        self.writes = 0
+        self._data: Optional[dict] = None
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+        _stores.append(self)
+
+    def load(self) -> dict:
+        # Returns the live dict; it is read from disk only the first time
+        with self.lock:
+            if self._data is None:
+                if os.path.exists(self.path):
+                    with open(self.path, 'r') as f:
+                        self._data = json.load(f)
+                else:
+                    self._data = json.loads(json.dumps(self.defaults or {}))
+                    if self.defaults is not None:
+                        self.save()
+            return self._data
+
+    def save(self, data: Optional[dict] = None):
+        with self.lock:
+            if data is not None:
+                self._data = data
+            self._dirty = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        # The snapshot is taken while holding _io, so writes land in order
+        with self._io:
+            with self.lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                content = json.dumps(self._data, indent=self.indent)
+                self._dirty = False
+            temp_file = f"{self.path}.tmp"
+            with open(temp_file, 'w') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.path)
+            self.writes += 1
+
+def flush_all():
+    for store in _stores:
+        try:
+            store.flush()
+        except Exception as e:
+            print(f"Error writing settings to {store.path}: {e}")
+
+atexit.register(flush_all)
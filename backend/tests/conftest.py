@@ -0,0 +1,76 @@
+# tests/conftest.py
+
+import importlib
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from core.cache import response_cache
+from settings.store import SettingsStore
+
+def mount_plugin(plugin_id: str, plugin) -> FastAPI:
+    # An app serving one plugin's router under /plugins/<id>. Like the plugin
+    # manager, a new instance starts with an empty cache.
+    response_cache.forget(plugin.plugin_id)
+    test_app = FastAPI()
+    test_app.include_router(plugin.router, prefix=f"/plugins/{plugin_id}")
+    return test_app
+
+@pytest.fixture
+def plugin_app():
+    # plugin_app("log_viewer", plugin) -> app for TestClient websocket tests
+    return mount_plugin
+
+@pytest.fixture
+async def plugin_client():
+    # plugin_client("log_viewer", plugin) -> AsyncClient for the plugin's routes
+    clients = []
+
+    def connect(plugin_id: str, plugin) -> AsyncClient:
+        client = AsyncClient(transport=ASGITransport(app=mount_plugin(plugin_id, plugin)), base_url="http://test")
+        clients.append(client)
+        return client
+
+    yield connect
+    for client in clients:
+        await client.aclose()
+
+@pytest.fixture
+def settings_store(tmp_path):
+    # Settings written by a test stay in its temporary directory
+    return SettingsStore(str(tmp_path / "plugins_settings.json"), delay=60)
+
+@pytest.fixture
+def plugin_manager(settings_store):
+    # A plugin manager of its own, on a fresh app
+    from core.plugin_manager import PluginManager
+
+    manager = PluginManager(FastAPI())
+    manager.settings = settings_store
+    return manager
+
+@pytest.fixture
+def backend(monkeypatch, settings_store):
+    # The main module with its plugins loaded. test_main imports it with
+    # LOAD_PLUGINS=false; whichever test module ran first, reload it then.
+    monkeypatch.setenv("LOAD_PLUGINS", "true")
+    import main
+    if main.plugin_manager is None:
+        importlib.reload(main)
+    monkeypatch.setattr(main.plugin_manager, "settings", settings_store)
+    return main
+
+@pytest.fixture
+async def backend_client(backend):
+    # AsyncClient for the main app, with its plugins loaded
+    async with AsyncClient(transport=ASGITransport(app=backend.app), base_url="http://test") as client:
+        yield client
+
+@pytest.fixture
+def command_executor(tmp_path, monkeypatch):
+    # A command_executor whose task journal lives in tmp_path
+    from plugins.command_executor import Plugin
+
+    monkeypatch.setenv("COMMAND_JOURNAL_FILE", str(tmp_path / "tasks.jsonl"))
+    plugin = Plugin()
+    yield plugin
+    plugin.journal.close()
@@ -1,8 +1,9 @@
 # tests/test_plugins.py
 
 import pytest
-from httpx import AsyncClient
+from httpx import ASGITransport, AsyncClient
 import os
+import time
 
 # Ensure plugins are loaded
 os.environ["LOAD_PLUGINS"] = "true"
@@ -62,3 +63,1150 @@ async def test_datetime_display_current_datetime():
     assert response.status_code == 200
     json_data = response.json()
     assert "current_datetime" in json_data
+
+# The plugins and the plugin manager run their background work on asyncio
+asyncio_only = pytest.mark.parametrize("anyio_backend", ["asyncio"])
+
+def test_system_monitor_websockets_share_one_sampler(plugin_app):
+    from fastapi.testclient import TestClient
+    from plugins.system_monitor import Plugin
+
+    plugin = Plugin()
+    calls = []
+
+    def fake_collect():
+        calls.append(1)
+        return {"cpu_percent": float(len(calls))}
+
+    plugin.sampler.collect = fake_collect
+    plugin.sampler.interval = 0.1
+    # One client context so both websockets share the same event loop
+    with TestClient(plugin_app("system_monitor", plugin)) as client, \
+            client.websocket_connect("/plugins/system_monitor/ws/metrics") as first, \
+            client.websocket_connect("/plugins/system_monitor/ws/metrics") as second:
+        assert first.receive_json() == second.receive_json()
+        assert first.receive_json() == second.receive_json()
+        # Both clients were fed from the same ticks
+        response = client.get("/plugins/system_monitor/metrics")
+        assert 2 <= response.json()["cpu_percent"] <= len(calls)
+    assert not plugin.sampler.subscribers
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_system_monitor_history_rollups(plugin_client):
+    from plugins.system_monitor import Plugin
+
+    plugin = Plugin()
+    plugin.sampler.collect = lambda: {"cpu_percent": 50.0}
+    client = plugin_client("system_monitor", plugin)
+    now = int(time.time())
+    for offset in range(120):
+        plugin.history.add(now - 120 + offset, {"cpu_percent": float(offset % 60), "memory": {"used": 1}})
+
+    # The sampler keeps feeding the history while the plugin is on
+    await plugin.on_startup()
+    assert plugin.sampler.running
+    response = await client.get("/plugins/system_monitor/history",
+                                params={"metric": "cpu_percent", "from": now - 120, "to": now - 1, "step": 60})
+    assert response.status_code == 200
+    points = response.json()["points"]
+    assert points and all(point["min"] <= point["avg"] <= point["max"] for point in points)
+    assert max(point["max"] for point in points) == 59.0
+
+    response = await client.get("/plugins/system_monitor/history", params={"metric": "memory.total"})
+    assert response.status_code == 400
+    await plugin.on_disable()
+    assert not plugin.sampler.running
+    # Memory is allocated up front and bounded
+    assert plugin.history.nbytes < 3 * 1024 * 1024
+
+def test_system_monitor_delta_protocol(plugin_app):
+    from fastapi.testclient import TestClient
+    from plugins.system_monitor import Plugin, protocol
+
+    plugin = Plugin()
+    ticks = []
+
+    def fake_collect():
+        ticks.append(1)
+        return {"cpu_percent": float(len(ticks)), "memory": {"total": 1024, "used": 512}}
+
+    plugin.sampler.collect = fake_collect
+    plugin.sampler.interval = 0.05
+    client = TestClient(plugin_app("system_monitor", plugin))
+
+    with client.websocket_connect("/plugins/system_monitor/ws/metrics?mode=delta") as websocket:
+        full = websocket.receive_json()
+        assert full["type"] == "full"
+        assert full["data"]["memory"] == {"total": 1024, "used": 512}
+        delta = websocket.receive_json()
+        assert delta["type"] == "delta"
+        assert delta["data"] == {"cpu_percent": float(delta["seq"])}
+
+    with client.websocket_connect("/plugins/system_monitor/ws/metrics?mode=delta&format=struct") as websocket:
+        frame_type, _ = protocol.HEADER.unpack_from(websocket.receive_bytes())
+        assert frame_type == protocol.FRAME_FULL
+        frame = websocket.receive_bytes()
+        frame_type, _ = protocol.HEADER.unpack_from(frame)
+        mask, = protocol.DELTA_MASK.unpack_from(frame, protocol.HEADER.size)
+        assert frame_type == protocol.FRAME_DELTA
+        assert mask == 1 << protocol.FIELDS.index("cpu_percent")
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_log_viewer_tail_engine_shares_reader_and_follows_rotation(tmp_path):
+    import asyncio
+    from plugins.log_viewer.tail import TailEngine
+
+    log_file = tmp_path / "app.log"
+    log_file.write_text("old line\n")
+
+    engine = TailEngine()
+    first = engine.subscribe(str(log_file))
+    second = engine.subscribe(str(log_file))
+    assert len(engine.tailers) == 1
+
+    with open(log_file, "a") as f:
+        f.write("one\ntwo\nthree")
+    assert await asyncio.wait_for(first.get(), 2) == "one\ntwo\n"
+    assert await asyncio.wait_for(second.get(), 2) == "one\ntwo\n"
+
+    # logrotate: rename the file away and create a fresh one
+    os.rename(log_file, tmp_path / "app.log.1")
+    log_file.write_text("after rotate\n")
+    assert await asyncio.wait_for(first.get(), 2) == "after rotate\n"
+
+    # copytruncate: truncate in place
+    with open(log_file, "w") as f:
+        f.write("truncated\n")
+    assert await asyncio.wait_for(first.get(), 2) == "truncated\n"
+
+    engine.unsubscribe(str(log_file), first)
+    engine.unsubscribe(str(log_file), second)
+    assert not engine.tailers
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_log_viewer_tail_closes_subscribers_on_unreadable_rotation(tmp_path, monkeypatch):
+    import asyncio
+    from plugins.log_viewer import tail
+    from plugins.log_viewer.tail import TailEngine
+
+    log_file = tmp_path / "app.log"
+    log_file.write_text("old line\n")
+    engine = TailEngine()
+    subscriber = engine.subscribe(str(log_file))
+
+    # Rotated to a file the backend may not read (the tests run as root,
+    # so the permission error is raised for it directly)
+    os_open = os.open
+    readable = False
+
+    def guarded_open(path, *args, **kwargs):
+        if str(path) == str(log_file) and not readable:
+            raise PermissionError(13, "Permission denied")
+        return os_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(tail.os, "open", guarded_open)
+    monkeypatch.setattr(tail, "DELETE_GRACE_PERIOD", 0.5)
+    os.rename(log_file, tmp_path / "app.log.1")
+    log_file.write_text("after rotate\n")
+
+    # Readable again within the grace period: following resumes
+    await asyncio.sleep(0.2)
+    readable = True
+    assert await asyncio.wait_for(subscriber.get(), 2) == "after rotate\n"
+
+    # Still unreadable after it: subscribers are closed with the reason
+    readable = False
+    os.rename(log_file, tmp_path / "app.log.2")
+    log_file.write_text("unreadable\n")
+    assert await asyncio.wait_for(subscriber.get(), 3) is None
+    assert subscriber.close_message == "Log file cannot be read: Permission denied"
+    assert not engine.tailers
+
+@pytest.mark.anyio
+async def test_log_viewer_indexed_lines_and_search(tmp_path, plugin_client):
+    import json
+    from plugins.log_viewer import Plugin
+    from plugins.log_viewer.index import LogIndexer
+
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    log_file = log_dir / "app.log"
+    log_file.write_text("".join(f"line {i} {'ERROR' if i % 50 == 0 else 'ok'}\n" for i in range(500)))
+
+    plugin = Plugin()
+    plugin.ALLOWED_LOG_DIRS = [str(log_dir)]
+    plugin.indexer = LogIndexer(str(tmp_path / "index"), interval=16, save_step=8)
+    client = plugin_client("log_viewer", plugin)
+    url = f"/plugins/log_viewer/logs{log_file}"
+
+    response = await client.get(f"{url}/lines", params={"offset": 250, "limit": 2})
+    assert response.json()["lines"] == ["line 250 ERROR", "line 251 ok"]
+    assert response.json()["total_lines"] == 500
+    [index_file] = tmp_path.joinpath("index").iterdir()
+    saved = index_file.read_bytes()
+
+    # The index is extended, not rebuilt, as the file grows; a few new lines
+    # do not rewrite the index file
+    with open(log_file, "a") as f:
+        f.write("appended ERROR\n")
+    response = await client.get(f"{url}/lines", params={"offset": 500})
+    assert response.json()["lines"] == ["appended ERROR"]
+    assert index_file.read_bytes() == saved
+
+    response = await client.get(f"{url}/search", params={"q": "ERROR"})
+    matches = [json.loads(line) for line in response.text.splitlines()]
+    assert [match["line"] for match in matches] == list(range(0, 500, 50)) + [500]
+
+    response = await client.get(f"{url}/search", params={"q": r"^line 4\d9 ", "regex": True, "limit": 3})
+    assert [json.loads(line)["line"] for line in response.text.splitlines()] == [409, 419, 429]
+
+    assert (await client.get("/plugins/log_viewer/logs/etc/passwd/lines")).status_code == 403
+
+@pytest.mark.anyio
+async def test_log_viewer_catalog_pagination_and_etag(tmp_path, plugin_client):
+    from plugins.log_viewer import Plugin
+
+    (tmp_path / "nested").mkdir()
+    for name, size in [("a.log", 3), ("b.log", 30), ("nested/c.log", 10), ("secure", 1)]:
+        (tmp_path / name).write_text("x" * size)
+
+    # Only regular files are listed: not links to directories, nor dangling links
+    (tmp_path / "linked").symlink_to(tmp_path / "nested", target_is_directory=True)
+    (tmp_path / "dangling.log").symlink_to(tmp_path / "missing.log")
+
+    plugin = Plugin()
+    plugin.ALLOWED_LOG_DIRS = [str(tmp_path)]
+    plugin.EXCLUDED_FILES = [str(tmp_path / "secure")]
+    client = plugin_client("log_viewer", plugin)
+    params = {"sort": "size", "order": "desc", "limit": 2}
+
+    response = await client.get("/plugins/log_viewer/logs", params=params)
+    assert response.status_code == 200
+    assert response.json()["total"] == 3
+    assert response.json()["log_files"] == [str(tmp_path / "b.log"), str(tmp_path / "nested/c.log")]
+    etag = response.headers["etag"]
+
+    response = await client.get("/plugins/log_viewer/logs", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    (tmp_path / "d.log").write_text("new")
+    plugin.catalog.refresh(force=True)
+    response = await client.get("/plugins/log_viewer/logs", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total"] == 4
+
+    # A sibling directory sharing the prefix is not inside the allowed root
+    assert not plugin.is_allowed_file(str(tmp_path) + "-other/app.log")
+
+def service_units(*states):
+    # Stub systemd units named after their position: unit0.service, ...
+    return [{"name": f"unit{index}.service", "load": "loaded", "active": active,
+             "sub": "running" if active == "active" else "dead", "description": ""}
+            for index, active in enumerate(states)]
+
+@pytest.mark.anyio
+async def test_service_manager_inventory_is_cached(plugin_client):
+    from plugins.service_manager import Plugin
+    from plugins.service_manager.inventory import ServiceInventory, StubBackend
+
+    backend = StubBackend(service_units("inactive", "active"))
+    plugin = Plugin()
+    plugin.inventory = ServiceInventory(backend)
+    client = plugin_client("service_manager", plugin)
+    # Cached under the plugin's id, so a reloaded instance cannot inherit
+    # another instance's entries by reusing its id()
+    assert plugin.plugin_id == "service_manager"
+
+    for _ in range(3):
+        response = await client.get("/plugins/service_manager/services")
+        assert response.status_code == 200
+        assert len(response.json()["services"]) == 2
+    assert backend.calls == [("list",)]
+
+    response = await client.post("/plugins/service_manager/services/unit0.service/start")
+    assert response.status_code == 200
+    # The started unit is patched in place, without relisting everything
+    services = {s["name"]: s for s in (await client.get("/plugins/service_manager/services")).json()["services"]}
+    assert services["unit0.service"]["active"] == "active"
+    assert backend.calls == [("list",), ("start", "unit0.service"), ("show", "unit0.service")]
+
+    assert (await client.post("/plugins/service_manager/services/missing.service/stop")).status_code == 500
+
+def test_service_manager_streams_filtered_transitions(plugin_app):
+    from fastapi.testclient import TestClient
+    from plugins.service_manager import Plugin
+    from plugins.service_manager.inventory import ServiceInventory, StubBackend
+
+    backend = StubBackend(service_units("inactive", "active"))
+    plugin = Plugin()
+    plugin.inventory = ServiceInventory(backend)
+    plugin.inventory.watch_interval = 0.05
+
+    with TestClient(plugin_app("service_manager", plugin)) as client, \
+            client.websocket_connect("/plugins/service_manager/ws/services?name=unit0*") as by_name, \
+            client.websocket_connect("/plugins/service_manager/ws/services?state=failed") as by_state:
+        assert [s["name"] for s in by_name.receive_json()["services"]] == ["unit0.service"]
+        assert by_state.receive_json() == {"type": "snapshot", "services": []}
+
+        client.post("/plugins/service_manager/services/unit0.service/start")
+        event = by_name.receive_json()
+        assert event["type"] == "changed" and event["service"]["active"] == "active"
+
+        backend.units["unit0.service"]["active"] = "failed"
+        assert by_state.receive_json()["type"] == "added"
+        backend.units["unit0.service"]["active"] = "active"
+        assert by_state.receive_json()["type"] == "removed"
+
+    # Polling stops with the last subscriber
+    assert not plugin.inventory.subscribers
+    calls = len(backend.calls)
+    time.sleep(0.2)
+    assert len(backend.calls) == calls
+
+@pytest.mark.anyio
+async def test_service_manager_batch_actions(plugin_client):
+    import json
+    from plugins.service_manager import Plugin
+    from plugins.service_manager.inventory import ServiceInventory, StubBackend
+
+    units = service_units(*["active"] * 6)
+    backend = StubBackend(units, delay=0.05)
+    plugin = Plugin()
+    plugin.inventory = ServiceInventory(backend)
+    client = plugin_client("service_manager", plugin)
+
+    operations = [{"service": unit["name"], "action": "restart"} for unit in units]
+    operations.append({"service": "missing.service", "action": "stop"})
+    response = await client.post("/plugins/service_manager/services/batch",
+                                 json={"operations": operations, "concurrency": 2})
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(r["index"] for r in results[:-1]) == list(range(7))
+    assert results[-1] == {"done": True, "succeeded": 6, "failed": 1}
+    assert backend.max_in_flight == 2
+
+    # One invalid entry rejects the whole batch before anything runs
+    backend.calls.clear()
+    response = await client.post("/plugins/service_manager/services/batch", json={"operations": [
+        {"service": "unit0.service", "action": "restart"},
+        {"service": "ssh", "action": "stop"},
+        {"service": "bad name", "action": "start"},
+    ]})
+    assert response.status_code == 400
+    assert [error["index"] for error in response.json()["detail"]] == [1, 2]
+    assert backend.calls == []
+
+    # An unexpected error is reported as a failed step, not a hung stream
+    async def broken_control(name, action):
+        raise RuntimeError("bus went away")
+
+    backend.control = broken_control
+    response = await client.post("/plugins/service_manager/services/batch",
+                                 json={"operations": [{"service": "unit0.service", "action": "stop"}]})
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results[0]["status"] == "error" and "bus went away" in results[0]["detail"]
+    assert results[-1] == {"done": True, "succeeded": 0, "failed": 1}
+
+    # A step that outlives the batch timeout is reported as such
+    del backend.control
+    backend.delay = 1
+    response = await client.post("/plugins/service_manager/services/batch",
+                                 json={"operations": [{"service": "unit0.service", "action": "stop"}], "timeout": 0.1})
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results[0]["status"] == "timeout" and results[0]["elapsed"] < 0.5
+
+@pytest.mark.anyio
+async def test_service_manager_timed_out_action_is_stopped(tmp_path):
+    import anyio
+    import sys
+    from plugins.service_manager.inventory import SystemctlBackend
+
+    pid_file = tmp_path / "pid"
+    script = f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); time.sleep(30)"
+    with pytest.raises(TimeoutError):
+        with anyio.fail_after(1):
+            await SystemctlBackend()._run(sys.executable, "-c", script)
+    # Stopped and reaped before the timeout is reported
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+def test_command_executor_output_ring_buffer():
+    from plugins.command_executor.output import OutputBuffer
+
+    buffer = OutputBuffer(max_bytes=16)
+    buffer.write(b"0123456789")
+    assert buffer.read(4) == (b"456789", 4, False)
+    buffer.write(b"abcdefghij")
+    # Oldest bytes were evicted; memory stays at max_bytes
+    assert buffer.read(0) == (b"456789abcdefghij", 4, True)
+    buffer.write(b"x" * 40)
+    assert buffer.read(0) == (b"x" * 16, 44, True)
+    assert buffer.read(60) == (b"", 60, False)
+    assert len(buffer._ring) == 16
+
+def test_command_executor_streams_output(command_executor, plugin_app):
+    import sys
+    from fastapi.testclient import TestClient
+
+    command_executor.ALLOWED_COMMANDS["chatty"] = {
+        "command": [sys.executable, "-u", "-c", "import sys; print('out'); print('err', file=sys.stderr)"],
+        "description": "Test command",
+    }
+
+    with TestClient(plugin_app("command_executor", command_executor)) as client:
+        task_id = client.post("/plugins/command_executor/commands/chatty").json()["task_id"]
+        data = ""
+        with client.websocket_connect(f"/plugins/command_executor/commands/stream/{task_id}") as websocket:
+            while True:
+                message = websocket.receive_json()
+                data += message["data"]
+                if message["done"]:
+                    break
+        assert data.split() == ["out", "err"]
+
+        response = client.get(f"/plugins/command_executor/commands/output/{task_id}", params={"since": 4})
+        assert response.json()["data"] == "err\n"
+        assert response.json()["next"] == 8
+
+def test_command_executor_journal_survives_restart(tmp_path):
+    from db.journal import TaskJournal
+
+    path = str(tmp_path / "tasks.jsonl")
+    journal = TaskJournal(path, flush_interval=0.01)
+    for i in range(5):
+        journal.record(f"t{i}", {"status": "pending", "command_key": "a" if i % 2 else "b",
+                                 "queued_at": f"2024-01-01T00:00:0{i}"})
+    for i in range(4):
+        journal.record(f"t{i}", dict(journal.get(f"t{i}"), status="completed", success=True))
+    journal.close()
+    with open(path) as f:
+        assert len(f.readlines()) == 9
+
+    # Replayed by task id and queue time; the task left pending was interrupted
+    journal = TaskJournal(path)
+    assert journal.get("t4")["status"] == "failed"
+    assert [r["task_id"] for r in journal.query(command_key="b")] == ["t4", "t2", "t0"]
+    assert [r["task_id"] for r in journal.query(status="completed", limit=2)] == ["t3", "t2"]
+
+    journal.max_records = 2
+    journal._compact()
+    with open(path) as f:
+        assert len(f.readlines()) == 2
+    assert TaskJournal(path).records.keys() == {"t3", "t4"}
+
+def test_command_executor_journal_records_during_slow_fsync(tmp_path, monkeypatch):
+    import threading
+    from db import journal as journal_module
+    from db.journal import TaskJournal
+
+    synced = threading.Event()
+
+    def slow_fsync(fd):
+        synced.set()
+        time.sleep(0.5)
+
+    monkeypatch.setattr(journal_module.os, "fsync", slow_fsync)
+    journal = TaskJournal(str(tmp_path / "tasks.jsonl"), flush_interval=0)
+    journal.record("t0", {"status": "pending", "command_key": "a", "queued_at": "2024-01-01T00:00:00"})
+    assert synced.wait(2)
+    # Recording and querying do not wait for the file write in progress
+    started = time.monotonic()
+    journal.record("t1", {"status": "pending", "command_key": "a", "queued_at": "2024-01-01T00:00:01"})
+    assert [r["task_id"] for r in journal.query()] == ["t1", "t0"]
+    assert time.monotonic() - started < 0.2
+    journal.close()
+    assert TaskJournal(str(tmp_path / "tasks.jsonl")).records.keys() == {"t0", "t1"}
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_command_executor_scheduler_limits_coalesces_and_cancels(command_executor, plugin_client):
+    import asyncio
+    import sys
+
+    plugin = command_executor
+    sleeper = [sys.executable, "-c", "import time; time.sleep(30)"]
+    plugin.ALLOWED_COMMANDS = {
+        "first": {"command": sleeper, "description": "", "lock": "dpkg"},
+        "second": {"command": sleeper, "description": "", "lock": "dpkg"},
+    }
+    client = plugin_client("command_executor", plugin)
+    commands = "/plugins/command_executor/commands"
+
+    running = (await client.post(f"{commands}/first")).json()
+    assert running["status"] == "Command execution started."
+    # Same lock: the second command waits, and repeated clicks reuse it
+    queued = (await client.post(f"{commands}/second")).json()
+    again = (await client.post(f"{commands}/second")).json()
+    assert queued["status"] == "Command queued."
+    assert again["task_id"] == queued["task_id"] and again["coalesced"]
+    assert plugin.scheduler.queue_depth == 1
+
+    response = await client.post(f"{commands}/cancel/{queued['task_id']}")
+    assert response.status_code == 200
+    status = (await client.get(f"{commands}/status/{queued['task_id']}")).json()
+    assert status["status"] == "cancelled" and status["started_at"] is None
+
+    await client.post(f"{commands}/cancel/{running['task_id']}")
+    for _ in range(100):
+        if not plugin.scheduler.running:
+            break
+        await asyncio.sleep(0.05)
+    status = (await client.get(f"{commands}/status/{running['task_id']}")).json()
+    assert status["status"] == "cancelled"
+    history = (await client.get(f"{commands}/history", params={"status": "cancelled"})).json()
+    assert [task["task_id"] for task in history["tasks"]] == [queued["task_id"], running["task_id"]]
+
+    # Finished records are evicted once over the cap
+    plugin.scheduler.max_finished = 0
+    plugin.scheduler.evict()
+    assert not plugin.command_statuses and not plugin.command_outputs
+    # ...but their status is still answered from the journal
+    assert plugin.scheduler.lookup(running["task_id"])["status"] == "cancelled"
+
+def test_settings_store_coalesces_and_replaces_atomically(tmp_path):
+    import json
+    from settings.store import SettingsStore
+
+    path = tmp_path / "plugins_settings.json"
+    store = SettingsStore(str(path), delay=0.05, indent=4)
+    for position in range(10):
+        with store.lock:
+            store.load().setdefault("demo", {})["position"] = position
+            store.save()
+    assert not path.exists()
+    time.sleep(0.3)
+    assert store.writes == 1
+    assert json.loads(path.read_text()) == {"demo": {"position": 9}}
+    assert not (tmp_path / "plugins_settings.json.tmp").exists()
+
+    store.save({"demo": {"position": 1}})
+    store.flush()
+    assert store.writes == 2
+    assert SettingsStore(str(path)).load() == {"demo": {"position": 1}}
+
+def test_settings_store_saves_during_slow_fsync(tmp_path, monkeypatch):
+    import json
+    import threading
+    from settings import store as store_module
+    from settings.store import SettingsStore
+
+    synced = threading.Event()
+
+    def slow_fsync(fd):
+        synced.set()
+        time.sleep(0.5)
+
+    monkeypatch.setattr(store_module.os, "fsync", slow_fsync)
+    path = tmp_path / "plugins_settings.json"
+    store = SettingsStore(str(path), delay=0)
+    store.save({"demo": {"position": 1}})
+    assert synced.wait(2)
+    # Changing settings does not wait for the file write in progress
+    started = time.monotonic()
+    with store.lock:
+        store.load()["demo"]["position"] = 2
+        store.save()
+    assert time.monotonic() - started < 0.2
+    store.flush()
+    assert json.loads(path.read_text()) == {"demo": {"position": 2}}
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_lifespan_stops_plugins_before_flushing_settings(backend, monkeypatch):
+    events = []
+
+    async def on_shutdown():
+        events.append("plugin stopped")
+
+    monkeypatch.setattr(backend.plugin_manager.plugins["system_monitor"], "on_shutdown", on_shutdown)
+    monkeypatch.setattr(backend, "flush_all", lambda: events.append("settings flushed"))
+    async with backend.app.router.lifespan_context(backend.app):
+        assert events == [] and backend.loop_monitor.report()["running"]
+    assert events == ["plugin stopped", "settings flushed"]
+    assert not backend.loop_monitor.report()["running"]
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_batch_reorder_and_update_plugins(backend, backend_client, settings_store):
+    manager = backend.plugin_manager
+    order = ["datetime_display", "command_executor", "service_manager", "log_viewer", "system_monitor"]
+    response = await backend_client.post("/plugins/batch",
+                                         json={"order": order, "updates": {"log_viewer": {"name": "Logs"}}})
+    assert response.status_code == 200
+    names = {id(plugin): name for name, plugin in manager.plugins.items()}
+    assert [names[id(plugin)] for plugin in manager.get_plugins()] == \
+        [name for name in order if name in manager.enabled_plugins]
+    assert manager.plugins["log_viewer"].name == "Logs"
+    settings_store.flush()
+    assert settings_store.writes == 1
+    assert settings_store.load()["datetime_display"]["position"] == 0
+
+    # Invalid batches change nothing
+    response = await backend_client.post("/plugins/batch",
+                                         json={"order": ["log_viewer"], "updates": {"log_viewer": {"router": None}}})
+    assert response.status_code == 400
+    response = await backend_client.post("/plugins/batch", json={"order": ["missing"]})
+    assert response.status_code == 404
+    response = await backend_client.post("/plugins/batch",
+                                         json={"updates": {"log_viewer": {"name": "Changed", "position": "top"}}})
+    assert response.status_code == 422
+    response = await backend_client.post("/plugins/log_viewer/update", json={"name": "Changed", "enabled": "maybe"})
+    assert response.status_code == 422
+    assert manager.plugins["log_viewer"].position == 3 and manager.plugins["log_viewer"].name == "Logs"
+
+    # Settings of the wrong type, e.g. from an older file, are ignored
+    from core.plugin_base import PluginManifest
+    assert PluginManifest({"name": "Logs", "position": "top"}).settings()["position"] == -1
+
+    # Enabling and disabling in a batch mounts and unmounts the plugin
+    url = "/plugins/datetime_display/current_datetime"
+    response = await backend_client.post("/plugins/batch", json={"updates": {"datetime_display": {"enabled": False}}})
+    assert response.status_code == 200
+    assert (await backend_client.get(url)).status_code == 404
+    assert "datetime_display" not in manager.enabled_plugins
+    assert manager.plugins["datetime_display"] not in manager.get_plugins()
+    response = await backend_client.post("/plugins/batch", json={"updates": {"datetime_display": {"enabled": True}}})
+    assert response.status_code == 200
+    assert (await backend_client.get(url)).status_code == 200
+    assert manager.get_plugins()[0] is manager.plugins["datetime_display"]
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_plugins_are_dispatched_by_prefix(backend, backend_client):
+    client = backend_client
+    routes = len(backend.app.router.routes)
+
+    assert (await client.get("/plugins/datetime_display/current_datetime")).status_code == 200
+    assert (await client.post("/plugins/datetime_display/current_datetime")).status_code == 405
+    await client.post("/plugins/datetime_display/disable")
+    assert (await client.get("/plugins/datetime_display/current_datetime")).status_code == 404
+    await client.post("/plugins/datetime_display/enable")
+    await client.post("/plugins/datetime_display/enable")
+    assert (await client.get("/plugins/datetime_display/current_datetime")).status_code == 200
+    assert len(backend.app.router.routes) == routes
+
+    # Plugin routes still show up in the API docs
+    assert "/plugins/datetime_display/current_datetime" in (await client.get("/openapi.json")).json()["paths"]
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_lazy_plugins_load_on_first_request(plugin_manager):
+    manager = plugin_manager
+    # Listed from their manifests without being imported
+    assert not manager.plugins["datetime_display"].loaded
+    assert manager.plugins["datetime_display"].name == "Date & Time"
+    assert manager.plugins["system_monitor"].loaded
+
+    async with AsyncClient(transport=ASGITransport(app=manager.app), base_url="http://test") as client:
+        assert (await client.get("/plugins/datetime_display/current_datetime")).status_code == 200
+    assert manager.plugins["datetime_display"].loaded
+    report = manager.startup_report()
+    assert report["plugins"]["datetime_display"]["trigger"] == "request"
+    assert report["plugins"]["system_monitor"]["trigger"] == "startup"
+    assert "import_ms" in report["plugins"]["system_monitor"]
+
+@pytest.mark.anyio
+async def test_lazy_plugin_is_imported_once_and_only_for_its_routes(plugin_manager, monkeypatch):
+    import anyio
+    import threading
+
+    manager = plugin_manager
+    imports = []
+    import_plugin = manager.import_plugin
+
+    def slow_import(plugin_name, trigger):
+        imports.append((plugin_name, threading.current_thread() is threading.main_thread()))
+        time.sleep(0.1)
+        return import_plugin(plugin_name, trigger)
+
+    monkeypatch.setattr(manager, "import_plugin", slow_import)
+
+    @manager.app.post("/plugins/{plugin_id}/ping")
+    async def ping(plugin_id: str):
+        return {"plugin": plugin_id}
+
+    async with AsyncClient(transport=ASGITransport(app=manager.app), base_url="http://test") as client:
+        # App routes under the plugin's prefix do not import it
+        assert (await client.post("/plugins/datetime_display/ping")).json() == {"plugin": "datetime_display"}
+        assert not imports
+
+        # Concurrent first requests share one import, made off the event loop
+        responses = []
+
+        async def fetch():
+            responses.append(await client.get("/plugins/datetime_display/current_datetime"))
+
+        async with anyio.create_task_group() as tasks:
+            for _ in range(3):
+                tasks.start_soon(fetch)
+        assert [response.status_code for response in responses] == [200] * 3
+        assert imports == [("datetime_display", False)]
+        assert (await client.get("/plugins/datetime_display/missing")).status_code == 404
+
+def test_plugin_reload_swaps_router_and_drains_websockets(plugin_manager):
+    import sys
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+
+    manager = plugin_manager
+    with TestClient(manager.app) as client:
+        assert client.get("/plugins/datetime_display/current_datetime").status_code == 200
+        old_instance = manager.plugins["datetime_display"]
+        old_module = sys.modules["plugins.datetime_display"]
+        old_service_manager = manager.plugins["system_monitor"]
+
+        with client.websocket_connect("/plugins/datetime_display/ws/datetime") as websocket:
+            websocket.receive_text()
+            assert client.portal.call(manager.reload_plugin, "datetime_display")
+            with pytest.raises(WebSocketDisconnect) as closed:
+                while True:
+                    websocket.receive_text()
+            assert closed.value.code == 1012
+
+        assert manager.plugins["datetime_display"] is not old_instance
+        assert sys.modules["plugins.datetime_display"] is not old_module
+        assert manager.plugins["system_monitor"] is old_service_manager
+        assert not manager.dispatcher.connections
+        assert client.get("/plugins/datetime_display/current_datetime").status_code == 200
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_lifecycle_hooks_and_supervised_tasks(plugin_manager):
+    import asyncio
+    from core.supervisor import TaskSupervisor
+
+    manager = plugin_manager
+    manager.supervisor = TaskSupervisor(initial_backoff=0.01)
+    sampler = manager.plugins["system_monitor"].sampler
+    runs = []
+
+    async def flaky():
+        runs.append(time.monotonic())
+        if len(runs) < 3:
+            raise RuntimeError("boom")
+        await asyncio.sleep(60)
+
+    manager.plugins["system_monitor"].add_background_task("flaky", flaky)
+    async with manager.app.router.lifespan_context(manager.app):
+        # Started from the app lifespan
+        assert sampler.running
+        for _ in range(100):
+            if len(runs) >= 3:
+                break
+            await asyncio.sleep(0.01)
+        health = manager.health_report()["system_monitor"]
+        assert health["started"] and health["tasks"]["flaky"]["restarts"] == 2
+        assert health["tasks"]["flaky"]["state"] == "running"
+        assert "RuntimeError" in health["tasks"]["flaky"]["last_error"]
+
+        # Disabling stops the sampler and the background tasks
+        await manager.disable_plugin("system_monitor")
+        assert not sampler.running
+        assert "system_monitor" not in manager.supervisor.tasks
+        await manager.enable_plugin("system_monitor")
+        assert sampler.running
+        assert manager.health_report()["system_monitor"]["tasks"]["flaky"]["state"] in ("starting", "running")
+
+        # Enabling a running plugin again changes nothing
+        enabled = []
+        manager.plugins["system_monitor"].on_enable = lambda: enabled.append(True)
+        task = manager.supervisor.tasks["system_monitor"]["flaky"]
+        assert await manager.enable_plugin("system_monitor")
+        assert not enabled and manager.supervisor.tasks["system_monitor"]["flaky"] is task
+    assert not sampler.running and not manager.started_plugins
+
+@pytest.mark.anyio
+async def test_plugin_that_fails_to_load_is_not_enabled(plugin_manager, monkeypatch):
+    from core.plugin_base import PluginManifest
+
+    manager = plugin_manager
+    manager.plugins["broken"] = PluginManifest({"name": "Broken", "enabled": False})
+
+    def import_plugin(plugin_name, trigger):
+        raise ImportError("No module named 'missing_dependency'")
+
+    monkeypatch.setattr(manager, "import_plugin", import_plugin)
+    with pytest.raises(ImportError):
+        await manager.enable_plugin("broken")
+    assert not manager.plugins["broken"].enabled
+    assert "broken" not in manager.enabled_plugins
+    assert manager.plugins["broken"] not in manager.get_plugins()
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_isolated_plugin_is_proxied_to_workers(mode):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from core.dispatcher import PluginDispatcher
+    from core.isolation import IsolatedPlugin
+
+    plugin = IsolatedPlugin("datetime_display", {"name": "Date & Time", "isolation": mode, "workers": 2})
+    dispatcher = PluginDispatcher()
+    dispatcher.mount("datetime_display", plugin.router)
+    test_app = FastAPI()
+    test_app.router.routes.append(dispatcher)
+
+    with TestClient(test_app) as client:
+        client.portal.call(plugin.on_startup)
+        assert plugin.router.health()["ready"] == 2
+        response = client.get("/plugins/datetime_display/current_datetime")
+        assert response.status_code == 200 and "current_datetime" in response.json()
+        assert client.post("/plugins/datetime_display/current_datetime").status_code == 405
+        with client.websocket_connect("/plugins/datetime_display/ws/datetime") as websocket:
+            assert websocket.receive_text()
+
+        if mode == "process":
+            # A crashed worker is replaced; the other one keeps serving
+            plugin.router.workers[0].runner.kill()
+            for _ in range(100):
+                if plugin.router.restarts:
+                    break
+                time.sleep(0.05)
+            assert client.get("/plugins/datetime_display/current_datetime").status_code == 200
+            for _ in range(300):
+                if plugin.router.health()["ready"] == 2:
+                    break
+                time.sleep(0.05)
+            assert plugin.router.health()["ready"] == 2
+        client.portal.call(plugin.on_shutdown)
+        assert client.get("/plugins/datetime_display/current_datetime").status_code == 503
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_isolated_plugin_disables_and_shuts_down(plugin_manager):
+    from core.isolation import IsolatedPlugin
+
+    manager = plugin_manager
+    plugin = IsolatedPlugin("datetime_display", {"name": "Date & Time", "isolation": "thread"})
+    manager.plugins["datetime_display"] = manager.enabled_plugins["datetime_display"] = plugin
+    manager.include_plugin_routes("datetime_display", plugin)
+    async with manager.app.router.lifespan_context(manager.app):
+        assert plugin.router.running
+        assert await manager.disable_plugin("datetime_display")
+        assert not plugin.router.running
+        assert await manager.enable_plugin("datetime_display")
+        assert plugin.router.running
+    # Its workers stop with the app, like any other plugin's work
+    assert not plugin.router.running and not manager.started_plugins
+
+def test_multiplexed_websocket_topics(tmp_path, plugin_manager):
+    import json
+    from fastapi import WebSocket
+    from fastapi.testclient import TestClient
+    from core.pubsub import Connection
+
+    manager = plugin_manager
+
+    @manager.app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await manager.hub.serve(websocket)
+
+    log_viewer = manager.load_plugin("log_viewer", "test")
+    log_viewer.ALLOWED_LOG_DIRS = [str(tmp_path)]
+    log_file = tmp_path / "app.log"
+    log_file.write_text("old line\n")
+
+    def receive(websocket, **match):
+        while True:
+            message = json.loads(websocket.receive_text())
+            if all(message.get(key) == value for key, value in match.items()):
+                return message
+
+    with TestClient(manager.app) as client:
+        with client.websocket_connect("/ws") as first, client.websocket_connect("/ws") as second:
+            # datetime_display is lazy: subscribing loads and starts it
+            for websocket in (first, second):
+                websocket.send_text(json.dumps({"op": "subscribe", "topic": "datetime_display.datetime"}))
+                receive(websocket, op="subscribed")
+            assert manager.plugins["datetime_display"].loaded
+            assert len(manager.hub.topics["datetime_display.datetime"].subscribers) == 2
+            assert len(receive(first, topic="datetime_display.datetime")["data"]) == 19
+
+            first.send_text(json.dumps({"op": "subscribe", "topic": "log_viewer.logs:/etc/passwd"}))
+            assert receive(first, op="error")["detail"] == "Access to this file is forbidden."
+            first.send_text(json.dumps({"op": "subscribe", "topic": "nope.nothing"}))
+            assert receive(first, op="error")["topic"] == "nope.nothing"
+
+            topic = f"log_viewer.logs:{log_file}"
+            first.send_text(json.dumps({"op": "subscribe", "topic": topic}))
+            receive(first, op="subscribed")
+            time.sleep(0.3)
+            with open(log_file, "a") as f:
+                f.write("new line\n")
+            assert receive(first, topic=topic)["data"] == "new line\n"
+
+            # Disabling the plugin closes its topics on every connection
+            client.portal.call(manager.disable_plugin, "datetime_display")
+            assert receive(second, op="closed")["topic"] == "datetime_display.datetime"
+            assert "datetime_display.datetime" not in manager.hub.topics
+        # Topics stop once their last subscriber is gone
+        for _ in range(100):
+            if not manager.hub.topics:
+                break
+            time.sleep(0.01)
+        assert not manager.hub.topics and not manager.hub.connections
+
+    # A slow client only gets the newest value of a topic and joined text
+    connection = Connection(None)
+    for value in range(3):
+        connection.offer("system_monitor.metrics", "latest", json.dumps(value))
+    connection.offer("log_viewer.logs:a", "append", "one\n")
+    connection.offer("log_viewer.logs:a", "append", "two\n")
+    assert json.loads(connection.next_frame()) == {"topic": "system_monitor.metrics", "data": 2}
+    assert json.loads(connection.next_frame()) == {"topic": "log_viewer.logs:a", "data": "one\ntwo\n"}
+    assert connection.next_frame() is None and connection.coalesced == 2
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_fleet_aggregates_hosts_and_bounds_dispatch():
+    import asyncio
+    import httpx
+    from plugins.fleet.fleet import STALE_AFTER, Fleet
+
+    def metrics(cpu, memory_used):
+        return {
+            "cpu_percent": cpu,
+            "memory": {"total": 1000, "used": memory_used, "available": 1000 - memory_used, "percent": memory_used / 10},
+            "disk": {"total": 100, "used": 50, "free": 50, "percent": 50.0},
+            "network": {"bytes_sent": 1, "bytes_recv": 2, "packets_sent": 3, "packets_recv": 4},
+        }
+
+    active = []
+    peak = []
+
+    async def handler(request):
+        active.append(request)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.remove(request)
+        if request.url.host == "pi-3":
+            raise httpx.ConnectError("unreachable", request=request)
+        return httpx.Response(200, json={"path": request.url.path})
+
+    urls = [f"http://pi-{index}:8000" for index in range(6)]
+    fleet = Fleet(urls, concurrency=2, transport=httpx.MockTransport(handler))
+    for index, host in enumerate(fleet.hosts):
+        fleet.update(host, metrics(cpu=index * 10, memory_used=index * 100), now=100.0)
+    fleet.update("pi-0:8000", metrics(cpu=90, memory_used=0), now=100.0 - STALE_AFTER)
+
+    summary = fleet.summary(now=100.0)
+    assert summary["hosts"] == 6 and summary["online"] == 5
+    assert summary["cpu_percent"] == {"avg": 30.0, "max": 50}
+    assert summary["memory"] == {"total": 5000, "used": 1500, "percent": 30.0}
+    assert [entry["host"] for entry in fleet.top("cpu", 2, now=100.0)] == ["pi-5:8000", "pi-4:8000"]
+
+    try:
+        results = await fleet.dispatch(list(fleet.hosts), "POST", "/plugins/command_executor/commands/reboot")
+    finally:
+        await fleet.close()
+    assert max(peak) == 2
+    assert results["pi-1:8000"] == {"status": 200, "body": {"path": "/plugins/command_executor/commands/reboot"}}
+    assert "ConnectError" in results["pi-3:8000"]["error"]
+
+def test_fleet_follows_local_backends():
+    # Aggregates several real backends listening on local ports
+    uvicorn = pytest.importorskip("uvicorn")
+    pytest.importorskip("websockets")
+    import asyncio
+    import socket
+    import threading
+    from fastapi import FastAPI
+    from core.plugin_manager import PluginManager
+    from plugins.fleet.fleet import Fleet
+
+    servers = []
+    for _ in range(3):
+        backend = FastAPI()
+        manager = PluginManager(backend)
+        manager.save_plugins_settings = lambda plugin_names: None
+        backend.add_api_websocket_route("/ws", manager.hub.serve)
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(backend, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        servers.append((server, port))
+
+    async def scenario():
+        while not all(server.started for server, _ in servers):
+            await asyncio.sleep(0.05)
+        fleet = Fleet([f"http://127.0.0.1:{port}" for _, port in servers])
+        followers = [asyncio.ensure_future(fleet.follow(host)) for host in fleet.hosts]
+        try:
+            for _ in range(100):
+                if len(fleet.online()) == 3:
+                    break
+                await asyncio.sleep(0.05)
+            assert fleet.summary()["online"] == 3
+            results = await fleet.dispatch(list(fleet.hosts), "POST", "/plugins/command_executor/commands/nope")
+            assert all(result["status"] == 400 for result in results.values())
+        finally:
+            for follower in followers:
+                follower.cancel()
+            await asyncio.gather(*followers, return_exceptions=True)
+            await fleet.close()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        for server, _ in servers:
+            server.should_exit = True
+
+def test_openmetrics_exposition(backend):
+    from fastapi.testclient import TestClient
+    from core.metrics import RequestMetrics, render
+
+    with TestClient(backend.app) as client:
+        client.get("/plugins/command_executor/commands")
+        client.get("/plugins")
+        with client.websocket_connect("/plugins/datetime_display/ws/datetime") as websocket:
+            websocket.receive_text()
+            response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/openmetrics-text")
+    text = response.text
+    assert text.endswith("# EOF\n")
+    assert 'pi_cm_http_requests_total{plugin="command_executor",code="200"}' in text
+    assert 'pi_cm_http_requests_total{plugin="core",code="200"}' in text
+    assert 'pi_cm_open_websockets{plugin="datetime_display"} 1' in text
+    assert "pi_cm_command_queue_depth 0" in text
+    # System metrics come from the running sampler's snapshot
+    assert "pi_cm_cpu_percent " in text and 'pi_cm_memory_bytes{state="total"}' in text
+
+    metrics = RequestMetrics(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 5.0):
+        metrics.observe("log_viewer", 200, seconds)
+    lines = render(metrics.families()).splitlines()
+    assert 'pi_cm_http_request_duration_seconds_bucket{plugin="log_viewer",le="0.1"} 1' in lines
+    assert 'pi_cm_http_request_duration_seconds_bucket{plugin="log_viewer",le="1.0"} 2' in lines
+    assert 'pi_cm_http_request_duration_seconds_bucket{plugin="log_viewer",le="+Inf"} 3' in lines
+    assert 'pi_cm_http_request_duration_seconds_count{plugin="log_viewer"} 3' in lines
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_debug_perf_reports_latency_and_loop_stalls(backend, backend_client):
+    import asyncio
+    from core.perf import LoopMonitor
+
+    async with backend.app.router.lifespan_context(backend.app):
+        for _ in range(5):
+            await backend_client.get("/plugins/command_executor/commands")
+        report = (await backend_client.get("/debug/perf")).json()
+    latency = report["requests"]["command_executor"]
+    assert latency["requests"] >= 5
+    assert latency["p50_ms"] <= latency["p99_ms"] <= latency["max_ms"]
+    assert report["loop"]["running"]
+
+    def blocking_handler():
+        time.sleep(0.3)
+
+    monitor = LoopMonitor(threshold_ms=50, interval=0.02)
+    monitor.start()
+    await asyncio.sleep(0.1)
+    blocking_handler()
+    await asyncio.sleep(0.1)
+    monitor.stop()
+    loop_report = monitor.report()
+    assert loop_report["stalls"] == 1 and loop_report["max_lag_ms"] >= 250
+    assert "in blocking_handler" in loop_report["recent_stalls"][0]["handler"]
+
+@asyncio_only
+@pytest.mark.anyio
+async def test_benchmark_harness(tmp_path, backend):
+    from benchmarks.harness import Target, compare
+    from benchmarks.scenarios import log_tail_throughput, plugins_list
+
+    config = {"requests": 20, "concurrency": 4, "tail_seconds": 0.2}
+    context = {"log_file": str(tmp_path / "app.log")}
+
+    async with Target(backend.app) as target:
+        results = {**await plugins_list(target, config, context), **await log_tail_throughput(target, config, context)}
+    assert results["plugins_list"]["requests"] == 20 and results["plugins_list"]["requests_per_s"] > 0
+    assert results["log_tail"]["lines_received"] > 0
+
+    baseline = {"plugins_list": {"requests_per_s": 100.0, "p99_ms": 10.0}}
+    assert compare({"plugins_list": {"requests_per_s": 80.0, "p99_ms": 12.0}}, baseline, 0.25) == []
+    assert compare({"plugins_list": {"requests_per_s": 50.0, "p99_ms": 20.0}}, baseline, 0.25) == [
+        "plugins_list.requests_per_s: 50.0 < 100.0", "plugins_list.p99_ms: 20.0 > 10.0"]
+
+@pytest.mark.anyio
+async def test_response_cache_ttl_etags_and_coalescing():
+    import anyio
+    from fastapi import FastAPI
+    from core.cache import ResponseCache
+
+    cache = ResponseCache(max_entries=2)
+    calls = []
+    test_app = FastAPI()
+
+    @test_app.get("/items")
+    @cache.cached("items", ttl=60)
+    async def list_items(page: int = 0):
+        calls.append(page)
+        await anyio.sleep(0.1)
+        return {"page": page, "calls": len(calls)}
+
+    @test_app.get("/short")
+    @cache.cached("short", ttl=0.05)
+    def short():
+        calls.append("short")
+        return {"calls": len(calls)}
+
+    async with AsyncClient(transport=ASGITransport(app=test_app), base_url="http://test") as client:
+        first = await client.get("/items")
+        assert first.json() == {"page": 0, "calls": 1} and first.headers["etag"]
+        assert (await client.get("/items")).json() == {"page": 0, "calls": 1}
+        assert (await client.get("/items", headers={"If-None-Match": first.headers["etag"]})).status_code == 304
+
+        # Concurrent misses run the endpoint once
+        responses = []
+
+        async def fetch():
+            responses.append(await client.get("/items?page=1"))
+
+        async with anyio.create_task_group() as tasks:
+            for _ in range(5):
+                tasks.start_soon(fetch)
+        assert {response.json()["calls"] for response in responses} == {2}
+        assert cache.coalesced == 4
+
+        assert (await client.get("/short")).json() == (await client.get("/short")).json()
+        await anyio.sleep(0.1)
+        assert (await client.get("/short")).json()["calls"] == 4  # Expired
+
+        # max_entries=2 evicted the least recently used key, /items
+        assert cache.evictions == 1
+        assert (await client.get("/items")).json()["calls"] == 5
+        assert cache.invalidate("items") == 1
+        assert (await client.get("/items?page=1")).json()["calls"] == 6
+
+        # A response computed across an invalidation is not stored
+        async def fetch_page_2():
+            responses.append(await client.get("/items?page=2"))
+
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tasks:
+                tasks.start_soon(fetch_page_2)
+                while len(calls) < 7:
+                    await anyio.sleep(0.01)
+                cache.invalidate("items")
+        assert responses[-1].json()["calls"] == 7
+        assert (await client.get("/items?page=2")).json()["calls"] == 8
+
+        # A forgotten owner (a stopped plugin) leaves nothing behind, and a
+        # response still in flight for it is not stored
+        async def fetch_page_3():
+            responses.append(await client.get("/items?page=3"))
+
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tasks:
+                tasks.start_soon(fetch_page_3)
+                while len(calls) < 9:
+                    await anyio.sleep(0.01)
+                cache.forget("items")
+                assert "items" not in cache.generations
+        assert responses[-1].json()["calls"] == 9
+        assert (await client.get("/items?page=3")).json()["calls"] == 10
+        assert "items" not in cache.generations